@@ -2,9 +2,10 @@
 # -*- coding: utf-8 -*-
 """
 Creează o bază de date SQLite "book_summaries.db" cu 20 de cărți.
-Tabel: book_summaries(id, title, author, year, language, summary, themes)
+Tabel: book_summaries(id, title, author, year, language, summary, themes, full_text)
 - summary: 3–5 rânduri (separate prin newline) cu un rezumat scurt, fără spoilere majore
 - themes: listă separată prin virgulă (ex: "prietenie, aventură, maturizare")
+- full_text (opțional): text lung (descriere, recenzii, fragmente) indexat pe pasaje
 Rulare: python create_book_summaries_db.py
 După rulare, fișierul DB se află în ./book_summaries.db
 """
@@ -290,10 +291,46 @@ BOOKS = [
     },
 ]
 
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_books_author ON book_summaries(author);",
+    "CREATE INDEX IF NOT EXISTS idx_books_year ON book_summaries(year);",
+    "CREATE INDEX IF NOT EXISTS idx_books_language ON book_summaries(language);",
+    "CREATE INDEX IF NOT EXISTS idx_books_updated_at ON book_summaries(updated_at);",
+)
+
+# Tabel FTS5 cu conținut extern (nu dublează textul), sincronizat prin triggere.
+FTS_SCHEMA = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_summaries_fts USING fts5(
+        title, summary, themes, content='book_summaries', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_summaries_ai AFTER INSERT ON book_summaries BEGIN
+        INSERT INTO book_summaries_fts(rowid, title, summary, themes) VALUES (new.id, new.title, new.summary, new.themes);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_summaries_ad AFTER DELETE ON book_summaries BEGIN
+        INSERT INTO book_summaries_fts(book_summaries_fts, rowid, title, summary, themes)
+        VALUES ('delete', old.id, old.title, old.summary, old.themes);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_summaries_au AFTER UPDATE ON book_summaries BEGIN
+        INSERT INTO book_summaries_fts(book_summaries_fts, rowid, title, summary, themes)
+        VALUES ('delete', old.id, old.title, old.summary, old.themes);
+        INSERT INTO book_summaries_fts(rowid, title, summary, themes) VALUES (new.id, new.title, new.summary, new.themes);
+    END;
+    """,
+)
+
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
 def init_db(conn):
     cur = conn.cursor()
     cur.execute(
-        """
+        f"""
         CREATE TABLE IF NOT EXISTS book_summaries (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL UNIQUE,
@@ -301,30 +338,137 @@ def init_db(conn):
             year INTEGER,
             language TEXT DEFAULT 'ro',
             summary TEXT NOT NULL,
-            themes TEXT
+            themes TEXT,
+            full_text TEXT,
+            updated_at TEXT NOT NULL DEFAULT ({NOW_SQL})
         );
         """
     )
+    # Migrare pentru baze create înainte de coloana updated_at
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(book_summaries);")}
+    if "updated_at" not in cols:
+        cur.execute("ALTER TABLE book_summaries ADD COLUMN updated_at TEXT;")
+        cur.execute(f"UPDATE book_summaries SET updated_at = {NOW_SQL};")
+    if "full_text" not in cols:
+        cur.execute("ALTER TABLE book_summaries ADD COLUMN full_text TEXT;")
+    for sql in INDEXES:
+        cur.execute(sql)
+    try:
+        fts_existed = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'book_summaries_fts';").fetchone() is not None
+        for sql in FTS_SCHEMA:
+            cur.execute(sql)
+        if not fts_existed:
+            cur.execute("INSERT INTO book_summaries_fts(book_summaries_fts) VALUES ('rebuild');")
+    except sqlite3.OperationalError:
+        pass  # SQLite compilat fără FTS5: restul schemei funcționează normal
     conn.commit()
 
+# updated_at se schimbă doar dacă rândul chiar s-a modificat (WHERE pe DO UPDATE),
+# astfel încât ingest-ul incremental poate selecta numai rândurile noi/modificate.
+UPSERT_SQL = f"""
+    INSERT INTO book_summaries (title, author, year, language, summary, themes, full_text, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, {NOW_SQL})
+    ON CONFLICT(title) DO UPDATE SET
+        author=excluded.author,
+        year=excluded.year,
+        language=excluded.language,
+        summary=excluded.summary,
+        themes=excluded.themes,
+        full_text=excluded.full_text,
+        updated_at=excluded.updated_at
+    WHERE author IS NOT excluded.author
+       OR year IS NOT excluded.year
+       OR language IS NOT excluded.language
+       OR summary IS NOT excluded.summary
+       OR themes IS NOT excluded.themes
+       OR full_text IS NOT excluded.full_text;
+"""
+
+def book_params(b):
+    return (b["title"], b.get("author"), b.get("year"), b.get("language", "ro"), b["summary"], b.get("themes"), b.get("full_text"))
+
 def upsert_books(conn, books):
     cur = conn.cursor()
     for b in books:
-        cur.execute(
-            """
-            INSERT INTO book_summaries (title, author, year, language, summary, themes)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ON CONFLICT(title) DO UPDATE SET
-                author=excluded.author,
-                year=excluded.year,
-                language=excluded.language,
-                summary=excluded.summary,
-                themes=excluded.themes;
-            """,
-            (b["title"], b.get("author"), b.get("year"), b.get("language", "ro"), b["summary"], b.get("themes"))
-        )
+        cur.execute(UPSERT_SQL, book_params(b))
     conn.commit()
 
+def configure_bulk(conn):
+    """Setări pentru încărcări mari: WAL + synchronous=NORMAL (sigur cu WAL), cache mai mare."""
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-65536;")  # ~64 MB
+
+def bulk_upsert_books(conn, books, batch_size=5000):
+    """executemany în tranzacții mari (câte una per lot). Întoarce numărul de rânduri trimise."""
+    configure_bulk(conn)
+    total, batch = 0, []
+    for b in books:
+        batch.append(book_params(b))
+        if len(batch) >= batch_size:
+            with conn:
+                conn.executemany(UPSERT_SQL, batch)
+            total, batch = total + len(batch), []
+    if batch:
+        with conn:
+            conn.executemany(UPSERT_SQL, batch)
+        total += len(batch)
+    return total
+
+def changed_since(conn, since=None):
+    """Cursor peste rândurile cu updated_at > since (toate dacă since e None), în ordinea modificării."""
+    if since is None:
+        return conn.execute("SELECT * FROM book_summaries ORDER BY updated_at, id;")
+    return conn.execute("SELECT * FROM book_summaries WHERE updated_at > ? ORDER BY updated_at, id;", (since,))
+
+def search_fts(conn, query, limit=10):
+    """Căutare full-text (FTS5, bm25) peste titlu / rezumat / teme."""
+    return conn.execute(
+        """
+        SELECT b.id, b.title, b.author, b.year, bm25(book_summaries_fts) AS rank
+        FROM book_summaries_fts JOIN book_summaries b ON b.id = book_summaries_fts.rowid
+        WHERE book_summaries_fts MATCH ?
+        ORDER BY rank LIMIT ?;
+        """,
+        (query, limit),
+    ).fetchall()
+
+SYNTH_WORDS = ("umbra", "drumul", "casa", "marea", "orașul", "grădina", "ceasul", "pădurea", "steaua", "insula",
+               "fratele", "scrisoarea", "vremea", "cartea", "vântul", "lumina", "iarna", "focul", "podul", "trenul")
+SYNTH_ADJ = ("ascuns", "pierdut", "tăcut", "vechi", "albastru", "ultim", "străin", "de piatră", "de argint", "fără nume")
+SYNTH_AUTHORS = tuple(f"{f} {l}" for f in ("Ana", "Mihai", "Elena", "Radu", "Ioana", "Andrei", "Maria", "Victor")
+                      for l in ("Popescu", "Ionescu", "Stan", "Dumitru", "Marin", "Georgescu", "Tudor", "Munteanu"))
+SYNTH_THEMES = ("aventură", "prietenie", "dragoste", "război", "mister", "magie", "familie", "supraviețuire",
+                "maturizare", "putere", "libertate", "călătorie", "memorie", "identitate", "explorare spațială",
+                "distopie", "umor", "istorie", "crimă", "natură")
+
+def synthetic_books(n, seed=0):
+    """Generator de n cărți sintetice (titluri unice, deterministe după seed) pentru benchmark-uri."""
+    import random
+    rng = random.Random(seed)
+    for i in range(n):
+        word, adj = rng.choice(SYNTH_WORDS), rng.choice(SYNTH_ADJ)
+        themes = rng.sample(SYNTH_THEMES, rng.randint(2, 4))
+        lines = [f"O poveste despre {word} {adj} și {themes[0]}.",
+                 f"Personajele trec prin {themes[1]} într-o lume în care {rng.choice(SYNTH_WORDS)} schimbă totul.",
+                 f"Tonul cărții îmbină {', '.join(themes)}."]
+        yield {
+            "title": f"{word.capitalize()} {adj} {i}",
+            "author": rng.choice(SYNTH_AUTHORS),
+            "year": rng.randint(1800, 2024),
+            "language": rng.choice(("ro", "ro", "ro", "en", "fr")),
+            "summary": "\n".join(lines),
+            "themes": ", ".join(themes),
+        }
+
+def build_synthetic_db(path, n, seed=0, batch_size=5000):
+    """Creează (sau completează) o bază cu n cărți sintetice; întoarce numărul de rânduri încărcate."""
+    with sqlite3.connect(path) as conn:
+        init_db(conn)
+        return bulk_upsert_books(conn, synthetic_books(n, seed), batch_size)
+
 def main():
     path = Path(DB_NAME)
     with sqlite3.connect(path) as conn:
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+admission.py — controlul admiterii în fața etapelor scumpe (căutare, embeddings, LLM, TTS, imagini)
+- Per operație (LIMITS): token bucket global (rate/s + burst; se poate aștepta cel mult
+  max_wait_s după un token, altfel respingere), token bucket per sesiune (session_rate /
+  session_burst, fără așteptare) și concurență limitată (concurrency) cu o coadă mărginită
+  (queue); peste coadă respingem imediat, iar în coadă se așteaptă cel mult queue_timeout_s.
+- Respingerea = excepția Rejected(op, reason, retry_after); reason ∈ session_rate, rate,
+  queue_full, queue_timeout. recommender o absoarbe pentru embeddings (regăsire lexicală,
+  fără cache semantic) și LLM (răspuns degradat: potrivirile fără recomandarea generată);
+  restul (ex. bugetul de căutări al sesiunii) service.py le întoarce ca 429 + Retry-After,
+  iar UI-ul ca avertisment.
+- Sesiunea curentă e per thread, ca trace-ul din tracing: `with admission.session(sid):`.
+  Fără sesiune (ex. workerii media_jobs) se aplică doar limitele globale.
+- Limitele sunt per proces (fiecare worker din service.py are bugetul lui). Suprascrieri:
+  ADMISSION_LIMITS=<fișier JSON> ({"llm": {"rate": 2}, ...}) sau ADMISSION_LIMITS=off.
+"""
+from __future__ import annotations
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Tuple
+
+import tracing
+
+# rate/burst: bucket global (0 = fără); session_*: bucket per sesiune; concurrency 0 = nelimitat.
+LIMITS: Dict[str, Dict] = {
+    "search": {"session_rate": 0.5, "session_burst": 5, "concurrency": 16, "queue": 32, "queue_timeout_s": 5.0},
+    "embed": {"rate": 20.0, "burst": 40, "max_wait_s": 1.0, "concurrency": 16, "queue": 64, "queue_timeout_s": 5.0},
+    "llm": {"rate": 3.0, "burst": 10, "max_wait_s": 2.0, "session_rate": 0.2, "session_burst": 3,
+            "concurrency": 8, "queue": 16, "queue_timeout_s": 10.0},
+    "tts": {"rate": 1.0, "burst": 3, "max_wait_s": 30.0, "session_rate": 0.1, "session_burst": 3,
+            "concurrency": 4, "queue": 64, "queue_timeout_s": 60.0},
+    "image": {"rate": 0.2, "burst": 2, "max_wait_s": 60.0, "session_rate": 0.05, "session_burst": 2,
+              "concurrency": 2, "queue": 32, "queue_timeout_s": 120.0},
+}
+OP_DEFAULTS = {"rate": 0.0, "burst": 1, "max_wait_s": 0.0, "session_rate": 0.0, "session_burst": 1,
+               "concurrency": 0, "queue": 0, "queue_timeout_s": 0.0}
+MAX_SESSIONS = 10000
+QUEUE_RETRY_S = 1.0
+
+class Rejected(RuntimeError):
+    def __init__(self, op: str, reason: str, retry_after: float = QUEUE_RETRY_S):
+        super().__init__(f"{op}: rejected ({reason}), retry in {retry_after:.1f}s")
+        self.op, self.reason, self.retry_after = op, reason, retry_after
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = float(rate), float(burst)
+        self.tokens, self.stamp = float(burst), time.monotonic()
+
+    def reserve(self, max_wait_s: float = 0.0) -> Tuple[bool, float]:
+        """(admis, secunde): admis -> cât trebuie așteptat; respins -> peste cât ar fi un token.
+        Rezervarea intră pe datorie (tokens < 0), deci așteptările se ordonează FIFO. Nu e thread-safe."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        wait = max(0.0, (1.0 - self.tokens) / self.rate) if self.rate > 0 else (0.0 if self.tokens >= 1 else float("inf"))
+        if wait > max_wait_s:
+            return False, wait
+        self.tokens -= 1.0
+        return True, wait
+
+class Gate:
+    """Cel mult `limit` apeluri simultane; cel mult `queue` în așteptare, restul respinse imediat."""
+
+    def __init__(self, limit: int, queue: int):
+        self.limit, self.queue = limit, queue
+        self.active = self.waiting = 0
+        self._cond = threading.Condition()
+
+    def enter(self, timeout_s: float) -> str | None:
+        """None = admis; altfel motivul respingerii."""
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                return None
+            if self.waiting >= self.queue:
+                return "queue_full"
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.limit, timeout_s):
+                    return "queue_timeout"
+                self.active += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def exit(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+class Admission:
+    def __init__(self, limits: Dict[str, Dict] | None = None, max_sessions: int = MAX_SESSIONS):
+        self.limits = {op: dict(OP_DEFAULTS, **cfg) for op, cfg in (LIMITS if limits is None else limits).items()}
+        self._global = {op: TokenBucket(c["rate"], c["burst"]) for op, c in self.limits.items() if c["rate"] > 0}
+        self._gates = {op: Gate(int(c["concurrency"]), int(c["queue"])) for op, c in self.limits.items() if c["concurrency"] > 0}
+        self._sessions: "OrderedDict[Tuple[Hashable, str], TokenBucket]" = OrderedDict()
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def _reject(self, op: str, reason: str, retry_after: float):
+        with self._lock:
+            self._counts[(op, reason)] += 1
+        raise Rejected(op, reason, retry_after)
+
+    def charge_session(self, op: str, session_id: Hashable | None):
+        """Consumă un token din bugetul sesiunii pentru `op`; Rejected dacă e epuizat."""
+        cfg = self.limits.get(op)
+        if cfg is None or session_id is None or cfg["session_rate"] <= 0:
+            return
+        with self._lock:
+            key = (session_id, op)
+            bucket = self._sessions.get(key)
+            if bucket is None:
+                bucket = self._sessions[key] = TokenBucket(cfg["session_rate"], cfg["session_burst"])
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(key)
+            ok, wait = bucket.reserve(0.0)
+        if not ok:
+            self._reject(op, "session_rate", wait)
+
+    @contextmanager
+    def admit(self, op: str, session_id: Hashable | None = None):
+        cfg = self.limits.get(op)
+        if cfg is None:
+            yield
+            return
+        self.charge_session(op, session_id)
+        t0 = time.perf_counter()
+        bucket = self._global.get(op)
+        if bucket is not None:
+            with self._lock:
+                ok, wait = bucket.reserve(cfg["max_wait_s"])
+            if not ok:
+                self._reject(op, "rate", wait)
+            if wait:
+                time.sleep(wait)
+        gate = self._gates.get(op)
+        if gate is not None:
+            reason = gate.enter(cfg["queue_timeout_s"])
+            if reason is not None:
+                self._reject(op, reason, QUEUE_RETRY_S)
+        waited_ms = (time.perf_counter() - t0) * 1000.0
+        if waited_ms >= 1.0:
+            tracing.annotate(admission_wait_ms=round(waited_ms, 1))
+        with self._lock:
+            self._counts[(op, "admitted")] += 1
+        try:
+            yield
+        finally:
+            if gate is not None:
+                gate.exit()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            counts = dict(self._counts)
+        out = {}
+        for op in self.limits:
+            gate = self._gates.get(op)
+            rejected = {reason: n for (o, reason), n in counts.items() if o == op and reason != "admitted"}
+            out[op] = {"admitted": counts.get((op, "admitted"), 0), "rejected": rejected,
+                       "in_flight": gate.active if gate else None, "queued": gate.waiting if gate else None}
+        return out
+
+def _load_limits() -> Dict[str, Dict]:
+    spec = os.environ.get("ADMISSION_LIMITS", "").strip()
+    if not spec:
+        return LIMITS
+    if spec.lower() == "off":
+        return {}
+    with open(spec, encoding="utf-8") as f:
+        overrides = json.load(f)
+    return {op: dict(LIMITS.get(op, {}), **overrides.get(op, {})) for op in set(LIMITS) | set(overrides)}
+
+CONTROLLER = Admission(_load_limits())
+_local = threading.local()
+
+def configure(limits: Dict[str, Dict] | None = None, enabled: bool = True) -> Admission:
+    """Înlocuiește controlerul procesului (ex. load_test --no-admission)."""
+    global CONTROLLER
+    CONTROLLER = Admission(limits if enabled else {})
+    return CONTROLLER
+
+def reset():
+    """Bugete pline și contoare la zero, cu aceleași limite (ex. între treptele din load_test)."""
+    configure(CONTROLLER.limits)
+
+@contextmanager
+def session(session_id: Hashable | None):
+    prev = getattr(_local, "session", None)
+    _local.session = session_id
+    try:
+        yield
+    finally:
+        _local.session = prev
+
+def current_session() -> Hashable | None:
+    return getattr(_local, "session", None)
+
+def charge_session(op: str, session_id: Hashable | None = None):
+    CONTROLLER.charge_session(op, session_id if session_id is not None else current_session())
+
+def admit(op: str):
+    return CONTROLLER.admit(op, current_session())
+
+def guarded(op: str):
+    """Decorator: apelul trece prin admit(op) pentru sesiunea curentă."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with admit(op):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def stats() -> Dict[str, Dict]:
+    return CONTROLLER.stats()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+answer_cache.py — cache semantic pentru răspunsurile LLM (cereri aproape identice)
+- Intrare = (embedding-ul cererii, setul de candidați regăsiți, răspunsul).
+- lookup() compară embedding-ul cererii noi cu TOATE intrările dintr-o singură
+  înmulțire matrice-vector (vectori normalizați -> produs scalar = cosinus) și
+  reutilizează răspunsul dacă similaritatea ≥ `threshold` ȘI setul de candidați e
+  același (altfel răspunsul ar putea recomanda cărți care nu mai sunt în listă).
+- Dimensiune limitată (`max_entries`); la umplere se elimină intrarea folosită cel
+  mai demult (LRU).
+- stats(): hits / misses / near_misses (cerere similară, candidați diferiți) /
+  evictions / hit_rate.
+Cache-ul e în memorie, per proces, și poate fi partajat între sesiuni (thread-safe).
+"""
+from __future__ import annotations
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES = 1024
+
+def candidate_key(ids: Iterable[str], *extra) -> Tuple:
+    """Cheia setului de candidați (ordinea nu contează) + context suplimentar (ex. modelul)."""
+    return (frozenset(ids),) + tuple(extra)
+
+class SemanticCache:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vecs: np.ndarray | None = None          # (max_entries, D) float32, rânduri normalizate
+        self._keys: List[Tuple | None] = [None] * max_entries
+        self._answers: List[str | None] = [None] * max_entries
+        self._used = np.zeros(max_entries, dtype=np.int64)   # ultimul "tick" de folosire (LRU)
+        self._size = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.near_misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32).ravel()
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def lookup(self, embedding, key: Tuple, threshold: float | None = None) -> str | None:
+        """Răspunsul reutilizabil sau None (miss)."""
+        threshold = self.threshold if threshold is None else threshold
+        q = self._unit(embedding)
+        with self._lock:
+            if not self._size or self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            sims = self._vecs[:self._size] @ q
+            close = np.flatnonzero(sims >= threshold)
+            for row in close[np.argsort(-sims[close])]:
+                if self._keys[row] == key:
+                    self._tick += 1
+                    self._used[row] = self._tick
+                    self.hits += 1
+                    return self._answers[row]
+            if len(close):
+                self.near_misses += 1
+            self.misses += 1
+            return None
+
+    def put(self, embedding, key: Tuple, answer: str):
+        q = self._unit(embedding)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                # Primul vector (sau alt model de embeddings): alocăm matricea o singură dată.
+                self._vecs = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._keys = [None] * self.max_entries
+                self._answers = [None] * self.max_entries
+                self._size = 0
+            if self._size < self.max_entries:
+                row = self._size
+                self._size += 1
+            else:
+                row = int(np.argmin(self._used))
+                self.evictions += 1
+            self._tick += 1
+            self._vecs[row] = q
+            self._keys[row] = key
+            self._answers[row] = answer
+            self._used[row] = self._tick
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._keys = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+            self._used[:] = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size, "max_entries": self.max_entries, "threshold": self.threshold,
+            "hits": self.hits, "misses": self.misses, "near_misses": self.near_misses,
+            "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
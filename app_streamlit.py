@@ -5,27 +5,44 @@ Book RAG Chatbot — Voice + TTS + Image Gen (v5, Theming)
 - Temă completă: Dark / Light / Custom (paletă de culori)
 - Sugestii dinamice (3 din 20)
 - Reordonare potriviri: prima = recomandarea din răspuns
-- TTS (răspuns + rezumate) & Image Gen
+- TTS (răspuns + rezumate) & Image Gen, ca joburi în fundal (media_jobs.py)
+- Rezultate compacte per sesiune (ids + scoruri + referința răspunsului); datele cărților
+  vin din depozitul comun item_store.py
+- Limite per sesiune și globale (admission.py); fără buget LLM se afișează doar potrivirile
 """
-import os, re, difflib, unicodedata
+import math
+import os
+import re
+import threading
+import time
+import uuid
 from pathlib import Path
 from typing import List, Dict
 
 import streamlit as st
-from dotenv import load_dotenv
-import chromadb
-from chromadb.utils import embedding_functions
-from openai import OpenAI
-from tts_utils import tts_bytes
-from img_gen_utils import generate_book_image
-from profanity_filter import is_inappropriate
+import theme_index
+import similar_books
+import query_filters
+import passages
+import answer_cache
+import tracing
+import recommender
+import service_client
+import media_jobs
+import singleflight
+import item_store
+import admission
+from recommender import SUGGESTIONS_POOL
 
 # -------------------- Page Config --------------------
 st.set_page_config(page_title="Your Personal Librarian", page_icon="🎨", layout="centered")
 
 # Init session_state
 defaults = {
-    "results": None,
+    "session_id": uuid.uuid4().hex,  # cheia bugetelor per sesiune din admission (și X-Session-Id spre serviciu)
+    "results": None,        # forma compactă din item_store.compact (ids, scoruri, referința răspunsului)
+    "media_jobs": {},       # slot (ex. "img-<id>") -> {"id", "kind", ...} pentru joburile TTS / imagine
+    "media_results": {},    # id job -> (bytes, mime, info), ca să nu recitim rezultatul la fiecare poll
     "query_inp": "",
     "ui_suggestions": None,
     "theme_choice": "Dark",
@@ -64,12 +81,46 @@ with st.sidebar:
         st.markdown("<hr/>", unsafe_allow_html=True)
 
     persist = Path(st.text_input("Chroma persist dir", "./chroma_book_summaries"))
+    service_url = st.text_input("Serviciu de recomandare (URL)", os.getenv("RECOMMENDER_URL", ""),
+                                help="Ex: http://127.0.0.1:8000 (`python service.py`). Gol = fluxul rulează local, în acest proces.")
+    client = (service_client.ServiceClient(service_url.strip(), session_id=st.session_state["session_id"])
+              if service_url.strip() else None)
     k = st.slider("Numarul de recomandari afisate", 1, 50, 5)
     show_all = st.checkbox("Afișează toate potrivirile (semantic)", value=False)
-    search_mode = st.radio("Mod căutare", ["Context liber", "După temă (hint)", "Titlu (exact)", "Titlu (conține)"], index=0)
+    search_mode = st.radio("Mod căutare", list(recommender.SEARCH_MODES), index=0)
+    retrieval = st.radio("Regăsire", ["Hibrid (BM25 + semantic)", "Semantic", "Lexical (BM25)", "Pasaje"], index=0, horizontal=True)
+    pooling = st.selectbox("Agregare pasaje", passages.POOLINGS, index=0, disabled=retrieval != "Pasaje",
+                           help="max = cel mai bun pasaj al cărții; sum = suma pasajelor găsite (ingest cu --passages).")
+    engine = st.selectbox("Motor vectorial", list(recommender.ENGINES), index=0,
+                          help="mmap = export în memorie partajată (rulează întâi `export-mmap`).")
+    retrieval_mode = {"Hibrid (BM25 + semantic)": "hybrid", "Semantic": "vector", "Lexical (BM25)": "lexical", "Pasaje": "passages"}[retrieval]
     model = st.selectbox("Model GPT", ["gpt-4o-mini", "gpt-4o", "gpt-4.1-mini"], index=0)
     tts_voice = st.selectbox("Voce TTS", ["alloy", "verse", "aria", "ballad"], index=0)
     auto_title = st.checkbox("🔎 Detectează automat căutările de titlu", value=True)
+    with st.expander("🔍 Filtre (autor, an, limbă, temă)"):
+        f_author = st.text_input("Autor", "")
+        f_use_years = st.checkbox("Filtrează după an", value=False)
+        f_years = st.slider("Interval ani", 1500, 2030, (1900, 2030), disabled=not f_use_years)
+        f_language = st.selectbox("Limbă", ["(oricare)", "ro", "en", "fr", "de", "es", "it", "ru"], index=0)
+        f_theme = st.text_input("Temă", "")
+        parse_hints = st.checkbox("Extrage filtre din text (ex: „după 1950”, „în română”)", value=True)
+    with st.expander("⚡ Cache semantic (răspunsuri)"):
+        use_answer_cache = st.checkbox("Refolosește răspunsul pentru cereri aproape identice", value=True)
+        cache_threshold = st.slider("Prag similaritate (cosinus)", 0.80, 0.99, answer_cache.DEFAULT_THRESHOLD, 0.01)
+        try:
+            cs = client.stats()["answer_cache"] if client is not None else recommender.ANSWER_CACHE.stats()
+            st.caption(("Worker-ul serviciului: " if client is not None else "")
+                       + f"{cs['entries']}/{cs['max_entries']} intrări · hit rate {cs['hit_rate']:.0%} "
+                       f"({cs['hits']} hit, {cs['misses']} miss, {cs['near_misses']} cereri similare cu alți candidați)")
+        except service_client.ServiceError as e:
+            st.caption(f"Serviciul nu răspunde: {e}")
+        if client is None and st.button("Golește cache-ul"):
+            recommender.ANSWER_CACHE.clear()
+    debug_trace = st.checkbox("🐞 Debug: timpi pe etape (ultima cerere)", value=False)
+    facets_idx = theme_index.load_cached(persist)
+    if facets_idx is not None and len(facets_idx):
+        with st.expander(f"🏷️ Teme în colecție ({len(facets_idx)})"):
+            st.markdown("  \n".join(f"{label} · **{n}**" for label, n in facets_idx.facet_counts(30)))
     st.markdown("<hr/>", unsafe_allow_html=True)
     st.subheader("🖼️ Generare imagine")
     img_style = st.selectbox("Stil", ["copertă minimală", "scenă cinematică", "ilustrație acquarela", "poster vintage"], index=0)
@@ -87,9 +138,11 @@ def _theme_tokens(theme:str):
     # Custom
     return st.session_state["theme_custom"]
 
-TOK = _theme_tokens(theme)
-
-st.markdown(f"""
+@st.cache_data(show_spinner=False)
+def _theme_css(tokens: tuple) -> str:
+    """CSS-ul temei, generat o singură dată per set de culori (tokens sortate)."""
+    TOK = dict(tokens)
+    return f"""
 <style>
 :root {{
   --bg: {TOK['bg']};
@@ -147,7 +200,15 @@ input, textarea, .stTextInput>div>div, .stTextArea>div>div, .stSelectbox>div, .s
 .footer-note {{ color: var(--subtext); font-size:.85rem; }}
 .reco-badge {{ display:inline-block; margin-left:8px; padding:2px 8px; background:#22c55e; color:white; border-radius:999px; font-size:.75rem; }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Fragment-urile rulează izolat: un click pe 🔊/🖼️ recalculează doar cardul respectiv.
+_fragment_api = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+_fragment = _fragment_api or (lambda f: f)
+
+TOK = _theme_tokens(theme)
+
+st.markdown(_theme_css(tuple(sorted(TOK.items()))), unsafe_allow_html=True)
 
 st.markdown("""
 <div class="app-header">
@@ -158,117 +219,15 @@ st.markdown("""
 
 # -------------------- Chroma helpers --------------------
 def get_collection(persist_dir: Path, collection_name: str = "books"):
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        st.error("OPENAI_API_KEY lipsește. Adaugă-l în .env sau în variabilele de mediu.")
-        st.stop()
-    client = chromadb.PersistentClient(path=str(persist_dir))
-    embedder = embedding_functions.OpenAIEmbeddingFunction(api_key=api_key, model_name="text-embedding-3-small")
-    return client.get_or_create_collection(name=collection_name, embedding_function=embedder)
-
-def _normalize(s: str) -> str:
-    if s is None: return ""
-    s = unicodedata.normalize("NFKD", str(s))
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.lower()
-    s = re.sub(r"[\W_]+", " ", s)
-    return " ".join(s.split())
-
-def _best_title_index(norm_q: str, titles_norm: list[str]) -> int | None:
-    if not norm_q: return None
-    if norm_q in titles_norm: return titles_norm.index(norm_q)
-    best_idx, best_score = None, 0.0
-    for i, t in enumerate(titles_norm):
-        ratio = difflib.SequenceMatcher(None, norm_q, t).ratio()
-        bonus = (0.25 if norm_q in t else 0.0) + (0.15 if t.startswith(norm_q) else 0.0)
-        gap = abs(len(t) - len(norm_q)); penalty = min(0.25, gap * 0.005)
-        score = ratio + bonus - penalty
-        if score > best_score: best_idx, best_score = i, score
-    return best_idx if (best_idx is not None and best_score >= 0.60) else None
-
-def _build_item_from_meta_doc(_id, meta, doc, dist=None):
-    themes_val = meta.get("themes", "")
-    themes_str = ", ".join(themes_val) if isinstance(themes_val, list) else str(themes_val)
-    score = max(0.0, 1.0 - float(dist)) if dist is not None else 1.0
-    return {
-        "id": _id, "title": meta.get("title"), "author": meta.get("author"), "year": meta.get("year"),
-        "themes": themes_str, "summary": doc.split("Rezumat:", 1)[-1].strip() if isinstance(doc, str) else "", "score": score,
-    }
-
-def retrieve_semantic(query: str, k: int, persist_dir: Path, show_all: bool):
-    col = get_collection(persist_dir)
-    if show_all: k = int(col.count())
-    res = col.query(query_texts=[query], n_results=k, include=["documents","metadatas","distances"])
-    items: List[Dict] = []
-    for _id, doc, meta, dist in zip(res.get("ids", [[]])[0], res.get("documents", [[]])[0], res.get("metadatas", [[]])[0], res.get("distances", [[]])[0]):
-        items.append(_build_item_from_meta_doc(_id, meta, doc, dist))
-    return items
-
-def retrieve_title_exact(title: str, persist_dir: Path):
-    tnorm = _normalize(title); col = get_collection(persist_dir)
     try:
-        data = col.get(where={"title": title}, include=["metadatas","documents"])
-        out = []
-        for _id, meta, doc in zip(data.get("ids", []), data.get("metadatas", []), data.get("documents", [])):
-            if _normalize(meta.get("title")) == tnorm:
-                out.append(_build_item_from_meta_doc(_id, meta, doc))
-        if out: return out
-    except Exception: pass
-    data = col.get(limit=int(col.count()), include=["metadatas","documents"])
-    return [_build_item_from_meta_doc(_id, meta, doc) for _id, meta, doc in zip(data["ids"], data["metadatas"], data["documents"]) if _normalize(meta.get("title")) == tnorm]
-
-def retrieve_title_contains(title_substring: str, persist_dir: Path):
-    sub = _normalize(title_substring); col = get_collection(persist_dir)
-    data = col.get(limit=int(col.count()), include=["metadatas","documents"])
-    return [_build_item_from_meta_doc(_id, meta, doc) for _id, meta, doc in zip(data["ids"], data["metadatas"], data["documents"]) if sub in _normalize(meta.get("title"))]
-
-def llm_recommend(user_query: str, retrieved: List[Dict], model: str = "gpt-4o-mini") -> str:
-    client = OpenAI()
-    ctx = "\n".join([f"[Cand#{i}] Titlu:{it['title']} | Autor:{it['author']} | An:{it['year']} | Teme:{it['themes']}\nRezumat:{it['summary']}" for i,it in enumerate(retrieved,1)]) or "Nicio potrivire."
-    system = ("Ești un asistent pentru recomandări de cărți. Răspunde în română, clar și prietenos. "
-              "Fă recomandări NUMAI folosind candidații furnizați. "
-              "Dacă alegi o carte anume, menționeaz-o clar și EXACT cu titlul ei în text.")
-    msg = client.chat.completions.create(model=model, temperature=0.35, messages=[{"role":"system","content":system},{"role":"user","content":f"Cererea: {user_query}\n\nCandidați:\n{ctx}"}])
-    return msg.choices[0].message.content
-
-def _extract_recommended_title(answer: str, items: List[Dict]) -> int | None:
-    """Returnează indexul item-ului al cărui titlu apare în answer (fuzzy, fără diacritice)."""
-    if not answer or not items:
-        return None
-    ans_norm = _normalize(answer)
-    best_idx, best_len = None, 0
-    for i, it in enumerate(items):
-        t = _normalize(it.get("title", ""))
-        if t and t in ans_norm and len(t) > best_len:
-            best_idx, best_len = i, len(t)
-    return best_idx
+        return recommender.get_collection(persist_dir, engine, collection_name)
+    except RuntimeError as e:
+        st.error(str(e))
+        st.stop()
 
 # -------------------- Dynamic suggestions --------------------
 st.markdown("##### Încearcă un exemplu:")
 import random
-SUGGESTIONS_POOL = [
-    "Vreau o carte despre prietenie și magie",
-    "Caut o poveste SF cu explorare spațială",
-    "Recomandă-mi un thriller psihologic intens",
-    "Vreau o carte scurtă și amuzantă",
-    "Caut o carte clasică despre dragoste",
-    "Vreau o aventură epică cu lumi fantastice",
-    "O carte despre război și strategie",
-    "Ceva motivațional și de dezvoltare personală",
-    "Biografie a unui inovator faimos",
-    "Mister într-un orășel liniștit",
-    "Distopie despre controlul societății",
-    "Roman istoric despre Roma antică",
-    "Cartea perfectă pentru adolescenți",
-    "Nonficțiune despre știință ușor de înțeles",
-    "Romance contemporan cu umor",
-    "O carte cu dezbateri etice și filozofie",
-    "Poveste cu prietenie între animale",
-    "Fantasy cu dragoni și magie întunecată",
-    "Cyberpunk cu inteligență artificială",
-    "Cărți care seamănă cu Hobbitul",
-]
 if st.session_state["ui_suggestions"] is None:
     st.session_state["ui_suggestions"] = random.sample(SUGGESTIONS_POOL, 3)
 cols = st.columns(3)
@@ -283,39 +242,179 @@ with st.form("search_form", clear_on_submit=False):
     do_search = st.form_submit_button("🔎 Caută și recomandă")
 
 # -------------------- Compute --------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def _known_authors(persist_dir: str) -> List[str]:
+    return query_filters.known_authors(get_collection(Path(persist_dir)))
+
+def _sidebar_filters() -> Dict:
+    # Cu serviciu, autorul tastat liber e rezolvat de worker (are colecția încărcată).
+    authors = query_filters.resolve_author(f_author, _known_authors(str(persist))) if f_author.strip() and client is None else []
+    return {
+        "author": (authors if len(authors) > 1 else authors[0]) if authors else (f_author.strip() or None),
+        "year_min": f_years[0] if f_use_years else None,
+        "year_max": f_years[1] if f_use_years else None,
+        "language": None if f_language == "(oricare)" else f_language,
+        "theme": f_theme.strip() or None,
+    }
+
+def _items_namespace() -> str:
+    # Aceleași id-uri pot avea date diferite în store-uri diferite (local vs. serviciu).
+    return client.base_url if client is not None else str(Path(persist).resolve())
+
+def _load_items(ids: List[str]) -> List[Dict]:
+    """Loader-ul lui item_store: cărțile evacuate din depozitul comun se recitesc din colecție."""
+    try:
+        return client.items(ids) if client is not None else recommender.load_items(persist, ids, engine)
+    except (service_client.ServiceError, RuntimeError) as e:
+        st.warning(f"Nu am putut reîncărca datele cărților: {e}")
+        return []
+
 def compute_results(user_q: str) -> Dict:
-    blocked, _ = is_inappropriate(user_q)
-    if blocked:
-        return {"blocked": True, "msg": "Hai să păstrăm conversația prietenoasă 😊. Te rog reformulează fără limbaj ofensator."}
-    if search_mode in ["Context liber", "După temă (hint)"]:
-        if auto_title:
-            norm_q = _normalize(user_q)
-            col = get_collection(persist)
-            data = col.get(include=["metadatas","documents"], limit=int(col.count()))
-            titles = [m.get("title") for m in data.get("metadatas", [])]
-            idx = _best_title_index(norm_q, [_normalize(t) for t in titles])
-            if idx is not None:
-                items = [_build_item_from_meta_doc(data["ids"][idx], data["metadatas"][idx], data["documents"][idx])]
-            else:
-                q = user_q if search_mode == "Context liber" else f"cărți cu tema {user_q}; recomandări pe această temă"
-                items = retrieve_semantic(q, k, persist, show_all=show_all)
-        else:
-            q = user_q if search_mode == "Context liber" else f"cărți cu tema {user_q}; recomandări pe această temă"
-            items = retrieve_semantic(q, k, persist, show_all=show_all)
-    elif search_mode == "Titlu (exact)":
-        exact = retrieve_title_exact(user_q, persist); items = exact[:1] if exact else []
-    else:
-        items = retrieve_title_contains(user_q, persist)
-    answer = llm_recommend(user_q, items, model=model)
-    idx = _extract_recommended_title(answer, items)
-    if idx is not None and idx != 0:
-        items = [items[idx]] + items[:idx] + items[idx+1:]
-    return {"blocked": False, "items": items, "answer": answer, "query": user_q}
+    options = {
+        "persist": persist, "k": k, "show_all": show_all, "search_mode": search_mode, "retrieval_mode": retrieval_mode,
+        "pooling": pooling, "engine": engine, "model": model, "auto_title": auto_title, "parse_hints": parse_hints,
+        "filters": _sidebar_filters(), "use_answer_cache": use_answer_cache, "cache_threshold": cache_threshold,
+    }
+    if client is not None:
+        return client.recommend(user_q, options)
+    return recommender.compute_results(user_q, options, known_authors=lambda: _known_authors(str(persist)))
+
+def _busy_message(e: Exception) -> str:
+    """Textul pentru o cerere respinsă de admission (local) sau cu 429 de la serviciu."""
+    wait = f"peste {math.ceil(e.retry_after)} s" if isinstance(e, admission.Rejected) else "peste câteva secunde"
+    return f"⏳ Prea multe cereri într-un timp scurt (sau serverul e ocupat). Mai încearcă {wait}."
 
 if do_search and user_query.strip():
+    found = None
     with st.spinner("🔍 Caut potriviri din colecție..."):
-        st.session_state["results"] = compute_results(user_query)
-    st.rerun()
+        try:
+            if client is not None:
+                # Trace-ul (waterfall-ul) vine gata făcut de la worker.
+                found = compute_results(user_query)
+            else:
+                with admission.session(st.session_state["session_id"]), \
+                        tracing.trace("search", mode=search_mode, query=user_query) as tr:
+                    found = compute_results(user_query)
+                found = dict(found, trace=tr)
+        except admission.Rejected as e:
+            st.warning(_busy_message(e))
+        except service_client.ServiceError as e:
+            if e.status != 429:
+                st.error(f"Serviciul de recomandare a eșuat: {e}")
+                st.stop()
+            st.warning(_busy_message(e))
+    # Respinsă: rămân rezultatele anterioare, doar cu avertismentul deasupra.
+    if found is not None:
+        st.session_state["results"] = item_store.compact(found, _items_namespace())
+        st.session_state["media_jobs"], st.session_state["media_results"] = {}, {}
+        st.rerun()
+
+# -------------------- Media fragments --------------------
+JOB_POLL_S = 1.0
+
+@st.cache_resource(show_spinner=False)
+def _local_media_queue(db: str) -> media_jobs.JobQueue:
+    # Un singur pool de workeri per proces Streamlit, partajat de toate sesiunile.
+    queue = media_jobs.JobQueue(db)
+    media_jobs.MediaWorkers(queue).start()
+    return queue
+
+jobs = service_client.RemoteJobQueue(client) if client is not None else _local_media_queue(media_jobs.DEFAULT_DB)
+
+def _submit_media(slot: str, kind: str, params: Dict, **display):
+    """Pune jobul în coadă; progresul îl afișează render_media_jobs la următorul tick (JOB_POLL_S)."""
+    try:
+        if client is None:
+            admission.charge_session(kind, st.session_state["session_id"])  # cu serviciu, bugetul îl aplică el
+        st.session_state["media_jobs"][slot] = dict(display, id=jobs.submit(kind, params), kind=kind)
+    except admission.Rejected as e:
+        st.warning(_busy_message(e))
+        return
+    except service_client.ServiceError as e:
+        st.warning(_busy_message(e) if e.status == 429 else f"Serviciul de recomandare nu răspunde: {e}")
+        return
+    if _fragment_api is None:
+        st.rerun()  # fără fragmente nu există polling: doar o rerulare completă arată jobul
+
+def _similar(book_id: str, persist_dir: Path, n: int = 5) -> List[Dict]:
+    if client is not None:
+        return client.similar(book_id, n)
+    neighbours = similar_books.similar(book_id, persist_dir, n)
+    if not neighbours:
+        return []
+    data = get_collection(persist_dir).get(ids=[i for i, _ in neighbours], include=["metadatas"])
+    metas = dict(zip(data["ids"], data["metadatas"]))
+    return [dict(metas.get(i, {}), id=i, score=score) for i, score in neighbours]
+
+def _slug(s):
+    return re.sub(r"[^a-z0-9]+","-", (s or '').lower()).strip("-") or "imagine-carte"
+
+# Fără fragmente, starea se actualizează la următoarea interacțiune cu pagina.
+_polling_fragment = _fragment_api(run_every=JOB_POLL_S) if _fragment_api else (lambda f: f)
+
+@_polling_fragment
+def render_media_jobs(slots: tuple):
+    for slot in slots:
+        entry = st.session_state["media_jobs"].get(slot)
+        if entry is None:
+            continue
+        cached = st.session_state["media_results"].get(entry["id"])
+        if cached is None:
+            try:
+                job = jobs.get(entry["id"])
+                if job is not None and job["status"] == "done":
+                    cached = jobs.result(entry["id"])
+            except service_client.ServiceError as e:
+                st.caption(f"⚠️ {entry['label']}: serviciul nu răspunde ({e})")
+                continue
+            if job is not None and job["status"] in ("pending", "running"):
+                st.caption(f"⏳ {entry['label']}: {'în coadă' if job['status'] == 'pending' else 'în lucru'}…")
+                continue
+            if cached is None:
+                st.warning(entry["fail_msg"])
+                continue
+            st.session_state["media_results"][entry["id"]] = cached
+        data, mime, _ = cached
+        if entry["kind"] == "tts":
+            st.audio(data, format=mime)
+        else:
+            st.image(data, caption=entry["caption"])
+            st.download_button("⬇️ Descarcă PNG", data=data, file_name=entry["file_name"], mime=mime, key=f"dl-{slot}")
+
+@_fragment
+def render_answer_tts(answer: str, voice: str):
+    if st.button("🔊 Ascultă răspunsul", key="tts-answer", use_container_width=True):
+        _submit_media("tts-answer", "tts", {"text": answer, "voice": voice},
+                      label="Audio răspuns", fail_msg="Nu am putut genera audio.")
+
+@_fragment
+def render_card_media(it: Dict, voice: str, style: str, size: str, persist_dir: Path):
+    with st.expander("Rezumat"):
+        st.write(it["summary"])
+        if it.get("passage"):
+            st.caption(f"Pasaj potrivit: „{it['passage']}”")
+        if st.button("🔊 Citește rezumatul", key=f"tts-sum-{it['id']}"):
+            _submit_media(f"tts-sum-{it['id']}", "tts", {"text": it["summary"], "voice": voice},
+                          label="Audio rezumat", fail_msg="Nu am putut genera audio pentru rezumat.")
+
+    if st.button("🖼️ Generează imagine", key=f"gen-img-{it['id']}"):
+        _submit_media(f"img-{it['id']}", "image",
+                      {"title": it["title"], "author": it["author"], "themes": it["themes"], "summary": it["summary"],
+                       "style": style, "size": size},
+                      label="Imagine", fail_msg="Nu am putut genera imaginea. Verifică OPENAI_API_KEY sau încearcă alt stil.",
+                      caption=f"Imagine generată pentru „{it['title']}” ({style})", file_name=f"{_slug(it['title'])}.png")
+
+    if st.button("📚 Cărți similare", key=f"sim-{it['id']}"):
+        try:
+            neighbours = _similar(it["id"], persist_dir, 5)
+        except service_client.ServiceError as e:
+            neighbours = None
+            st.warning(f"Serviciul de recomandare nu răspunde: {e}")
+        if neighbours:
+            for meta in neighbours:
+                st.markdown(f"- **{meta.get('title')}** — {meta.get('author')} *({meta.get('year')})* · {int(meta['score']*100)}%")
+        elif neighbours is not None:
+            st.info("Nu există încă un graf de similaritate. Rulează ingest-ul.")
 
 # -------------------- Render --------------------
 st.markdown("""
@@ -326,19 +425,27 @@ st.markdown("""
 
 res = st.session_state.get("results")
 if res:
+    res = item_store.expand(res, loader=_load_items)
     if res.get("blocked"):
         st.warning(res["msg"])
     else:
         st.markdown("### Răspuns")
-        st.success(res["answer"])
-        if st.button("🔊 Ascultă răspunsul", key="tts-answer", use_container_width=True):
-            audio, mime = tts_bytes(res["answer"], voice=tts_voice)
-            if audio: st.audio(audio, format=mime)
-            else: st.warning("Nu am putut genera audio.")
+        if res.get("degraded"):
+            # Bugetul LLM epuizat (admission): potrivirile fără recomandarea generată.
+            st.info(res["answer"])
+        else:
+            st.success(res["answer"])
+            if res.get("cached"):
+                st.caption("⚡ Răspuns refolosit din cache-ul semantic (cerere similară, aceiași candidați).")
+            render_answer_tts(res["answer"], tts_voice)
+        # Mereu randat: un job nou (click în fragment) apare la următorul tick, fără rerularea paginii.
+        render_media_jobs(("tts-answer",))
         st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
 
         st.markdown("### Potriviri")
         st.caption("Prima carte este recomandarea principală; apoi continuă potrivirile după relevanță.")
+        if res.get("filters"):
+            st.caption(f"🔍 Filtre aplicate: {res['filters']}")
         items = res.get("items", [])
         if not items:
             st.info("Nu am găsit potriviri. Verifică ortografia sau încearcă alt mod de căutare.")
@@ -352,28 +459,64 @@ if res:
                     st.markdown(f'<div class="scorebar"><div style="width:{int(it["score"]*100)}%"></div></div>', unsafe_allow_html=True)
                     badges = "".join([f'<span class="badge">{t.strip()}</span>' for t in it["themes"].split(",") if t.strip()])
                     if badges: st.markdown(badges, unsafe_allow_html=True)
-
-                    with st.expander("Rezumat"):
-                        st.write(it["summary"])
-                        if st.button("🔊 Citește rezumatul", key=f"tts-sum-{it['id']}"):
-                            audio, mime = tts_bytes(it["summary"], voice=tts_voice)
-                            if audio: st.audio(audio, format=mime)
-                            else: st.warning("Nu am putut genera audio pentru rezumat.")
-
-                    if st.button("🖼️ Generează imagine", key=f"gen-img-{it['id']}"):
-                        with st.spinner("Generez imaginea..."):
-                            img_bytes, mime, used_prompt = generate_book_image(
-                                title=it["title"], author=it["author"], themes=it["themes"], summary=it["summary"],
-                                style=img_style, size=img_size
-                            )
-                        if img_bytes:
-                            st.image(img_bytes, caption=f"Imagine generată pentru „{it['title']}” ({img_style})")
-                            def _slug(s):
-                                import re
-                                return re.sub(r"[^a-z0-9]+","-", (s or '').lower()).strip("-") or "imagine-carte"
-                            st.download_button("⬇️ Descarcă PNG", data=img_bytes, file_name=f"{_slug(it['title'])}.png", mime=mime)
-                        else:
-                            st.warning("Nu am putut genera imaginea. Verifică OPENAI_API_KEY sau încearcă alt stil.")
+                    render_card_media(it, tts_voice, img_style, img_size, persist)
+                    render_media_jobs((f"tts-sum-{it['id']}", f"img-{it['id']}"))
                     st.markdown('</div>', unsafe_allow_html=True)
 
 st.markdown("<br/><div class='footer-note'>RAG: ChromaDB + OpenAI · TTS · Image Gen · Custom Theme</div>", unsafe_allow_html=True)
+
+# -------------------- Warm-up --------------------
+@st.cache_resource(show_spinner=False)
+def _warm_up_in_background(persist_dir: str, engine_name: str) -> Dict:
+    """O dată per proces și store, după prima randare: importuri grele, colecția și indexurile."""
+    state = {"status": "running"}
+
+    def run():
+        t0 = time.perf_counter()
+        try:
+            state.update(info=recommender.warm_up(Path(persist_dir), engine_name), status="done")
+        except Exception as e:
+            state.update(status="failed", error=f"{type(e).__name__}: {e}")
+        state["seconds"] = time.perf_counter() - t0
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+    return state
+
+# Cu serviciu extern, workerii lui sunt deja calzi; local, pregătim prima căutare în fundal.
+warm_state = _warm_up_in_background(str(persist), engine) if client is None else None
+
+# -------------------- Debug: waterfall --------------------
+if debug_trace:
+    with st.sidebar:
+        st.markdown("<hr/>", unsafe_allow_html=True)
+        st.subheader("🐞 Timpi pe etape")
+        if warm_state is not None:
+            st.caption(f"Warm-up: {warm_state['status']}"
+                       + (f" în {warm_state['seconds']:.1f} s" if "seconds" in warm_state else "")
+                       + (f" · {warm_state['error']}" if "error" in warm_state else ""))
+        tr = (st.session_state.get("results") or {}).get("trace")
+        if not tr:
+            st.caption("Nicio cerere încă.")
+        else:
+            st.caption(f"Cerere: {tr['attrs'].get('mode')} · total {tr['duration_s'] * 1000:.0f} ms")
+            for row in tracing.waterfall(tr):
+                extra = " · ".join(f"{k}={v}" for k, v in row["attrs"].items())
+                label = "&nbsp;" * 4 * row["depth"] + f"{row['name']} · {row['ms']:.0f} ms" + (f" · {extra}" if extra else "") + (" ⚠️" if row["error"] else "")
+                st.markdown(f'<div class="small">{label}</div>'
+                            f'<div class="scorebar"><div style="margin-left:{row["start_pct"]:.1f}%;width:{row["width_pct"]:.1f}%"></div></div>',
+                            unsafe_allow_html=True)
+        saved = {name: s for name, s in singleflight.stats().items() if s["upstream"] or s["coalesced"]}
+        if saved:
+            st.caption("Apeluri comasate (în acest proces): " + " · ".join(
+                f"{name} {s['coalesced']}/{s['upstream'] + s['coalesced']}" for name, s in sorted(saved.items())))
+        if client is None:
+            rejected = {op: sum(s["rejected"].values()) for op, s in admission.stats().items() if s["rejected"]}
+            if rejected:
+                st.caption("Cereri respinse (admitere): " + " · ".join(f"{op} {n}" for op, n in sorted(rejected.items())))
+        ist = item_store.ITEMS.stats()
+        st.caption(f"Depozit cărți (comun): {ist['items']}/{ist['max_items']} · hit rate {ist['hit_rate']:.0%}"
+                   f" · {ist['evictions']} evacuări · {len(item_store.ANSWERS)} răspunsuri")
+        with st.expander("Metrici (Prometheus)"):
+            prom = tracing.export_prometheus()
+            st.code(prom, language="text")
+            st.download_button("⬇️ metrics.prom", data=prom, file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark.py — benchmark end-to-end cu un stub OpenAI local (fără apeluri reale la API)
+- Pornește openai_stub (latență configurabilă per endpoint) și setează OPENAI_BASE_URL.
+- Pentru fiecare dimensiune de catalog (ex. 1k / 100k / 1M) generează cărți sintetice
+  cu Database_Books.build_synthetic_db și măsoară:
+    sqlite_load        rânduri/s la încărcarea în SQLite (executemany, WAL)
+    chroma_ingest      rânduri/s la ingest în Chroma (embeddings din stub), max --ingest-limit rânduri
+    compute_results    latență p50/p95/p99 per mod de căutare + defalcare pe etape (tracing)
+    title_detection    best_title_index peste toate titlurile
+    moderation         is_inappropriate per cerere
+    placeholder_image  fallback-ul local Pillow din generate_book_image (endpoint-ul de imagini „cade”)
+    startup            pornire la rece în subprocese: `--help` al CLI-ului și importul modulelor
+                       (recommender, service, modulele UI); timp total p50/p95 + defalcarea
+                       `python -X importtime` pe pachete și ce module grele s-au încărcat
+- Rezultatele se scriu ca JSON (--out); --compare BASELINE.json afișează diferențele și
+  marchează regresiile peste --tolerance.
+
+Exemple:
+    python benchmark.py --sizes 1000 --queries 20
+    python benchmark.py --sizes 1000,100000,1000000 --ingest-limit 20000 --latency embeddings=0.02,chat=0.3 --out bench.json
+    python benchmark.py --sizes 1000 --compare bench.json
+    python benchmark.py --startup-only --out startup.json      (doar pornirea; fără stub / catalog)
+"""
+from __future__ import annotations
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+import openai_stub
+import tracing
+import Database_Books
+
+# -------------------------- helpers --------------------------
+
+def summarize(samples_s: Sequence[float]) -> Dict:
+    a = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    if not len(a):
+        return {"n": 0}
+    return {"n": int(len(a)), "mean_ms": float(a.mean()), "p50_ms": float(np.percentile(a, 50)),
+            "p95_ms": float(np.percentile(a, 95)), "p99_ms": float(np.percentile(a, 99)),
+            "min_ms": float(a.min()), "max_ms": float(a.max())}
+
+def timed(fn: Callable, args_list: Sequence, warmup: int = 1) -> Dict:
+    for args in list(args_list)[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+def stage_breakdown() -> Dict:
+    """Media pe etapă (ms) din histogramele tracing, de la ultimul reset."""
+    snap = tracing.snapshot()["stages"]
+    return {stage: {"count": h["count"], "mean_ms": 1000.0 * h["sum"] / h["count"]} for stage, h in snap.items() if h["count"]}
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except Exception:
+        return None
+
+def _typo(s: str, rng: random.Random) -> str:
+    if len(s) < 4:
+        return s
+    i = rng.randrange(1, len(s) - 1)
+    return s[:i] + s[i + 1:]
+
+# -------------------------- benchmarks --------------------------
+
+def bench_sqlite_load(db_path: Path, n: int, seed: int) -> Dict:
+    t0 = time.perf_counter()
+    rows = Database_Books.build_synthetic_db(db_path, n, seed)
+    dt = time.perf_counter() - t0
+    return {"rows": rows, "seconds": dt, "rows_per_s": rows / max(dt, 1e-9)}
+
+def bench_chroma_ingest(db_path: Path, persist_dir: Path, limit: int, batch_size: int = 500) -> Dict:
+    from load_to_chroma_and_search import ChromaLoader
+    loader = ChromaLoader(persist_dir, batch_size=batch_size)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cur = conn.execute("SELECT * FROM book_summaries ORDER BY id LIMIT ?;", (limit,))
+    t0 = time.perf_counter()
+    rows = cur.fetchmany(batch_size)
+    while rows:
+        loader.add(rows)
+        rows = cur.fetchmany(batch_size)
+    upsert_s = time.perf_counter() - t0
+    loader.finish()
+    total_s = time.perf_counter() - t0
+    conn.close()
+    n = len(loader.changed)
+    return {"rows": n, "upsert_s": upsert_s, "total_s": total_s, "rows_per_s": n / max(total_s, 1e-9),
+            "upsert_rows_per_s": n / max(upsert_s, 1e-9)}
+
+def bench_compute_results(persist_dir: Path, titles: List[str], queries: int, engine: str, seed: int) -> Dict:
+    import recommender
+    import admission
+    admission.configure(enabled=False)  # latența etapelor, fără așteptări după bugetele de rate limiting
+    rng = random.Random(seed)
+    themes = list(Database_Books.SYNTH_THEMES)
+    sample_titles = rng.sample(titles, min(queries, len(titles)))
+    workloads = {
+        "Context liber": [rng.choice(recommender.SUGGESTIONS_POOL) for _ in range(queries)],
+        "După temă (hint)": [rng.choice(themes) for _ in range(queries)],
+        "Titlu (exact)": sample_titles,
+        "Titlu (conține)": [t.rsplit(" ", 1)[0] for t in sample_titles],
+    }
+    out = {}
+    for mode, qs in workloads.items():
+        for retrieval in (("hybrid", "vector", "lexical") if mode == "Context liber" else ("hybrid",)):
+            opts = {"persist": str(persist_dir), "search_mode": mode, "retrieval_mode": retrieval, "engine": engine,
+                    "use_answer_cache": False, "auto_title": mode in ("Context liber", "După temă (hint)")}
+            recommender.compute_results(qs[0], opts)  # warm-up (deschidere colecție, încărcare indexuri)
+            tracing.reset()
+            samples = []
+            for q in qs:
+                t0 = time.perf_counter()
+                recommender.compute_results(q, opts)
+                samples.append(time.perf_counter() - t0)
+            out[f"{mode} / {retrieval}"] = dict(summarize(samples), stages=stage_breakdown())
+    return out
+
+def bench_title_detection(titles: List[str], queries: int, seed: int) -> Dict:
+    import recommender
+    rng = random.Random(seed)
+    titles_norm = [recommender.normalize(t) for t in titles]
+    qs = [(recommender.normalize(_typo(t, rng)), titles_norm) for t in rng.sample(titles, min(queries, len(titles)))]
+    return timed(recommender.best_title_index, qs)
+
+def bench_moderation(queries: int, seed: int) -> Dict:
+    from profanity_filter import is_inappropriate
+    import recommender
+    rng = random.Random(seed)
+    return timed(is_inappropriate, [(rng.choice(recommender.SUGGESTIONS_POOL),) for _ in range(max(queries, 100))])
+
+def bench_placeholder_image(size: str, n: int) -> Dict:
+    if importlib.util.find_spec("PIL") is None:
+        return {"skipped": "Pillow not installed"}
+    from img_gen_utils import generate_book_image
+    args = [("Titlu de test", "Autor", "aventură, mister", "Un rezumat scurt.", "copertă minimală", size)] * n
+    return timed(generate_book_image, args, warmup=0)
+
+STARTUP_TARGETS = {
+    "cli_help": ["load_to_chroma_and_search.py", "--help"],
+    "import_recommender": ["-c", "import recommender"],
+    "import_service": ["-c", "import service"],
+    "import_ui_modules": ["-c", "import recommender, service_client, media_jobs, singleflight, theme_index, similar_books, "
+                                "query_filters, passages, answer_cache, tracing"],
+}
+HEAVY_MODULES = ("chromadb", "openai", "dotenv", "PIL", "pyttsx3", "gtts", "streamlit")
+
+def parse_importtime(stderr: str, top: int = 10) -> Dict:
+    """Ieșirea `-X importtime` -> total (ms), top pachete rădăcină după timpul propriu, module grele încărcate."""
+    per_pkg: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # antetul "self [us] | cumulative | imported package"
+        # Timpul propriu al fiecărui modul, însumat pe pachetul rădăcină (numpy.core.* -> numpy).
+        pkg = name.strip().split(".")[0]
+        per_pkg[pkg] = per_pkg.get(pkg, 0.0) + int(self_us) / 1000.0
+    ranked = sorted(per_pkg.items(), key=lambda kv: -kv[1])
+    return {"import_ms": sum(per_pkg.values()), "top": [{"package": p, "ms": ms} for p, ms in ranked[:top]],
+            "heavy_loaded": sorted(m for m in HEAVY_MODULES if m in per_pkg)}
+
+def bench_startup(repeats: int = 5) -> Dict:
+    here = Path(__file__).parent
+    out = {}
+    for name, argv in STARTUP_TARGETS.items():
+        cmd = [sys.executable, *argv]
+        probe = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=here, capture_output=True, text=True)
+        if probe.returncode != 0:
+            out[name] = {"error": (probe.stderr.strip().splitlines() or ["exit code %d" % probe.returncode])[-1]}
+            continue
+        samples = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            subprocess.run(cmd, cwd=here, capture_output=True)
+            samples.append(time.perf_counter() - t0)
+        out[name] = dict(summarize(samples), importtime=parse_importtime(probe.stderr))
+    return out
+
+# -------------------------- compare --------------------------
+
+def _flatten(d: Dict, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Linii de raport pentru metricile comune; latențe (…_ms, …_s) mai mari / debite (…_per_s) mai mici = regresie."""
+    cur, base = _flatten(current["results"]), _flatten(baseline["results"])
+    lines = []
+    for key in sorted(set(cur) & set(base)):
+        if not key.endswith(("p50_ms", "p95_ms", "rows_per_s")) or not base[key]:
+            continue
+        delta = (cur[key] - base[key]) / base[key]
+        worse = delta < -tolerance if key.endswith("_per_s") else delta > tolerance
+        lines.append(f"{'REGRESSION' if worse else 'ok':10}  {key:70} {base[key]:12.2f} -> {cur[key]:12.2f}  ({delta:+.1%})")
+    return lines
+
+# -------------------------- main --------------------------
+
+def run(sizes: List[int], queries: int, ingest_limit: int, latency: Dict[str, float], engine: str, image_size: str,
+        workdir: Path, seed: int) -> Dict:
+    server, base_url = openai_stub.start_stub(latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+    results: Dict[str, Dict] = {}
+    try:
+        results["moderation"] = bench_moderation(queries, seed)
+        for n in sizes:
+            label = f"n={n}"
+            print(f"[{label}] building synthetic catalogue…", file=sys.stderr)
+            db_path, persist = workdir / f"books_{n}.db", workdir / f"chroma_{n}"
+            r: Dict[str, Dict] = {"sqlite_load": bench_sqlite_load(db_path, n, seed)}
+            with sqlite3.connect(db_path) as conn:
+                titles = [t for (t,) in conn.execute("SELECT title FROM book_summaries;")]
+            r["title_detection"] = bench_title_detection(titles, queries, seed)
+            print(f"[{label}] Chroma ingest (≤ {ingest_limit} rows)…", file=sys.stderr)
+            r["chroma_ingest"] = bench_chroma_ingest(db_path, persist, min(n, ingest_limit))
+            if engine != "Chroma":
+                import recommender
+                import vector_engine
+                vector_engine.export_collection(recommender.get_collection(persist), persist / vector_engine.EXPORT_DIR)
+            print(f"[{label}] compute_results per search mode…", file=sys.stderr)
+            ingested = titles[:min(n, ingest_limit)]
+            r["compute_results"] = bench_compute_results(persist, ingested, queries, engine, seed)
+            results[label] = r
+        # Fallback-ul local de imagine: endpoint-ul de imagini întoarce 500.
+        server.RequestHandlerClass.state.fail.add("images")
+        results["placeholder_image"] = bench_placeholder_image(image_size, max(3, queries // 10))
+    finally:
+        server.shutdown()
+    return {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": _git_rev(), "python": platform.python_version(),
+                 "platform": platform.platform(), "sizes": sizes, "queries": queries, "ingest_limit": ingest_limit,
+                 "latency": latency, "engine": engine, "seed": seed},
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against a local OpenAI stub")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure cold start (CLI --help, module imports)")
+    parser.add_argument("--startup-repeats", type=int, default=5, help="Subprocess runs per startup target")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",") if x.strip()], default=[1000],
+                        help="Catalogue sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per search mode")
+    parser.add_argument("--ingest-limit", type=int, default=20000, help="Max rows embedded into Chroma per size")
+    parser.add_argument("--latency", type=str, default="", help="Stub latency per endpoint, e.g. embeddings=0.02,chat=0.3")
+    parser.add_argument("--engine", choices=["Chroma", "mmap float32", "mmap float16", "mmap int8"], default="Chroma")
+    parser.add_argument("--image-size", default="512x512", help="Placeholder image size")
+    parser.add_argument("--workdir", type=Path, default=None, help="Keep generated DBs / Chroma dirs here (default: temp, deleted)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=None, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change flagged as regression")
+    args = parser.parse_args()
+
+    if args.startup_only:
+        report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": _git_rev(), "python": platform.python_version(),
+                           "platform": platform.platform()},
+                  "results": {}}
+    else:
+        workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bookrag_bench_"))
+        workdir.mkdir(parents=True, exist_ok=True)
+        try:
+            report = run(args.sizes, args.queries, args.ingest_limit, openai_stub.parse_latency(args.latency),
+                         args.engine, args.image_size, workdir, args.seed)
+        finally:
+            if args.workdir is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+    print("startup (subprocess cold starts)…", file=sys.stderr)
+    report["results"]["startup"] = bench_startup(args.startup_repeats)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        lines = compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerance)
+        print("\n".join(lines) or "No comparable metrics.")
+        if any(line.startswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
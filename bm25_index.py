@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+bm25_index.py — index lexical local (BM25) + fuziune hibridă cu căutarea vectorială
+- Indexul se construiește la ingest peste textul produs de build_document_row
+  și se salvează lângă colecția Chroma (<persist_dir>/bm25_index.json).
+- hybrid_query() rulează în paralel BM25 și col.query, apoi combină clasamentele
+  prin Reciprocal Rank Fusion (RRF).
+- Dacă serviciul de embeddings nu răspunde în `vector_timeout` secunde, se
+  întoarce doar rezultatul lexical (mod degradat), fără apeluri API suplimentare.
+Rezultatul are aceeași formă ca col.query (ids/documents/metadatas/distances),
+deci show_results / _build_item_from_meta_doc funcționează nemodificate.
+"""
+from __future__ import annotations
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import tracing
+
+INDEX_FILE = "bm25_index.json"
+
+# Cuvinte de legătură frecvente în cereri (RO); nu aduc informație lexicală.
+STOPWORDS = {
+    "si", "sau", "cu", "de", "la", "in", "din", "pe", "pentru", "despre", "un", "o", "unei",
+    "unui", "al", "ale", "ai", "a", "care", "ce", "este", "sunt", "mi", "imi", "vreau", "caut",
+    "carte", "carti", "titlu", "autor", "an", "limba", "teme", "rezumat", "the", "and", "of",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Normalizează (fără diacritice, lowercase) și împarte în termeni."""
+    if not text:
+        return []
+    s = unicodedata.normalize("NFKD", str(text))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    return [t for t in re.findall(r"\w+", s) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+class BM25Index:
+    """Index invers în memorie: termen -> {doc_id: tf}. Se salvează ca index direct (doc -> tf)."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.docs: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc_id: str, text: str):
+        """Adaugă sau înlocuiește documentul (upsert incremental)."""
+        self.remove(doc_id)
+        tf = dict(Counter(tokenize(text)))
+        self.docs[doc_id] = tf
+        self.doc_len[doc_id] = sum(tf.values())
+        self._total_len += self.doc_len[doc_id]
+        for term, n in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = n
+
+    def add_many(self, ids: Iterable[str], texts: Iterable[str]):
+        for doc_id, text in zip(ids, texts):
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        tf = self.docs.pop(doc_id, None)
+        if tf is None:
+            return
+        self._total_len -= self.doc_len.pop(doc_id, 0)
+        for term in tf:
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(doc_id, None)
+                if not plist:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Returnează [(doc_id, scor_bm25)] descrescător, max k."""
+        n_docs = len(self.docs)
+        if not n_docs or k <= 0:
+            return []
+        avgdl = self._total_len / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in plist.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+    # -------------------------- persistence --------------------------
+
+    def save(self, persist_dir: Path):
+        path = Path(persist_dir) / INDEX_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"k1": self.k1, "b": self.b, "docs": self.docs}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, persist_dir: Path) -> "BM25Index | None":
+        path = Path(persist_dir) / INDEX_FILE
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        idx = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        for doc_id, tf in data.get("docs", {}).items():
+            idx.docs[doc_id] = tf
+            idx.doc_len[doc_id] = sum(tf.values())
+            idx._total_len += idx.doc_len[doc_id]
+            for term, n in tf.items():
+                idx.postings.setdefault(term, {})[doc_id] = n
+        return idx
+
+_CACHE: Dict[str, Tuple[float, BM25Index]] = {}
+
+def load_cached(persist_dir: Path) -> BM25Index | None:
+    """Încarcă indexul o singură dată per proces; se reîncarcă doar dacă fișierul s-a schimbat."""
+    path = Path(persist_dir) / INDEX_FILE
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    key = str(path.resolve())
+    hit = _CACHE.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    idx = BM25Index.load(persist_dir)
+    if idx is not None:
+        _CACHE[key] = (mtime, idx)
+    return idx
+
+def update_index(persist_dir: Path, ids: List[str], docs: List[str]) -> BM25Index:
+    """Actualizează incremental indexul de pe disc cu documentele upsert-ate."""
+    idx = BM25Index.load(persist_dir) or BM25Index()
+    idx.add_many(ids, docs)
+    idx.save(persist_dir)
+    return idx
+
+# -------------------------- fusion --------------------------
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """RRF: scor(d) = Σ 1 / (k + rang_d). Rangurile încep de la 1."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+def _lexical(index: BM25Index, col, query: str, n_results: int, where: Dict | None, where_document: Dict | None):
+    """BM25; cu filtre, se iau mai mulți candidați și se păstrează doar cei care trec de `where`."""
+    if not where and not where_document:
+        return index.search(query, n_results)
+    hits = index.search(query, n_results * 5)
+    if not hits:
+        return hits
+    allowed = set(col.get(ids=[doc_id for doc_id, _ in hits], where=where, where_document=where_document, include=[])["ids"])
+    return [(doc_id, score) for doc_id, score in hits if doc_id in allowed][:n_results]
+
+def hybrid_query(col, query: str, n_results: int, persist_dir: Path, lexical_query: str | None = None,
+                 mode: str = "hybrid", vector_timeout: float = 8.0, where: Dict | None = None,
+                 where_document: Dict | None = None, query_embedding=None) -> Dict:
+    """
+    Căutare hibridă: BM25 local + col.query în paralel, fuzionate prin RRF.
+    mode: "hybrid" | "vector" | "lexical". Fără index BM25 pe disc -> doar vectorial.
+    `where` / `where_document` (filtre Chroma) restrâng candidații pe ambele ramuri.
+    `query_embedding` (deja calculat de apelant) evită încă un apel de embeddings.
+    """
+    include = ["documents", "metadatas", "distances"]
+    vec_query = {"query_texts": [query]} if query_embedding is None else {"query_embeddings": [list(map(float, query_embedding))]}
+    index = load_cached(persist_dir) if mode != "vector" else None
+    if index is None or not len(index):
+        if mode == "lexical":
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        return col.query(n_results=n_results, include=include, where=where, where_document=where_document, **vec_query)
+
+    vec_res = None
+    if mode == "hybrid":
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(col.query, n_results=n_results, include=include,
+                             where=where, where_document=where_document, **vec_query)
+        lexical = _lexical(index, col, lexical_query or query, n_results, where, where_document)
+        try:
+            vec_res = future.result(timeout=vector_timeout)
+        except FutureTimeout:
+            vec_res = None  # mod degradat: doar lexical
+            tracing.annotate(vector_fallback="timeout")
+        except Exception as e:
+            # Embeddings / Chroma indisponibile (5xx, auth, rețea): tot mod degradat, doar lexical.
+            vec_res = None
+            tracing.annotate(vector_fallback=type(e).__name__)
+        finally:
+            pool.shutdown(wait=False)
+        if vec_res and vec_res.get("skipped_shards"):
+            # Ramura vectorială rulează în alt thread: raportăm aici shard-urile ignorate.
+            tracing.annotate(skipped_shards=",".join(vec_res["skipped_shards"]))
+    else:
+        lexical = _lexical(index, col, lexical_query or query, n_results, where, where_document)
+
+    vec_ids = (vec_res or {}).get("ids", [[]])[0]
+    vec_dist = dict(zip(vec_ids, (vec_res or {}).get("distances", [[]])[0]))
+    rows: Dict[str, Tuple[str, Dict]] = {
+        _id: (doc, meta) for _id, doc, meta in zip(vec_ids, vec_res["documents"][0], vec_res["metadatas"][0])
+    } if vec_res else {}
+
+    lex_ids = [doc_id for doc_id, _ in lexical]
+    fused = reciprocal_rank_fusion([r for r in (vec_ids, lex_ids) if r])[:n_results]
+    missing = [doc_id for doc_id, _ in fused if doc_id not in rows]
+    if missing:
+        data = col.get(ids=missing, include=["documents", "metadatas"])
+        for _id, doc, meta in zip(data.get("ids", []), data.get("documents", []), data.get("metadatas", [])):
+            rows[_id] = (doc, meta)
+
+    # Distanța: cea vectorială dacă există; altfel derivată din scorul BM25 normalizat.
+    top_bm25 = lexical[0][1] if lexical else 1.0
+    bm25 = dict(lexical)
+    out = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+    for doc_id, _ in fused:
+        if doc_id not in rows:
+            continue
+        doc, meta = rows[doc_id]
+        dist = vec_dist.get(doc_id, 1.0 - bm25.get(doc_id, 0.0) / (top_bm25 or 1.0))
+        out["ids"][0].append(doc_id)
+        out["documents"][0].append(doc)
+        out["metadatas"][0].append(meta)
+        out["distances"][0].append(dist)
+    return out
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+catalog_import.py — import în flux (memorie constantă) al cataloagelor JSONL / CSV / JSON
+- iter_records() citește fișierul incremental:
+    .jsonl / .ndjson  un obiect JSON pe linie
+    .csv              antet cu coloanele title, author, year, language, summary, themes[, full_text]
+    .json             un array JSON de obiecte, decodat bucată cu bucată (raw_decode); un
+                      element malformat oprește importul cu offset-ul lui în octeți
+- validate_record() normalizează și validează fiecare rând (titlu + rezumat obligatorii,
+  an întreg, teme ca listă sau string separat prin virgulă).
+- load_catalogue() scrie în `book_summaries` cu executemany, câte o tranzacție mare
+  per lot; `on_batch` primește fiecare lot valid (ex. pentru încărcare directă în Chroma).
+- Progress raportează periodic rânduri/s pe stderr.
+"""
+from __future__ import annotations
+import csv
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from Database_Books import UPSERT_SQL, book_params, configure_bulk, init_db
+
+MAX_ELEMENT_CHARS = 16 << 20  # peste orice carte reală, inclusiv full_text
+
+# -------------------------- readers --------------------------
+
+def iter_jsonl(path: Path) -> Iterator[Tuple[int, object]]:
+    with open(path, encoding="utf-8-sig") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield lineno, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield lineno, ValueError(f"invalid JSON: {e.msg}")
+
+def iter_csv(path: Path) -> Iterator[Tuple[int, object]]:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for lineno, row in enumerate(csv.DictReader(f), start=2):
+            yield lineno, row
+
+def iter_json_array(path: Path, chunk_size: int = 1 << 16,
+                    max_element_chars: int = MAX_ELEMENT_CHARS) -> Iterator[Tuple[int, object]]:
+    """Decodează un array JSON de obiecte fără a-l încărca integral în memorie.
+    Bufferul se compactează doar la citirea unei bucăți noi; un element care nu se poate
+    decoda nici după max_element_chars caractere e considerat malformat (ValueError cu offset-ul în octeți)."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8-sig") as f:
+        buf, pos, n, started, eof = "", 0, 0, False, False
+        consumed = 0  # octeți dinaintea lui buf[0]
+
+        def read_more():
+            nonlocal buf, pos, eof, consumed
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            consumed += len(buf[:pos].encode("utf-8"))
+            buf, pos = buf[pos:] + chunk, 0
+
+        while True:
+            # Sărim peste spații, '[' inițial și virgule dintre elemente.
+            while True:
+                while pos < len(buf) and (buf[pos].isspace() or buf[pos] == "," or (not started and buf[pos] == "[")):
+                    started = started or buf[pos] == "["
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                read_more()
+            if pos >= len(buf):
+                return
+            if not started:
+                raise ValueError(f"{path}: expected a top-level JSON array (use .jsonl for other layouts)")
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof or len(buf) - pos > max_element_chars:
+                    offset = consumed + len(buf[:pos].encode("utf-8"))
+                    raise ValueError(f"{path}: malformed JSON array element #{n + 1} at byte offset {offset}: {e.msg}") from None
+                read_more()
+                continue
+            n += 1
+            yield n, obj
+            pos = end
+
+def iter_records(path: Path, fmt: str | None = None) -> Iterator[Tuple[int, object]]:
+    """(poziție, obiect) din fișier; formatul se deduce din extensie dacă lipsește."""
+    path = Path(path)
+    fmt = (fmt or path.suffix.lstrip(".")).lower()
+    if fmt in ("jsonl", "ndjson"):
+        return iter_jsonl(path)
+    if fmt == "csv":
+        return iter_csv(path)
+    if fmt == "json":
+        return iter_json_array(path)
+    raise ValueError(f"Unsupported catalogue format: {fmt!r} (expected jsonl, csv or json)")
+
+# -------------------------- validation --------------------------
+
+def validate_record(obj) -> Tuple[Dict | None, str]:
+    """Întoarce (carte_normalizată, '') sau (None, motiv)."""
+    if isinstance(obj, Exception):
+        return None, str(obj)
+    if not isinstance(obj, dict):
+        return None, "row is not an object"
+    title = str(obj.get("title") or "").strip()
+    summary = obj.get("summary")
+    if isinstance(summary, list):
+        summary = "\n".join(str(s) for s in summary)
+    summary = str(summary or "").strip()
+    if not title:
+        return None, "missing title"
+    if not summary:
+        return None, "missing summary"
+    year = obj.get("year")
+    if year in (None, ""):
+        year = None
+    else:
+        try:
+            year = int(str(year).strip())
+        except ValueError:
+            return None, f"invalid year: {year!r}"
+    full_text = obj.get("full_text") or obj.get("description") or ""
+    if isinstance(full_text, list):
+        full_text = "\n\n".join(str(s) for s in full_text)
+    themes = obj.get("themes") or ""
+    if isinstance(themes, (list, tuple)):
+        themes = ", ".join(str(t).strip() for t in themes if str(t).strip())
+    return {
+        "title": title,
+        "author": (str(obj.get("author")).strip() or None) if obj.get("author") else None,
+        "year": year,
+        "language": str(obj.get("language") or "ro").strip() or "ro",
+        "summary": summary,
+        "themes": str(themes).strip(),
+        "full_text": str(full_text).strip() or None,
+    }, ""
+
+# -------------------------- loading --------------------------
+
+class Progress:
+    """Raportează rânduri/s pe stderr cel mult o dată la `every_s` secunde."""
+
+    def __init__(self, label: str = "rows", every_s: float = 2.0, stream=sys.stderr):
+        self.label, self.every_s, self.stream = label, every_s, stream
+        self.start = self.last = time.perf_counter()
+        self.n = 0
+
+    def update(self, n: int):
+        self.n += n
+        now = time.perf_counter()
+        if now - self.last >= self.every_s:
+            self.last = now
+            print(f"  {self.n:,} {self.label} · {self.rate():,.0f}/s", file=self.stream, flush=True)
+
+    def rate(self) -> float:
+        return self.n / max(time.perf_counter() - self.start, 1e-9)
+
+    def done(self) -> str:
+        return f"{self.n:,} {self.label} in {time.perf_counter() - self.start:.1f}s ({self.rate():,.0f}/s)"
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load_catalogue(path: Path, sqlite_path: Path | None = None, batch_size: int = 5000, fmt: str | None = None,
+                   on_batch: Callable[[List[Dict]], None] | None = None) -> Dict:
+    """
+    Citește catalogul în flux, validează și încarcă în SQLite (dacă `sqlite_path`) și/sau
+    trimite loturile valide la `on_batch`. Întoarce statistici {ok, bad, errors, rate}.
+    """
+    errors: List[str] = []
+    stats = {"ok": 0, "bad": 0}
+    progress = Progress("rows")
+
+    def counted(records):
+        for pos, obj in records:
+            book, err = validate_record(obj)
+            if book is None:
+                stats["bad"] += 1
+                if len(errors) < 20:
+                    errors.append(f"#{pos}: {err}")
+                continue
+            yield book
+
+    conn = None
+    if sqlite_path is not None:
+        conn = sqlite3.connect(sqlite_path)
+        init_db(conn)
+        configure_bulk(conn)
+    try:
+        for batch in batched(counted(iter_records(path, fmt)), batch_size):
+            if conn is not None:
+                with conn:  # o singură tranzacție per lot
+                    conn.executemany(UPSERT_SQL, [book_params(b) for b in batch])
+            if on_batch is not None:
+                on_batch(batch)
+            stats["ok"] += len(batch)
+            progress.update(len(batch))
+    finally:
+        if conn is not None:
+            conn.close()
+    stats.update(errors=errors, rate=progress.rate(), summary=progress.done())
+    return stats
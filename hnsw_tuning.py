@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+hnsw_tuning.py — parametri HNSW pentru colecția Chroma + sweep recall/latență
+- index_metadata() produce cheile `hnsw:*` pe care Chroma le persistă împreună cu
+  colecția la creare (space, M, construction_ef, search_ef).
+- sweep() reconstruiește, pentru fiecare combinație de parametri, un index temporar din
+  embedding-urile deja stocate (fără apeluri API) și îl compară cu o căutare exactă
+  (brute force NumPy): recall@k, latență p50/p95 per interogare, timp de build,
+  dimensiunea indexului pe disc.
+"""
+from __future__ import annotations
+import itertools
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+SPACES = ("l2", "cosine", "ip")
+HNSW_DEFAULTS = {"space": "l2", "M": 16, "construction_ef": 100, "search_ef": 10}
+
+def index_metadata(space: str | None = None, M: int | None = None, construction_ef: int | None = None,
+                   search_ef: int | None = None) -> Dict | None:
+    """Metadata de colecție cu parametrii HNSW setați explicit (None = default Chroma)."""
+    meta = {}
+    if space:
+        if space not in SPACES:
+            raise ValueError(f"space must be one of {SPACES}")
+        meta["hnsw:space"] = space
+    if M:
+        meta["hnsw:M"] = int(M)
+    if construction_ef:
+        meta["hnsw:construction_ef"] = int(construction_ef)
+    if search_ef:
+        meta["hnsw:search_ef"] = int(search_ef)
+    return meta or None
+
+def describe_index(col) -> Dict:
+    """Parametrii HNSW efectivi ai colecției (defaulturile Chroma unde nu sunt setați)."""
+    meta = col.metadata or {}
+    return {key: meta.get(f"hnsw:{key}", default) for key, default in HNSW_DEFAULTS.items()}
+
+def _fetch(col, batch_size: int = 5000):
+    ids: List[str] = []
+    chunks = []
+    for offset in range(0, int(col.count()), batch_size):
+        data = col.get(include=["embeddings"], limit=batch_size, offset=offset)
+        ids.extend(data["ids"])
+        chunks.append(np.asarray(data["embeddings"], dtype=np.float32))
+    return ids, (np.vstack(chunks) if chunks else np.empty((0, 0), dtype=np.float32))
+
+def exact_topk(emb: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Indicii top-k exacți (brute force) în metrica `space`."""
+    if space == "cosine":
+        e = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+        q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        dist = -(q @ e.T)
+    elif space == "ip":
+        dist = -(queries @ emb.T)
+    else:
+        dist = (queries ** 2).sum(1)[:, None] - 2.0 * queries @ emb.T + (emb ** 2).sum(1)[None, :]
+    k = min(k, emb.shape[0])
+    part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(dist, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+def sweep(col, spaces: Sequence[str] = ("cosine",), Ms: Sequence[int] = (8, 16, 32),
+          construction_efs: Sequence[int] = (100, 200), search_efs: Sequence[int] = (10, 50, 100),
+          k: int = 10, n_queries: int = 200, batch_size: int = 1000, seed: int = 0) -> List[Dict]:
+    """Rulează grila de parametri; întoarce câte un rând de rezultate per combinație."""
+    ids, emb = _fetch(col)
+    if not ids:
+        raise RuntimeError("Collection is empty; ingest first.")
+    rng = np.random.default_rng(seed)
+    q_idx = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+    # Interogări = embedding-uri existente ușor perturbate (nu doar auto-potriviri triviale).
+    scale = float(np.std(emb)) * 0.1 or 1e-3
+    queries = emb[q_idx] + rng.normal(0.0, scale, size=(len(q_idx), emb.shape[1])).astype(np.float32)
+
+    rows: List[Dict] = []
+    for space in spaces:
+        truth = exact_topk(emb, queries, k, space)
+        truth_ids = [{ids[j] for j in row} for row in truth]
+        for M, cef, sef in itertools.product(Ms, construction_efs, search_efs):
+            tmp = Path(tempfile.mkdtemp(prefix="hnsw_tune_"))
+            try:
+                import chromadb  # lazy: index_metadata() e folosit și de CLI-ul de ingest (--help rapid)
+                client = chromadb.PersistentClient(path=str(tmp))
+                tcol = client.create_collection(name="tune", metadata=index_metadata(space, M, cef, sef))
+                t0 = time.perf_counter()
+                for start in range(0, len(ids), batch_size):
+                    tcol.add(ids=ids[start:start + batch_size], embeddings=emb[start:start + batch_size].tolist())
+                build_s = time.perf_counter() - t0
+                lat, hits = [], 0
+                for qi, q in enumerate(queries):
+                    t0 = time.perf_counter()
+                    res = tcol.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+                    lat.append(time.perf_counter() - t0)
+                    hits += len(truth_ids[qi].intersection(res["ids"][0]))
+                size = _dir_size(tmp)
+                del tcol, client
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            lat_ms = np.asarray(lat) * 1000.0
+            rows.append({
+                "space": space, "M": M, "construction_ef": cef, "search_ef": sef,
+                "recall_at_k": hits / float(len(queries) * min(k, len(ids))),
+                "p50_ms": float(np.percentile(lat_ms, 50)), "p95_ms": float(np.percentile(lat_ms, 95)),
+                "build_s": build_s, "index_bytes": size,
+            })
+    return rows
+
+def format_table(rows: List[Dict], k: int) -> str:
+    head = f"{'space':7} {'M':>4} {'c_ef':>5} {'s_ef':>5} {'recall@'+str(k):>10} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'size MB':>8}"
+    lines = [head, "-" * len(head)]
+    for r in rows:
+        lines.append(f"{r['space']:7} {r['M']:>4} {r['construction_ef']:>5} {r['search_ef']:>5} {r['recall_at_k']:>10.4f} "
+                     f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['build_s']:>8.2f} {r['index_bytes'] / 1e6:>8.2f}")
+    return "\n".join(lines)
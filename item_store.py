@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+item_store.py — stocare compactă a rezultatelor per sesiune, peste un depozit comun de cărți
+- ItemStore: depozit partajat (per proces), limitat (LRU), de înregistrări BookRecord cu
+  __slots__ (id, titlu, autor, an, teme, rezumat), cheiate pe (namespace, id); namespace =
+  store-ul din care vin (ex. calea Chroma sau URL-ul serviciului). La miss se încarcă din
+  colecție printr-un `loader(ids) -> [item]`, deci o evacuare nu pierde date.
+- AnswerStore: răspunsurile LLM, adresate prin conținut (hash) și tot limitate; răspunsurile
+  identice (ex. din cache-ul semantic) ocupă o singură dată memoria.
+- compact(results) păstrează în sesiune doar ids, scoruri (array float32), referința
+  răspunsului și câmpurile mici (query, filtre, trace); expand() reconstruiește forma
+  completă a lui recommender.compute_results doar pentru randare.
+"""
+from __future__ import annotations
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_MAX_ITEMS = 20000
+DEFAULT_MAX_ANSWERS = 4096
+ANSWER_EXPIRED = "Răspunsul nu mai este disponibil în memorie; caută din nou pentru a-l regenera."
+
+Loader = Callable[[List[str]], List[Dict]]
+
+class BookRecord:
+    __slots__ = ("id", "title", "author", "year", "themes", "summary")
+
+    def __init__(self, id, title, author, year, themes, summary):
+        self.id, self.title, self.author, self.year, self.themes, self.summary = id, title, author, year, themes, summary
+
+    @classmethod
+    def from_item(cls, it: Dict) -> "BookRecord":
+        return cls(it["id"], it.get("title"), it.get("author"), it.get("year"), it.get("themes", ""), it.get("summary", ""))
+
+    def as_item(self, score: float = 1.0) -> Dict:
+        return {"id": self.id, "title": self.title, "author": self.author, "year": self.year,
+                "themes": self.themes, "summary": self.summary, "score": score}
+
+class ItemStore:
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS):
+        self.max_items = max_items
+        self._records: "OrderedDict[Tuple[str, str], BookRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def put_items(self, namespace: str, items: Iterable[Dict]):
+        with self._lock:
+            for it in items:
+                key = (namespace, it["id"])
+                self._records[key] = BookRecord.from_item(it)
+                self._records.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._records) > self.max_items:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, namespace: str, ids: List[str], loader: Loader | None = None) -> Dict[str, BookRecord]:
+        """{id: BookRecord} pentru ids; lipsurile se încarcă (o dată, în lot) prin loader."""
+        out, missing = {}, []
+        with self._lock:
+            for _id in ids:
+                rec = self._records.get((namespace, _id))
+                if rec is None:
+                    missing.append(_id)
+                else:
+                    self._records.move_to_end((namespace, _id))
+                    out[_id] = rec
+            self.hits += len(out)
+            self.misses += len(missing)
+        if missing and loader is not None:
+            loaded = loader(missing)
+            self.put_items(namespace, loaded)
+            out.update((it["id"], BookRecord.from_item(it)) for it in loaded)
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"items": len(self._records), "max_items": self.max_items, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+class AnswerStore:
+    def __init__(self, max_answers: int = DEFAULT_MAX_ANSWERS):
+        self.max_answers = max_answers
+        self._answers: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        ref = hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+        with self._lock:
+            self._answers[ref] = text
+            self._answers.move_to_end(ref)
+            while len(self._answers) > self.max_answers:
+                self._answers.popitem(last=False)
+        return ref
+
+    def get(self, ref: str) -> str | None:
+        with self._lock:
+            text = self._answers.get(ref)
+            if text is not None:
+                self._answers.move_to_end(ref)
+            return text
+
+    def __len__(self):
+        return len(self._answers)
+
+# Un depozit per proces, partajat de toate sesiunile.
+ITEMS = ItemStore()
+ANSWERS = AnswerStore()
+
+def compact(results: Dict, namespace: str, items: ItemStore | None = None, answers: AnswerStore | None = None) -> Dict:
+    """Rezultatul complet -> forma de sesiune (ids + scoruri + referința răspunsului)."""
+    if results.get("blocked"):
+        return results
+    items, answers = items or ITEMS, answers or ANSWERS
+    found = results.get("items", [])
+    items.put_items(namespace, found)
+    out = {k: v for k, v in results.items() if k not in ("items", "answer")}
+    out.update(namespace=namespace, ids=tuple(it["id"] for it in found),
+               scores=array("f", (float(it.get("score", 1.0)) for it in found)),
+               answer_ref=answers.put(results.get("answer") or ""))
+    passages = {it["id"]: it["passage"] for it in found if it.get("passage")}
+    if passages:
+        out["passages"] = passages  # doar în modul „Pasaje”: textul pasajului depinde de cerere
+    return out
+
+def expand(session_results: Dict, loader: Loader | None = None, items: ItemStore | None = None,
+           answers: AnswerStore | None = None) -> Dict:
+    """Forma de sesiune -> {"items", "answer", ...} ca la compute_results (pentru randare)."""
+    if session_results.get("blocked") or "ids" not in session_results:
+        return session_results
+    items, answers = items or ITEMS, answers or ANSWERS
+    records = items.get_many(session_results["namespace"], list(session_results["ids"]), loader)
+    passages = session_results.get("passages", {})
+    out_items = []
+    for _id, score in zip(session_results["ids"], session_results["scores"]):
+        rec = records.get(_id)
+        if rec is None:
+            continue  # carte ștearsă între timp din colecție
+        it = rec.as_item(float(score))
+        if _id in passages:
+            it["passage"] = passages[_id]
+        out_items.append(it)
+    answer = answers.get(session_results["answer_ref"])
+    out = {k: v for k, v in session_results.items() if k not in ("ids", "scores", "answer_ref", "passages", "namespace")}
+    out.update(items=out_items, answer=answer if answer is not None else ANSWER_EXPIRED)
+    return out
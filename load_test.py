@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+load_test.py — generator de încărcare headless pentru fluxul de recomandare
+- N sesiuni simulate (thread-uri) rulează concurent recommender.compute_results
+  (moderare -> regăsire -> llm_recommend), plus opțional TTS / imagine pentru o
+  fracțiune din cereri, exact ca la un click în app_streamlit.py.
+- Cererile: SUGGESTIONS_POOL și/sau un log de cereri (--query-log): text simplu (o
+  cerere pe linie) sau JSONL ({"query": ...} sau trace-uri scrise cu TRACE_JSONL).
+- Concurența crește în trepte (--concurrency 1,2,4,8,16), fiecare treaptă rulează
+  --duration secunde; per treaptă: debit (req/s), p50/p95/p99, rata de erori, hit-rate
+  cache semantic, apeluri upstream comasate (singleflight), cereri respinse / degradate de
+  admission (fiecare sesiune simulată are bugetul ei; --no-admission le dezactivează). Se oprește devreme dacă o
+  treaptă depășește SLO-ul (--slo-p95-ms / --max-error-rate / --max-reject-rate) și raportează
+  concurența maximă susținută = capacitatea serverului: în --max-reject-rate intră doar cererile
+  respinse / degradate de limitele globale (rate, coadă); cele oprite de bugetul sesiunii
+  (session_rate) sunt ritmul clientului, raportate separat ca "paced".
+- Implicit pornește openai_stub (API simulat) și folosește store-ul Chroma real din --persist.
+
+Exemple:
+    python load_test.py --persist ./chroma_book_summaries --concurrency 1,4,16,32 --duration 20
+    python load_test.py --query-log traces.jsonl --modes "Context liber=0.8,Titlu (conține)=0.2" --tts-rate 0.1 --out load.json
+    python load_test.py --real-api --concurrency 1,2 --duration 10
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import admission
+import openai_stub
+import singleflight
+import tracing
+
+def load_queries(path: Path | None, include_suggestions: bool = True) -> List[str]:
+    import recommender
+    queries = list(recommender.SUGGESTIONS_POOL) if include_suggestions else []
+    if path is None:
+        return queries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                q = obj.get("query") or (obj.get("attrs") or {}).get("query")
+            else:
+                q = line
+            if q:
+                queries.append(str(q))
+    return queries
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """"Context liber=0.8,Titlu (conține)=0.2" -> [(mod, pondere)]"""
+    import recommender
+    mix = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, sep, weight = part.rpartition("=")
+        mode, w = (name.strip(), float(weight)) if sep else (part.strip(), 1.0)
+        if mode not in recommender.SEARCH_MODES:
+            raise ValueError(f"unknown search mode {mode!r} (expected one of {recommender.SEARCH_MODES})")
+        mix.append((mode, w))
+    return mix
+
+class Stage:
+    """Rezultatele unei trepte de concurență (thread-safe)."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latencies: List[float] = []
+        self.errors: Counter = Counter()
+        self.cached = 0
+        self.blocked = 0
+        self.degraded = 0
+        self.rejected = 0
+        self.paced = 0  # respinse / degradate de bugetul sesiunii (session_rate)
+        self.shed = 0   # respinse / degradate de limitele globale (supraîncărcare)
+        self.media = 0
+        self._lock = threading.Lock()
+
+    def _limited(self, reason: str):
+        if reason == "session_rate":
+            self.paced += 1
+        else:
+            self.shed += 1
+
+    def record(self, latency: float, result: Dict | None, error: str | None, media: int, reason: str | None = None):
+        with self._lock:
+            if error == "Rejected":
+                # Respinsă de admission: comportament dorit sub încărcare, nu eroare.
+                self.rejected += 1
+                self._limited(reason)
+                return
+            if error is not None:
+                self.errors[error] += 1
+                return
+            self.latencies.append(latency)
+            self.cached += int(bool(result.get("cached")))
+            self.blocked += int(bool(result.get("blocked")))
+            if result.get("degraded"):
+                self.degraded += 1
+                self._limited(result["degraded"])
+            self.media += media
+
+    def report(self, elapsed: float) -> Dict:
+        lat = np.asarray(self.latencies) * 1000.0
+        n_err = sum(self.errors.values())
+        total = len(lat) + n_err + self.rejected
+        pct = (lambda q: float(np.percentile(lat, q))) if len(lat) else (lambda q: None)
+        return {
+            "concurrency": self.concurrency, "requests": total, "ok": int(len(lat)), "errors": dict(self.errors),
+            "error_rate": n_err / total if total else 0.0, "throughput_rps": len(lat) / max(elapsed, 1e-9),
+            "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+            "mean_ms": float(lat.mean()) if len(lat) else None,
+            "cache_hit_rate": self.cached / len(lat) if len(lat) else 0.0,
+            "rejected": self.rejected, "rejected_rate": self.rejected / total if total else 0.0,
+            "degraded_rate": self.degraded / len(lat) if len(lat) else 0.0,
+            "shed_rate": self.shed / total if total else 0.0, "paced_rate": self.paced / total if total else 0.0,
+            "media_calls": self.media, "elapsed_s": elapsed,
+        }
+
+def session(stage: Stage, deadline: float, queries: List[str], mix: List[Tuple[str, float]], options: Dict,
+            tts_rate: float, image_rate: float, think_s: float, seed: int):
+    import recommender
+    rng = random.Random(seed)
+    modes, weights = zip(*mix)
+    while time.perf_counter() < deadline:
+        opts = dict(options, search_mode=rng.choices(modes, weights)[0])
+        q = rng.choice(queries)
+        t0 = time.perf_counter()
+        media = 0
+        try:
+            with admission.session(f"load-{seed}"), tracing.trace("search", mode=opts["search_mode"], query=q):
+                res = recommender.compute_results(q, opts)
+            if not res.get("blocked"):
+                # Acțiunile din card: 🔊 pe răspuns și 🖼️ pe prima carte, pentru o parte din sesiuni.
+                if tts_rate and not res.get("degraded") and rng.random() < tts_rate:
+                    recommender.tts_bytes(res["answer"])
+                    media += 1
+                if image_rate and res["items"] and rng.random() < image_rate:
+                    it = res["items"][0]
+                    recommender.generate_book_image(it["title"], it["author"], it["themes"], it["summary"], size="512x512")
+                    media += 1
+            stage.record(time.perf_counter() - t0, res, None, media)
+        except admission.Rejected as e:
+            stage.record(time.perf_counter() - t0, None, "Rejected", media, e.reason)
+        except Exception as e:
+            stage.record(time.perf_counter() - t0, None, type(e).__name__, media)
+        if think_s:
+            time.sleep(rng.expovariate(1.0 / think_s))
+
+def run_stage(concurrency: int, duration_s: float, queries, mix, options, tts_rate, image_rate, think_s, seed) -> Dict:
+    stage = Stage(concurrency)
+    tracing.reset()
+    singleflight.reset()
+    admission.reset()
+    deadline = time.perf_counter() + duration_s
+    threads = [threading.Thread(target=session, name=f"session-{i}", daemon=True,
+                                args=(stage, deadline, queries, mix, options, tts_rate, image_rate, think_s, seed * 10007 + i))
+               for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report = stage.report(time.perf_counter() - t0)
+    # Media pe etapă (moderation, embedding, retrieve_*, llm, ...) în treapta curentă.
+    report["stages_mean_ms"] = {name: 1000.0 * h["sum"] / h["count"]
+                                for name, h in tracing.snapshot()["stages"].items() if h["count"]}
+    # Apeluri upstream economisite prin comasarea cererilor identice simultane.
+    report["coalesced"] = {name: st["coalesced"] for name, st in singleflight.stats().items() if st["coalesced"]}
+    report["admission_rejected"] = {op: st["rejected"] for op, st in admission.stats().items() if st["rejected"]}
+    return report
+
+def format_row(r: Dict) -> str:
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    return (f"{r['concurrency']:5d} {r['requests']:8d} {r['throughput_rps']:9.2f} {fmt(r['p50_ms'])} {fmt(r['p95_ms'])} "
+            f"{fmt(r['p99_ms'])} {r['error_rate']:8.2%} {r['cache_hit_rate']:8.2%} {r['rejected_rate']:8.2%} {r['degraded_rate']:8.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the recommendation pipeline")
+    parser.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"), help="Existing Chroma store")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",") if x.strip()], default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency step")
+    parser.add_argument("--query-log", type=Path, default=None, help="Text (one query per line) or JSONL query/trace log")
+    parser.add_argument("--no-suggestions", action="store_true", help="Only use queries from --query-log")
+    parser.add_argument("--modes", type=str, default="Context liber=0.7,După temă (hint)=0.15,Titlu (conține)=0.1,Titlu (exact)=0.05")
+    parser.add_argument("--retrieval", choices=["hybrid", "vector", "lexical", "passages"], default="hybrid")
+    parser.add_argument("--engine", choices=["Chroma", "mmap float32", "mmap float16", "mmap int8"], default="Chroma")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--no-answer-cache", action="store_true", help="Disable the semantic answer cache")
+    parser.add_argument("--tts-rate", type=float, default=0.0, help="Fraction of requests that also call TTS")
+    parser.add_argument("--image-rate", type=float, default=0.0, help="Fraction of requests that also generate an image")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean think time between a session's requests (s)")
+    parser.add_argument("--slo-p95-ms", type=float, default=None, help="Stop ramping once p95 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Stop ramping once errors exceed this")
+    parser.add_argument("--max-reject-rate", type=float, default=0.01,
+                        help="Stop ramping once requests rejected or degraded by global limits (rate / queue) exceed this; "
+                             "per-session pacing (session_rate) is reported as 'paced' and does not count")
+    parser.add_argument("--no-admission", action="store_true", help="Disable rate limits / admission control (raw capacity)")
+    parser.add_argument("--real-api", action="store_true", help="Use the real OpenAI API instead of the local stub")
+    parser.add_argument("--latency", type=str, default="embeddings=0.03,chat=0.6,speech=0.3,images=1.0",
+                        help="Stub latency per endpoint (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    server = None
+    if not args.real_api:
+        server, base_url = openai_stub.start_stub(openai_stub.parse_latency(args.latency))
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+
+    if args.no_admission:
+        admission.configure(enabled=False)
+    queries = load_queries(args.query_log, include_suggestions=not args.no_suggestions)
+    if not queries:
+        sys.exit("No queries to replay.")
+    mix = parse_mix(args.modes)
+    options = {"persist": str(args.persist), "k": args.k, "retrieval_mode": args.retrieval, "engine": args.engine,
+               "use_answer_cache": not args.no_answer_cache}
+
+    print(f"{len(queries)} queries · modes {dict(mix)} · {'real API' if args.real_api else 'stub API'} · {args.persist}")
+    print(f"{'conc':>5} {'reqs':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8} {'cache':>8} {'rejected':>8} {'degraded':>8}")
+    stages, sustained = [], 0
+    try:
+        for c in args.concurrency:
+            r = run_stage(c, args.duration, queries, mix, options, args.tts_rate, args.image_rate, args.think, args.seed)
+            stages.append(r)
+            print(format_row(r), flush=True)
+            over_slo = args.slo_p95_ms is not None and (r["p95_ms"] is None or r["p95_ms"] > args.slo_p95_ms)
+            if r["error_rate"] > args.max_error_rate or r["shed_rate"] > args.max_reject_rate or over_slo:
+                print(f"Stopping: concurrency {c} breaks the SLO (errors {r['error_rate']:.2%}, "
+                      f"shed by global limits {r['shed_rate']:.2%}, p95 {r['p95_ms']} ms).")
+                break
+            sustained = c
+    finally:
+        if server is not None:
+            server.shutdown()
+    print(f"Max sustained concurrency: {sustained or 'none'}")
+    if args.out:
+        report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "persist": str(args.persist), "modes": dict(mix),
+                           "retrieval": args.retrieval, "engine": args.engine, "answer_cache": not args.no_answer_cache,
+                           "admission": not args.no_admission,
+                           "real_api": args.real_api, "latency": args.latency, "duration_s": args.duration,
+                           "slo_p95_ms": args.slo_p95_ms, "max_error_rate": args.max_error_rate,
+                           "max_reject_rate": args.max_reject_rate},
+                  "stages": stages, "max_sustained_concurrency": sustained}
+        args.out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -14,24 +14,74 @@ Env:
 Usage:
     # 1) Ingest from SQLite (created previously by create_book_summaries_db.py)
     python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db
+    # ... later, re-embed only rows changed since the previous ingest (book_summaries.updated_at)
+    python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db --incremental
 
     # 2) Search by theme (semantic)
     python load_to_chroma_and_search.py search-theme --theme "aventură" -k 5
 
     # 3) Search by free context
     python load_to_chroma_and_search.py search --query "o poveste despre totalitarism și supraveghere" -k 5
+
+    # 4) List theme facets (book counts per theme)
+    python load_to_chroma_and_search.py themes
+
+    # 5) "Cărți similare" from the precomputed neighbour graph (rebuilt incrementally at ingest)
+    python load_to_chroma_and_search.py similar --title "Hobbitul" -k 5
+
+    # 6) Export a memory-mapped copy (float32/float16/int8) for the in-process engine
+    python load_to_chroma_and_search.py export-mmap
+
+    # 7) Metadata pre-filters (also parsed from the query text: "după 1950", "în română", "de Orwell")
+    python load_to_chroma_and_search.py search --query "roman istoric după 1950 în română" -k 5
+    python load_to_chroma_and_search.py search --query "distopie" --author "George Orwell" --year-min 1900 --language ro
+
+    # 8) HNSW index parameters (fixed at collection creation) and a recall/latency sweep
+    python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db --space cosine --hnsw-m 32 --construction-ef 200 --search-ef 64
+    python load_to_chroma_and_search.py tune --spaces cosine --m 8,16,32 --construction-ef 100,200 --search-ef 10,50,100 -k 10
+
+    # 9) Sharded collections (by language or id hash); searches fan out to all shards in parallel
+    python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db --shard-by language
+    python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db --shard-by hash --num-shards 4 --shard-timeout 2
+
+    # 10) Streaming catalogue import (JSONL / CSV / JSON array) into SQLite and/or straight into Chroma
+    python load_to_chroma_and_search.py ingest-file --input catalogue.jsonl --sqlite ./book_summaries.db
+    python load_to_chroma_and_search.py ingest-file --input catalogue.csv --chroma --persist ./chroma_book_summaries
+
+    # 11) Hybrid (BM25 + vector, default when the BM25 index exists) or a single side only
+    python load_to_chroma_and_search.py search --query "Winston Smith" --mode lexical
+
+    # 12) Passage index for long texts (full_text column, else summary): overlapping chunks in a
+    #     separate 'book_passages' collection; search scores chunks and pools them per book
+    python load_to_chroma_and_search.py ingest --sqlite ./book_summaries.db --passages --chunk-chars 1000 --chunk-overlap 150
+    python load_to_chroma_and_search.py search --query "scena cu ghicitorile din peșteră" --mode passages --pooling max
+
+    # 13) Portable snapshots: copy a collection (ids, documents, metadata, embeddings) to a new node
+    #     without re-embedding; checksums are verified before restoring into a fresh persist dir
+    python load_to_chroma_and_search.py export --persist ./chroma_book_summaries --out ./snapshot
+    python load_to_chroma_and_search.py import --snapshot ./snapshot --persist ./chroma_new_node
 """
 
 import argparse
+import json
 import os
 import sqlite3
+import time
 import unicodedata
 from pathlib import Path
 from typing import List, Dict
 
-from dotenv import load_dotenv
-import chromadb
-from chromadb.utils import embedding_functions
+from bm25_index import BM25Index, hybrid_query
+import theme_index
+import similar_books
+import vector_engine
+import query_filters
+import hnsw_tuning
+import sharding
+import catalog_import
+import passages
+import snapshot
+from Database_Books import changed_since
 
 # -------------------------- utils --------------------------
 
@@ -67,57 +117,320 @@ def build_document_row(row: sqlite3.Row) -> Dict:
     }
     return {"id": slugify(f"{title}-{author}"), "document": doc, "metadata": meta}
 
+def long_text(row) -> str:
+    """Text for the passage index: full_text when the row has one, else the summary."""
+    full = row["full_text"] if "full_text" in row.keys() else None
+    return full or row["summary"] or ""
+
 # -------------------------- chroma --------------------------
 
-def get_collection(persist_dir: Path, collection_name: str = "books"):
+# chromadb / dotenv are imported on first use, so `--help` and argument errors stay instant.
+
+def get_embedder():
+    from dotenv import load_dotenv
+    from chromadb.utils import embedding_functions
     load_dotenv()  # allow .env
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is missing. Set it in your environment or .env file.")
-    client = chromadb.PersistentClient(path=str(persist_dir))
-    embedder = embedding_functions.OpenAIEmbeddingFunction(
+    return embedding_functions.OpenAIEmbeddingFunction(
         api_key=api_key,
         model_name="text-embedding-3-small",
+        api_base=os.getenv("OPENAI_BASE_URL"),
     )
-    col = client.get_or_create_collection(name=collection_name, embedding_function=embedder)
+
+def get_passage_collection(persist_dir: Path, index_params: Dict | None = None):
+    """Chunk-level collection (never sharded); each chunk's metadata carries parent_id.
+    Always created in cosine space: passage scores are pooled as 1 - distance."""
+    import chromadb
+    return chromadb.PersistentClient(path=str(persist_dir)).get_or_create_collection(
+        name=passages.COLLECTION, embedding_function=get_embedder(), metadata=passages.index_metadata(index_params))
+
+def get_collection(persist_dir: Path, collection_name: str = "books", index_params: Dict | None = None):
+    """
+    index_params (hnsw:* metadata) only take effect when the collection is first created.
+    If <persist_dir>/shards.json exists, returns a ShardedCollection that fans out to every shard.
+    """
+    import chromadb
+    embedder = get_embedder()
+
+    def open_shard(shard_dir: Path, name: str):
+        return chromadb.PersistentClient(path=str(shard_dir)).get_or_create_collection(
+            name=name, embedding_function=embedder, metadata=index_params)
+
+    config = sharding.load_config(persist_dir)
+    if config is not None:
+        return sharding.ShardedCollection(persist_dir, config, open_shard, embed=embedder)
+    col = open_shard(persist_dir, collection_name)
+    if index_params:
+        current = {k: v for k, v in (col.metadata or {}).items() if k.startswith("hnsw:")}
+        if any(current.get(k) != v for k, v in index_params.items()):
+            print(f"Warning: collection '{collection_name}' already exists with {current}; "
+                  f"requested {index_params} ignored (re-create the persist dir to change them).")
     return col
 
-def ingest_sqlite(sqlite_path: Path, persist_dir: Path):
+class ChromaLoader:
+    """Batched upserts into Chroma; BM25/theme indexes are kept in memory and saved once at the end."""
+
+    def __init__(self, persist_dir: Path, index_params: Dict | None = None, batch_size: int = 500,
+                 passage_opts: Dict | None = None):
+        self.persist_dir = persist_dir
+        self.col = get_collection(persist_dir, index_params=index_params)
+        self.batch_size = batch_size
+        # passage_opts = {"max_chars": ..., "overlap": ...} enables the chunk-level index
+        self.passage_opts = passage_opts
+        self.passage_col = get_passage_collection(persist_dir, index_params) if passage_opts is not None else None
+        self.n_passages = 0
+        self.bm25 = BM25Index.load(persist_dir) or BM25Index()
+        self.themes = theme_index.ThemeIndex.load(persist_dir) or theme_index.ThemeIndex()
+        self.changed: List[str] = []
+
+    def add(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            items = [build_document_row(r) for r in rows[start:start + self.batch_size]]
+            ids = [it["id"] for it in items]
+            docs = [it["document"] for it in items]
+            metas = [it["metadata"] for it in items]
+            # Chroma upsert
+            self.col.upsert(ids=ids, documents=docs, metadatas=metas)
+            # Local BM25 index over the same document text (no API calls)
+            self.bm25.add_many(ids, docs)
+            # Theme facet index (normalized theme -> book ids) from the structured metadata
+            self.themes.add_many(ids, metas)
+            self.changed.extend(ids)
+            if self.passage_col is not None:
+                batch = rows[start:start + self.batch_size]
+                self.n_passages += passages.upsert_passages(
+                    self.passage_col, [(it["id"], it["metadata"], long_text(r)) for it, r in zip(items, batch)],
+                    **self.passage_opts)
+
+    def finish(self) -> int:
+        self.bm25.save(self.persist_dir)
+        self.themes.save(self.persist_dir)
+        # Nearest-neighbour graph from the stored embeddings; only affected rows are recomputed
+        recomputed = similar_books.build_graph(self.col, self.persist_dir, changed_ids=self.changed)
+        print(f"Similar-books graph: {recomputed} rows recomputed.")
+        where = f"{len(self.col.shards)} shards" if isinstance(self.col, sharding.ShardedCollection) else "collection 'books'"
+        print(f"Ingested {len(self.changed)} items into Chroma at {self.persist_dir.resolve()} in {where}.")
+        if self.passage_col is not None:
+            print(f"Indexed {self.n_passages} passages in collection '{passages.COLLECTION}'.")
+        return len(self.changed)
+
+STATE_FILE = "ingest_state.json"
+
+def _load_watermark(persist_dir: Path, sqlite_path: Path) -> str | None:
+    path = persist_dir / STATE_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8")).get(str(sqlite_path.resolve()))
+
+def _save_watermark(persist_dir: Path, sqlite_path: Path, updated_at: str):
+    path = persist_dir / STATE_FILE
+    state = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    state[str(sqlite_path.resolve())] = updated_at
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+def ingest_sqlite(sqlite_path: Path, persist_dir: Path, index_params: Dict | None = None, shard_by: str | None = None,
+                  num_shards: int = 4, shard_timeout: float = sharding.DEFAULT_TIMEOUT_S, batch_size: int = 500,
+                  incremental: bool = False, passage_opts: Dict | None = None):
+    """With incremental=True only rows whose updated_at is newer than the last ingest are re-embedded."""
     conn = sqlite3.connect(sqlite_path)
     conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM book_summaries ORDER BY id;")
-    rows = cur.fetchall()
+    has_updated_at = any(r["name"] == "updated_at" for r in conn.execute("PRAGMA table_info(book_summaries);"))
+    since = _load_watermark(persist_dir, sqlite_path) if incremental and has_updated_at else None
+    if has_updated_at:
+        cur = changed_since(conn, since)
+    else:
+        cur = conn.execute("SELECT * FROM book_summaries ORDER BY id;")
+    rows = cur.fetchmany(batch_size)
     if not rows:
+        if since is not None:
+            print(f"No rows changed since {since}; nothing to ingest.")
+            return
         raise RuntimeError("No rows found in book_summaries. Run the DB creator first.")
+    if shard_by:
+        sharding.init_config(persist_dir, shard_by, num_shards, timeout_s=shard_timeout)
+    loader = ChromaLoader(persist_dir, index_params, batch_size, passage_opts)
+    # Stream the table in batches instead of fetchall()
+    watermark = since
+    while rows:
+        loader.add(rows)
+        if has_updated_at:
+            watermark = max(watermark or "", max(r["updated_at"] or "" for r in rows))
+        rows = cur.fetchmany(batch_size)
+    conn.close()
+    loader.finish()
+    if watermark:
+        _save_watermark(persist_dir, sqlite_path, watermark)
+
+def ingest_file(input_path: Path, sqlite_path: Path | None, persist_dir: Path | None, fmt: str | None = None,
+                batch_size: int = 5000, index_params: Dict | None = None, passage_opts: Dict | None = None):
+    """Stream a JSONL/CSV/JSON catalogue into book_summaries and/or straight into Chroma."""
+    if sqlite_path is None and persist_dir is None:
+        raise RuntimeError("Nothing to do: pass --sqlite and/or --chroma.")
+    loader = ChromaLoader(persist_dir, index_params, passage_opts=passage_opts) if persist_dir is not None else None
+    stats = catalog_import.load_catalogue(input_path, sqlite_path, batch_size=batch_size, fmt=fmt,
+                                          on_batch=loader.add if loader else None)
+    print(f"Loaded {stats['summary']}; {stats['bad']} invalid rows skipped.")
+    for err in stats["errors"]:
+        print(f"  invalid {err}")
+    if loader is not None:
+        loader.finish()
+
+def prepare_filters(col, query: str, persist_dir: Path, filters: Dict | None = None, parse: bool = True):
+    """Returns (query, where, where_document): explicit filters + hints parsed from the query text."""
+    parsed = {}
+    if parse:
+        query, parsed = query_filters.parse_query(query, lambda: query_filters.known_authors(col))
+    merged = query_filters.merge_filters(filters, parsed)
+    if merged:
+        print(f"Filters: {query_filters.describe(merged)}")
+    labels = theme_index.resolve_labels(persist_dir, merged["theme"]) if merged.get("theme") else None
+    return query, query_filters.build_where(merged), query_filters.build_where_document(merged, labels)
+
+def search_context(query: str, k: int, persist_dir: Path, mode: str = "hybrid", filters: Dict | None = None, parse: bool = True,
+                   pooling: str = "max"):
     col = get_collection(persist_dir)
-    ids, docs, metas = [], [], []
-    for r in rows:
-        item = build_document_row(r)
-        ids.append(item["id"])
-        docs.append(item["document"])
-        metas.append(item["metadata"])
-    # Chroma upsert
-    col.upsert(ids=ids, documents=docs, metadatas=metas)
-    print(f"Ingested {len(ids)} items into Chroma at {persist_dir.resolve()} in collection 'books'.")
-
-def search_context(query: str, k: int, persist_dir: Path):
-    col = get_collection(persist_dir)
-    res = col.query(query_texts=[query], n_results=k, include=["documents", "metadatas", "distances"])
+    query, where, where_doc = prepare_filters(col, query, persist_dir, filters, parse)
+    if mode == "passages":
+        res = passages.passage_query(col, get_passage_collection(persist_dir), query, k, pooling, where, where_doc)
+        if res is not None:
+            show_results(res)
+            return
+        print("No passage index found (ingest with --passages); falling back to hybrid search.")
+        mode = "hybrid"
+    res = hybrid_query(col, query, k, persist_dir, mode=mode, where=where, where_document=where_doc)
     show_results(res)
 
-def search_theme(theme: str, k: int, persist_dir: Path):
+def search_theme(theme: str, k: int, persist_dir: Path, mode: str = "hybrid", filters: Dict | None = None):
     col = get_collection(persist_dir)
-    # We let embeddings do the heavy lifting; enrich the query with a theme hint.
+    _, where, _ = prepare_filters(col, theme, persist_dir, filters, parse=False)
+    # Known themes are served straight from the facet index
+    res = theme_index.theme_query(col, theme, k, persist_dir, where=where)
+    if res is not None:
+        show_results(res)
+        return
+    # Unknown theme: let embeddings do the heavy lifting; enrich the query with a theme hint.
     q = f"cărți cu tema {theme}; recomandări bazate pe această temă"
-    res = col.query(query_texts=[q], n_results=k, include=["documents", "metadatas", "distances"])
+    res = hybrid_query(col, q, k, persist_dir, lexical_query=theme, mode=mode, where=where)
     show_results(res)
 
+def show_similar(title: str, k: int, persist_dir: Path, rebuild: bool = False):
+    col = get_collection(persist_dir)
+    if rebuild:
+        similar_books.build_graph(col, persist_dir)
+    data = col.get(where={"title": title}, include=["metadatas"])
+    if not data.get("ids"):
+        print(f"No book titled '{title}'.")
+        return
+    neighbours = similar_books.similar(data["ids"][0], persist_dir, k)
+    if not neighbours:
+        print("No neighbours found. Run ingest (or --rebuild) to build the graph.")
+        return
+    found = col.get(ids=[n for n, _ in neighbours], include=["metadatas"])
+    metas = dict(zip(found["ids"], found["metadatas"]))
+    for i, (_id, score) in enumerate(neighbours, start=1):
+        meta = metas.get(_id, {})
+        print(f"#{i}  {meta.get('title')} — {meta.get('author')}  (an: {meta.get('year')})  cos={score:.3f}")
+
+def export_mmap(persist_dir: Path, out_dir: Path | None):
+    col = get_collection(persist_dir)
+    out_dir = out_dir or persist_dir / vector_engine.EXPORT_DIR
+    n = vector_engine.export_collection(col, out_dir)
+    print(f"Exported {n} items to {out_dir.resolve()} (float32, float16, int8 + meta.jsonl).")
+
+def export_snapshot(persist_dir: Path, out_dir: Path, batch_size: int = 5000, with_passages: bool = True):
+    col = get_collection(persist_dir)
+    state_path = persist_dir / STATE_FILE
+    info = snapshot.export_snapshot(
+        col, out_dir, passage_col=get_passage_collection(persist_dir) if with_passages else None,
+        shard_config=sharding.load_config(persist_dir),
+        ingest_state=json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else None,
+        batch_size=batch_size)
+    for name, c in info["collections"].items():
+        print(f"  {name}: {c['count']} rows, dim {c['dim']}, {c['batches']} batches")
+    size = sum(f["bytes"] for f in info["files"].values())
+    print(f"Exported snapshot to {out_dir.resolve()} ({size / 1e6:.1f} MB) in {info['seconds']:.1f}s "
+          f"({info['rows_per_s']:.0f} rows/s, {info['mb_per_s']:.1f} MB/s).")
+
+def import_snapshot(snapshot_dir: Path, persist_dir: Path, batch_size: int = 1000, force: bool = False):
+    """Restore a snapshot with bulk upserts of the stored embeddings (no embedding API calls)."""
+    if persist_dir.exists() and any(persist_dir.iterdir()) and not force:
+        raise RuntimeError(f"{persist_dir} is not empty; restore into a fresh dir or pass --force to upsert into it.")
+    t0 = time.perf_counter()
+    manifest = snapshot.verify(snapshot_dir)
+    t_verify = time.perf_counter() - t0
+    size = sum(f["bytes"] for f in manifest["files"].values())
+    print(f"Verified {len(manifest['files'])} files ({size / 1e6:.1f} MB) in {t_verify:.1f}s.")
+    if manifest["model"] != snapshot.EMBED_MODEL:
+        print(f"Warning: snapshot embeddings come from {manifest['model']}; queries here use {snapshot.EMBED_MODEL}.")
+    if manifest.get("shards") and sharding.load_config(persist_dir) is None:
+        sharding.save_config(persist_dir, snapshot.restore_shard_config(manifest["shards"], persist_dir))
+    books = manifest["collections"]["books"]
+    col = get_collection(persist_dir, index_params=books["index_params"] or None)
+    bm25 = BM25Index.load(persist_dir) or BM25Index()
+    themes = theme_index.ThemeIndex.load(persist_dir) or theme_index.ThemeIndex()
+    imported: List[str] = []
+
+    def restore(target, name: str, on_batch=None) -> float:
+        t = time.perf_counter()
+        for ids, docs, metas, emb in snapshot.iter_batches(snapshot_dir, name):
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                target.upsert(ids=ids[start:end], documents=docs[start:end], metadatas=metas[start:end],
+                              embeddings=emb[start:end].tolist())
+            if on_batch:
+                on_batch(ids, docs, metas)
+        seconds = time.perf_counter() - t
+        n = manifest["collections"][name]["count"]
+        print(f"  {name}: {n} rows upserted in {seconds:.1f}s ({n / seconds if seconds else 0:.0f} rows/s)")
+        return seconds
+
+    def index_books(ids, docs, metas):
+        bm25.add_many(ids, docs)
+        themes.add_many(ids, metas)
+        imported.extend(ids)
+
+    restore(col, "books", index_books)
+    if "book_passages" in manifest["collections"]:
+        params = manifest["collections"]["book_passages"]["index_params"] or None
+        restore(get_passage_collection(persist_dir, params), "book_passages")
+    bm25.save(persist_dir)
+    themes.save(persist_dir)
+    # Local indexes are rebuilt from the restored rows and embeddings (no API calls).
+    recomputed = similar_books.build_graph(col, persist_dir, changed_ids=imported)
+    for sqlite_path, watermark in (manifest.get("ingest_state") or {}).items():
+        _save_watermark(persist_dir, Path(sqlite_path), watermark)
+    total = time.perf_counter() - t0
+    rows = sum(c["count"] for c in manifest["collections"].values())
+    print(f"Similar-books graph: {recomputed} rows recomputed.")
+    print(f"Imported {rows} rows into {persist_dir.resolve()} in {total:.1f}s ({rows / total if total else 0:.0f} rows/s overall).")
+
+def tune_index(persist_dir: Path, spaces: List[str], Ms: List[int], cefs: List[int], sefs: List[int],
+               k: int, n_queries: int, json_out: Path | None):
+    col = get_collection(persist_dir)
+    print(f"Current index: {hnsw_tuning.describe_index(col)}  ({col.count()} items)")
+    rows = hnsw_tuning.sweep(col, spaces, Ms, cefs, sefs, k=k, n_queries=n_queries)
+    print(hnsw_tuning.format_table(rows, k))
+    if json_out:
+        json_out.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+        print(f"Wrote {len(rows)} rows to {json_out}")
+
+def list_themes(persist_dir: Path, limit: int):
+    idx = theme_index.load_cached(persist_dir)
+    if idx is None:
+        print("No theme index found. Run ingest first.")
+        return
+    for label, n in idx.facet_counts(limit):
+        print(f"{n:5d}  {label}")
+
 def show_results(res):
     ids = res.get("ids", [[]])[0]
     docs = res.get("documents", [[]])[0]
     metas = res.get("metadatas", [[]])[0]
     dists = res.get("distances", [[]])[0]
+    best_passages = res.get("passages", [[]])[0]
     if not ids:
         print("No results.")
         return
@@ -132,9 +445,32 @@ def show_results(res):
         preview = doc.split("Rezumat:", 1)[-1].strip().splitlines()
         preview = " ".join(preview)[:220] + ("…" if len(' '.join(preview)) > 220 else "")
         print(f"Rezumat: {preview}")
+        if i <= len(best_passages) and best_passages[i - 1]:
+            print(f"Pasaj: {best_passages[i - 1][:220]}{'…' if len(best_passages[i - 1]) > 220 else ''}")
 
 # -------------------------- CLI --------------------------
 
+def add_filter_args(p: argparse.ArgumentParser):
+    p.add_argument("--author", type=str, default=None, help="Exact author name")
+    p.add_argument("--year-min", type=int, default=None, help="Published in or after this year")
+    p.add_argument("--year-max", type=int, default=None, help="Published in or before this year")
+    p.add_argument("--language", type=str, default=None, help="Language code (e.g., 'ro')")
+
+def filters_from_args(args) -> Dict:
+    return {"author": args.author, "year_min": args.year_min, "year_max": args.year_max,
+            "language": args.language}
+
+def add_passage_args(p: argparse.ArgumentParser):
+    p.add_argument("--passages", action="store_true", help="Also index overlapping passages of the long text")
+    p.add_argument("--chunk-chars", type=int, default=passages.DEFAULT_MAX_CHARS, help="Max characters per passage")
+    p.add_argument("--chunk-overlap", type=int, default=passages.DEFAULT_OVERLAP, help="Characters shared by consecutive passages")
+
+def passage_opts_from_args(args) -> Dict | None:
+    return {"max_chars": args.chunk_chars, "overlap": args.chunk_overlap} if args.passages else None
+
+def _csv(cast):
+    return lambda s: [cast(x.strip()) for x in s.split(",") if x.strip()]
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest and search book summaries in ChromaDB")
     sub = parser.add_subparsers(dest="cmd", required=True)
@@ -142,25 +478,104 @@ def main():
     p_ing = sub.add_parser("ingest", help="Ingest from SQLite into ChromaDB")
     p_ing.add_argument("--sqlite", type=Path, required=True, help="Path to book_summaries.db")
     p_ing.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"), help="Chroma persistence dir")
+    p_ing.add_argument("--incremental", action="store_true", help="Only rows updated since the last ingest")
+    p_ing.add_argument("--space", choices=hnsw_tuning.SPACES, default=None, help="Distance metric (new collections only)")
+    p_ing.add_argument("--hnsw-m", type=int, default=None, help="HNSW M (graph degree)")
+    p_ing.add_argument("--construction-ef", type=int, default=None, help="HNSW ef at build time")
+    p_ing.add_argument("--search-ef", type=int, default=None, help="HNSW ef at query time")
+    p_ing.add_argument("--shard-by", choices=["language", "hash"], default=None, help="Split into several collections (first ingest only)")
+    p_ing.add_argument("--num-shards", type=int, default=4, help="Number of shards for --shard-by hash")
+    p_ing.add_argument("--shard-timeout", type=float, default=sharding.DEFAULT_TIMEOUT_S, help="Per-shard query timeout (s)")
+    add_passage_args(p_ing)
+
+    p_file = sub.add_parser("ingest-file", help="Stream a JSONL/CSV/JSON catalogue into SQLite and/or Chroma")
+    p_file.add_argument("--input", type=Path, required=True, help="Catalogue file (.jsonl, .csv or .json array)")
+    p_file.add_argument("--format", choices=["jsonl", "csv", "json"], default=None, help="Override format detection")
+    p_file.add_argument("--sqlite", type=Path, default=None, help="Bulk-load into this book_summaries.db")
+    p_file.add_argument("--chroma", action="store_true", help="Also embed and upsert into Chroma")
+    p_file.add_argument("--batch-size", type=int, default=5000, help="Rows per transaction / batch")
+    p_file.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    add_passage_args(p_file)
 
     p_search = sub.add_parser("search", help="Semantic search by free context")
     p_search.add_argument("--query", type=str, required=True, help="Free-text query")
     p_search.add_argument("-k", type=int, default=5, help="Number of results")
     p_search.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    p_search.add_argument("--mode", choices=["hybrid", "vector", "lexical", "passages"], default="hybrid", help="Retrieval mode")
+    p_search.add_argument("--pooling", choices=passages.POOLINGS, default="max", help="Per-book aggregation of passage scores")
+    add_filter_args(p_search)
+    p_search.add_argument("--theme", type=str, default=None, help="Only books with this theme")
+    p_search.add_argument("--no-parse", action="store_true", help="Do not extract year/author/language hints from the query")
 
     p_theme = sub.add_parser("search-theme", help="Semantic search by theme")
     p_theme.add_argument("--theme", type=str, required=True, help="Theme keyword (e.g., 'aventură')")
     p_theme.add_argument("-k", type=int, default=5, help="Number of results")
     p_theme.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    p_theme.add_argument("--mode", choices=["hybrid", "vector", "lexical"], default="hybrid", help="Retrieval mode")
+    add_filter_args(p_theme)
+
+    p_sim = sub.add_parser("similar", help="Show precomputed similar books for a title")
+    p_sim.add_argument("--title", type=str, required=True, help="Exact book title")
+    p_sim.add_argument("-k", type=int, default=5, help="Number of neighbours")
+    p_sim.add_argument("--rebuild", action="store_true", help="Rebuild the whole graph first")
+    p_sim.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+
+    p_mmap = sub.add_parser("export-mmap", help="Export embeddings + metadata for the memory-mapped engine")
+    p_mmap.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    p_mmap.add_argument("--out", type=Path, default=None, help="Export dir (default: <persist>/mmap)")
+
+    p_exp = sub.add_parser("export", help="Write a portable snapshot (ids, documents, metadata, embeddings)")
+    p_exp.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    p_exp.add_argument("--out", type=Path, required=True, help="Snapshot dir")
+    p_exp.add_argument("--batch-size", type=int, default=5000, help="Rows read from Chroma per batch")
+    p_exp.add_argument("--no-passages", action="store_true", help="Skip the book_passages collection")
+
+    p_imp = sub.add_parser("import", help="Restore a snapshot into a persist dir without re-embedding")
+    p_imp.add_argument("--snapshot", type=Path, required=True, help="Snapshot dir written by `export`")
+    p_imp.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+    p_imp.add_argument("--batch-size", type=int, default=1000, help="Rows per Chroma upsert")
+    p_imp.add_argument("--force", action="store_true", help="Upsert into a non-empty persist dir")
+
+    p_tune = sub.add_parser("tune", help="Sweep HNSW settings: recall@k vs exact search, latency, index size")
+    p_tune.add_argument("--spaces", type=_csv(str), default=["cosine"], help="Comma-separated: l2,cosine,ip")
+    p_tune.add_argument("--m", type=_csv(int), default=[8, 16, 32], help="Comma-separated M values")
+    p_tune.add_argument("--construction-ef", type=_csv(int), default=[100, 200], help="Comma-separated construction_ef values")
+    p_tune.add_argument("--search-ef", type=_csv(int), default=[10, 50, 100], help="Comma-separated search_ef values")
+    p_tune.add_argument("-k", type=int, default=10, help="Recall@k")
+    p_tune.add_argument("--queries", type=int, default=200, help="Number of sampled queries")
+    p_tune.add_argument("--json-out", type=Path, default=None, help="Write results as JSON")
+    p_tune.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
+
+    p_facets = sub.add_parser("themes", help="List themes with book counts")
+    p_facets.add_argument("--limit", type=int, default=0, help="Show only the top N themes (0 = all)")
+    p_facets.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"))
 
     args = parser.parse_args()
 
     if args.cmd == "ingest":
-        ingest_sqlite(args.sqlite, args.persist)
+        params = hnsw_tuning.index_metadata(args.space, args.hnsw_m, args.construction_ef, args.search_ef)
+        ingest_sqlite(args.sqlite, args.persist, params, args.shard_by, args.num_shards, args.shard_timeout,
+                      incremental=args.incremental, passage_opts=passage_opts_from_args(args))
+    elif args.cmd == "ingest-file":
+        ingest_file(args.input, args.sqlite, args.persist if args.chroma else None, args.format, args.batch_size,
+                    passage_opts=passage_opts_from_args(args))
     elif args.cmd == "search":
-        search_context(args.query, args.k, args.persist)
+        filters = dict(filters_from_args(args), theme=args.theme)
+        search_context(args.query, args.k, args.persist, args.mode, filters, parse=not args.no_parse, pooling=args.pooling)
     elif args.cmd == "search-theme":
-        search_theme(args.theme, args.k, args.persist)
+        search_theme(args.theme, args.k, args.persist, args.mode, filters_from_args(args))
+    elif args.cmd == "similar":
+        show_similar(args.title, args.k, args.persist, args.rebuild)
+    elif args.cmd == "export-mmap":
+        export_mmap(args.persist, args.out)
+    elif args.cmd == "export":
+        export_snapshot(args.persist, args.out, args.batch_size, with_passages=not args.no_passages)
+    elif args.cmd == "import":
+        import_snapshot(args.snapshot, args.persist, args.batch_size, args.force)
+    elif args.cmd == "tune":
+        tune_index(args.persist, args.spaces, args.m, args.construction_ef, args.search_ef, args.k, args.queries, args.json_out)
+    elif args.cmd == "themes":
+        list_themes(args.persist, args.limit)
 
 if __name__ == "__main__":
     main()
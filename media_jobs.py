@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+media_jobs.py — coadă persistentă (SQLite) pentru TTS și generare de imagini
+- submit(kind, params) întoarce imediat un id de job; id-ul e hash-ul (kind, params),
+  deci cereri identice (același text + voce, aceeași carte + stil + dimensiune) nu
+  pornesc a doua generare: se refolosește jobul în așteptare / în lucru sau rezultatul
+  deja stocat (cât timp e mai nou de result_ttl_s). Un job eșuat se reia la următorul submit.
+- Rezultatele (bytes + mime + info, ex. prompt-ul imaginii) stau în aceeași bază;
+  UI-ul face polling pe get(id) și citește result(id) când statusul e "done".
+- MediaWorkers: un pool de thread-uri per tip de job, cu concurență și ritm (joburi/minut)
+  separate, deci imaginile lente nu blochează TTS-ul și nici cererile de căutare.
+  Poate rula în procesul app-ului/serviciului sau separat:
+    python media_jobs.py worker --db media_jobs.sqlite --tts-workers 2 --image-workers 1 --image-rate 10
+    python media_jobs.py stats
+    python media_jobs.py purge --older-than 86400
+- Joburile "running" rămase de la un worker oprit brusc revin în coadă (requeue_stale).
+  Workerii în viață își reîmprospătează joburile la fiecare HEARTBEAT_S (touch), deci
+  un job lung sau care așteaptă buget nu e luat drept abandonat și rulat a doua oară.
+- Când bugetul global tts / image (admission.py) e epuizat, workerul nu eșuează jobul:
+  așteaptă retry_after și reîncearcă. La oprire (stop), jobul neînceput revine în coadă (release).
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import admission
+
+KINDS = ("tts", "image")
+STATUSES = ("pending", "running", "done", "failed")
+DEFAULT_DB = os.environ.get("MEDIA_JOBS_DB", "media_jobs.sqlite")
+DEFAULT_RESULT_TTL_S = 24 * 3600.0
+DEFAULT_STALE_S = 600.0
+HEARTBEAT_S = 60.0  # mult sub DEFAULT_STALE_S
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    result      BLOB,
+    mime        TEXT,
+    info        TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    worker      TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_media_jobs_queue ON media_jobs(status, kind, created_at);
+"""
+
+def job_id(kind: str, params: Dict) -> str:
+    payload = json.dumps([kind, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+class JobQueue:
+    """Coada din fișierul SQLite `path`; sigură între thread-uri și procese (WAL + BEGIN IMMEDIATE)."""
+
+    def __init__(self, path: Path | str = DEFAULT_DB, result_ttl_s: float = DEFAULT_RESULT_TTL_S):
+        self.path = Path(path)
+        self.result_ttl_s = result_ttl_s
+        self._cond = threading.Condition()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _conn(self):
+        # O conexiune scurtă per operație: thread-urile Streamlit / ale serviciului vin și pleacă.
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _write(self, notify: bool = True):
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        if notify:
+            self.notify()
+
+    def submit(self, kind: str, params: Dict) -> str:
+        if kind not in KINDS:
+            raise ValueError(f"unknown job kind {kind!r} (expected one of {KINDS})")
+        jid, now = job_id(kind, params), time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT status, updated_at FROM media_jobs WHERE id = ?", (jid,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO media_jobs (id, kind, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                             (jid, kind, json.dumps(params, ensure_ascii=False), now, now))
+            elif row["status"] == "failed" or (row["status"] == "done" and now - row["updated_at"] > self.result_ttl_s):
+                conn.execute("UPDATE media_jobs SET status = 'pending', result = NULL, mime = NULL, info = NULL, error = NULL, "
+                             "worker = NULL, created_at = ?, updated_at = ? WHERE id = ?", (now, now, jid))
+            # altfel: job identic deja în coadă, în lucru sau terminat -> același id
+        return jid
+
+    def get(self, jid: str) -> Dict | None:
+        """Starea jobului, fără rezultat: {id, kind, status, error, mime, info, attempts, bytes, created_at, updated_at}."""
+        with self._conn() as conn:
+            row = conn.execute("SELECT id, kind, status, error, mime, info, attempts, length(result) AS bytes, created_at, updated_at "
+                               "FROM media_jobs WHERE id = ?", (jid,)).fetchone()
+        if row is None:
+            return None
+        out = dict(row)
+        out["info"] = json.loads(out["info"]) if out["info"] else {}
+        return out
+
+    def result(self, jid: str) -> Tuple[bytes, str, Dict] | None:
+        """(bytes, mime, info) pentru un job terminat; None altfel."""
+        with self._conn() as conn:
+            row = conn.execute("SELECT result, mime, info FROM media_jobs WHERE id = ? AND status = 'done'", (jid,)).fetchone()
+        if row is None:
+            return None
+        return bytes(row["result"] or b""), row["mime"] or "", json.loads(row["info"]) if row["info"] else {}
+
+    def wait(self, jid: str, timeout: float = 60.0, poll_s: float = 0.5) -> Dict | None:
+        """Așteaptă până când jobul e done/failed (notificare în proces, polling între procese)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(jid)
+            if job is None or job["status"] in ("done", "failed"):
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            self.wait_for_change(min(poll_s, remaining))
+
+    def wait_for_change(self, timeout: float):
+        """Blochează până la următoarea scriere din acest proces sau cel mult `timeout` secunde."""
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def claim(self, kinds: Iterable[str], worker: str = "") -> Dict | None:
+        """Preia cel mai vechi job în așteptare de tipurile date (atomic între procese)."""
+        kinds = list(kinds)
+        marks = ",".join("?" * len(kinds))
+        # Fără notificare: un claim gol ar trezi ceilalți workeri inactivi, în buclă.
+        with self._write(notify=False) as conn:
+            row = conn.execute(f"SELECT id, kind, params FROM media_jobs WHERE status = 'pending' AND kind IN ({marks}) "
+                               "ORDER BY created_at LIMIT 1", kinds).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE media_jobs SET status = 'running', attempts = attempts + 1, worker = ?, updated_at = ? WHERE id = ?",
+                         (worker, time.time(), row["id"]))
+        return {"id": row["id"], "kind": row["kind"], "params": json.loads(row["params"])}
+
+    def complete(self, jid: str, data: bytes, mime: str, info: Dict | None = None):
+        with self._write() as conn:
+            conn.execute("UPDATE media_jobs SET status = 'done', result = ?, mime = ?, info = ?, error = NULL, updated_at = ? WHERE id = ?",
+                         (sqlite3.Binary(data), mime, json.dumps(info or {}, ensure_ascii=False), time.time(), jid))
+
+    def fail(self, jid: str, error: str):
+        with self._write() as conn:
+            conn.execute("UPDATE media_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?", (error, time.time(), jid))
+
+    def touch(self, jids: Iterable[str]):
+        """Heartbeat: joburile încă în lucru nu devin „stale”."""
+        now = time.time()
+        with self._write(notify=False) as conn:
+            conn.executemany("UPDATE media_jobs SET updated_at = ? WHERE id = ? AND status = 'running'", [(now, jid) for jid in jids])
+
+    def release(self, jid: str):
+        """Jobul preluat, dar nerulat (worker oprit), revine în așteptare fără a consuma o încercare."""
+        with self._write() as conn:
+            conn.execute("UPDATE media_jobs SET status = 'pending', worker = NULL, attempts = MAX(attempts - 1, 0), updated_at = ? "
+                         "WHERE id = ? AND status = 'running'", (time.time(), jid))
+
+    def requeue_stale(self, older_than_s: float = DEFAULT_STALE_S) -> int:
+        with self._write() as conn:
+            cur = conn.execute("UPDATE media_jobs SET status = 'pending', worker = NULL WHERE status = 'running' AND updated_at < ?",
+                               (time.time() - older_than_s,))
+        return cur.rowcount
+
+    def purge(self, older_than_s: float) -> int:
+        """Șterge joburile terminate (done/failed) mai vechi de `older_than_s`."""
+        with self._write() as conn:
+            cur = conn.execute("DELETE FROM media_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                               (time.time() - older_than_s,))
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out = {k: dict.fromkeys(STATUSES, 0) for k in KINDS}
+        with self._conn() as conn:
+            for kind, status, n in conn.execute("SELECT kind, status, COUNT(*) FROM media_jobs GROUP BY kind, status"):
+                out.setdefault(kind, dict.fromkeys(STATUSES, 0))[status] = n
+        return out
+
+# -------------------- Workers --------------------
+
+def _run_tts(params: Dict) -> Tuple[bytes, str, Dict]:
+    import recommender  # lazy: coada se poate inspecta (stats/purge) fără chromadb/openai
+    audio, mime = recommender.tts_bytes(params["text"], voice=params.get("voice", "alloy"))
+    if not audio:
+        raise RuntimeError("TTS failed")
+    return audio, mime, {}
+
+def _run_image(params: Dict) -> Tuple[bytes, str, Dict]:
+    import recommender
+    img, mime, prompt = recommender.generate_book_image(params["title"], params.get("author", ""), params.get("themes", ""),
+                                                        params.get("summary", ""), style=params.get("style", "copertă minimală"),
+                                                        size=params.get("size", "1024x1024"))
+    if not img:
+        raise RuntimeError("image generation failed")
+    return img, mime, {"prompt": prompt}
+
+HANDLERS: Dict[str, Callable[[Dict], Tuple[bytes, str, Dict]]] = {"tts": _run_tts, "image": _run_image}
+
+class MediaWorkers:
+    """
+    Thread-uri care consumă coada: `concurrency` = workeri per tip, `per_minute` = ritm maxim
+    per tip (0 = nelimitat), aplicat tuturor workerilor de acel tip din proces.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: Dict[str, int] | None = None, per_minute: Dict[str, float] | None = None,
+                 poll_s: float = 1.0, handlers: Dict[str, Callable] | None = None):
+        self.queue = queue
+        self.concurrency = dict({"tts": 2, "image": 1}, **(concurrency or {}))
+        self.per_minute = dict(per_minute or {})
+        self.poll_s = poll_s
+        self.handlers = dict(HANDLERS, **(handlers or {}))
+        self._next_start = {k: 0.0 for k in self.concurrency}
+        self._rate_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: set = set()  # joburile în lucru ale acestui proces (pentru heartbeat)
+        self._running_lock = threading.Lock()
+
+    def _throttle(self, kind: str):
+        rate = self.per_minute.get(kind) or 0.0
+        if rate <= 0:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_start[kind])
+            self._next_start[kind] = start + 60.0 / rate
+        self._stop.wait(start - now)
+
+    def _run(self, jid: str, kind: str, params: Dict):
+        """Rezultatul handler-ului; None dacă workerul s-a oprit înainte ca jobul să fie admis."""
+        # Bugetul global al operației (admission) epuizat: jobul rămâne al acestui worker și reîncercăm.
+        while True:
+            try:
+                return self.handlers[kind](params)
+            except admission.Rejected as e:
+                if self._stop.wait(e.retry_after):
+                    return None
+                self.queue.touch([jid])
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_S):
+            with self._running_lock:
+                jids = list(self._running)
+            if jids:
+                try:
+                    self.queue.touch(jids)
+                except sqlite3.OperationalError:
+                    pass  # bază blocată momentan; următorul heartbeat
+
+    def _loop(self, kind: str, name: str):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim([kind], worker=f"{os.getpid()}:{name}")
+            except sqlite3.OperationalError:
+                job = None  # bază blocată momentan; reîncercăm
+            if job is None:
+                self.queue.wait_for_change(self.poll_s)
+                continue
+            with self._running_lock:
+                self._running.add(job["id"])
+            try:
+                self._throttle(kind)
+                out = None if self._stop.is_set() else self._run(job["id"], kind, job["params"])
+                if out is None:
+                    self.queue.release(job["id"])
+                else:
+                    self.queue.complete(job["id"], *out)
+            except Exception as e:
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+    def start(self) -> "MediaWorkers":
+        self.queue.requeue_stale()
+        t = threading.Thread(target=self._heartbeat, name="media-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        for kind, n in self.concurrency.items():
+            for i in range(n):
+                t = threading.Thread(target=self._loop, args=(kind, f"{kind}-{i}"), name=f"media-{kind}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self.queue.notify()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite-backed job queue for TTS and image generation")
+    parser.add_argument("--db", type=Path, default=Path(DEFAULT_DB))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="Run media workers until interrupted")
+    w.add_argument("--tts-workers", type=int, default=2)
+    w.add_argument("--image-workers", type=int, default=1)
+    w.add_argument("--tts-rate", type=float, default=0.0, help="Max TTS jobs per minute (0 = unlimited)")
+    w.add_argument("--image-rate", type=float, default=0.0, help="Max image jobs per minute (0 = unlimited)")
+    sub.add_parser("stats", help="Job counts per kind and status")
+    p = sub.add_parser("purge", help="Delete finished jobs older than --older-than seconds")
+    p.add_argument("--older-than", type=float, default=DEFAULT_RESULT_TTL_S)
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    if args.cmd == "stats":
+        print(json.dumps(queue.stats(), indent=2))
+    elif args.cmd == "purge":
+        print(f"Deleted {queue.purge(args.older_than)} jobs.")
+    else:
+        workers = MediaWorkers(queue, {"tts": args.tts_workers, "image": args.image_workers},
+                               {"tts": args.tts_rate, "image": args.image_rate}).start()
+        print(f"Media workers on {args.db}: tts={args.tts_workers}, image={args.image_workers} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(60)
+                queue.requeue_stale()
+        except KeyboardInterrupt:
+            workers.stop()
+
+if __name__ == "__main__":
+    main()
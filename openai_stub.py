@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+openai_stub.py — server local compatibil OpenAI, pentru benchmark-uri și teste de încărcare
+- Endpoint-uri: POST /v1/embeddings, /v1/chat/completions, /v1/audio/speech,
+  /v1/images/generations (+ GET /v1/models). Răspunsurile au forma API-ului real,
+  deci clientul `openai` și embedding-urile Chroma funcționează neschimbate cu
+  OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 și orice OPENAI_API_KEY.
+- Embeddings deterministe: bag-of-words hash-uit (fără diacritice) + zgomot mic
+  fixat de text -> texte cu cuvinte comune sunt apropiate, deci regăsirea are sens.
+- Chat: recomandă primul candidat din prompt ("[Cand#1] Titlu:...").
+- Latență configurabilă per endpoint (secunde, cu jitter relativ), ex.
+    python openai_stub.py --port 8089 --latency embeddings=0.05,chat=0.8,speech=0.3,images=1.5
+  `--fail images` întoarce HTTP 500 pe endpoint-ul respectiv (ex. pentru fallback-ul local).
+- start_stub() pornește serverul într-un thread (pentru benchmark.py / load_test.py).
+"""
+from __future__ import annotations
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+DIM = 1536
+ENDPOINTS = ("embeddings", "chat", "speech", "images")
+DEFAULT_LATENCY = {"embeddings": 0.0, "chat": 0.0, "speech": 0.0, "images": 0.0}
+
+def _tokens(text: str):
+    s = unicodedata.normalize("NFKD", str(text or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    return re.findall(r"\w+", s)
+
+def embed_text(text: str, dim: int = DIM) -> np.ndarray:
+    """Vector determinist, normalizat: termenii comuni produc similaritate cosinus mare."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in _tokens(text):
+        h = zlib.crc32(tok.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    seed = int.from_bytes(hashlib.blake2b(str(text).encode("utf-8"), digest_size=4).digest(), "little")
+    vec += np.random.default_rng(seed).normal(0.0, 0.01, dim).astype(np.float32)
+    return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+def _png(w: int = 8, h: int = 8) -> bytes:
+    """PNG mic, valid (gri), fără Pillow."""
+    raw = b"".join(b"\x00" + b"\x80\x80\x80" * w for _ in range(h))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+_PNG = _png()
+
+class StubState:
+    def __init__(self, latency: Dict[str, float] | None = None, jitter: float = 0.1, fail: Iterable[str] = (), dim: int = DIM):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.jitter = jitter
+        self.fail = set(fail)
+        self.dim = dim
+        self.calls = {e: 0 for e in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def wait(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] += 1
+        base = self.latency.get(endpoint, 0.0)
+        if base > 0:
+            time.sleep(max(0.0, base * (1.0 + random.uniform(-self.jitter, self.jitter))))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None  # setat de make_server
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, obj: Dict, status: int = 200):
+        self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json({"object": "list", "data": [{"id": m, "object": "model", "owned_by": "stub"}
+                                                   for m in ("text-embedding-3-small", "gpt-4o-mini", "gpt-4o-mini-tts", "gpt-image-1")]})
+        else:
+            self._json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        req = json.loads(body or b"{}")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        endpoint = {"/v1/embeddings": "embeddings", "/v1/chat/completions": "chat",
+                    "/v1/audio/speech": "speech", "/v1/images/generations": "images"}.get(path)
+        if endpoint is None:
+            self._json({"error": {"message": f"unknown endpoint {path}"}}, 404)
+            return
+        self.state.wait(endpoint)
+        if endpoint in self.state.fail:
+            self._json({"error": {"message": f"stub: {endpoint} disabled", "type": "server_error"}}, 500)
+            return
+        getattr(self, f"_{endpoint}")(req)
+
+    def _embeddings(self, req: Dict):
+        texts = req.get("input")
+        texts = [texts] if isinstance(texts, str) else list(texts or [])
+        b64 = req.get("encoding_format") == "base64"
+        data = []
+        for i, t in enumerate(texts):
+            v = embed_text(t, self.state.dim)
+            emb = base64.b64encode(v.astype("<f4").tobytes()).decode("ascii") if b64 else v.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        n = sum(len(_tokens(t)) for t in texts)
+        self._json({"object": "list", "data": data, "model": req.get("model", "text-embedding-3-small"),
+                    "usage": {"prompt_tokens": n, "total_tokens": n}})
+
+    def _chat(self, req: Dict):
+        prompt = "\n".join(str(m.get("content", "")) for m in req.get("messages", []))
+        m = re.search(r"\[Cand#1\] Titlu:(.*?) \|", prompt)
+        text = (f"Îți recomand „{m.group(1).strip()}”: se potrivește cel mai bine cererii tale."
+                if m else "Nu am găsit o carte potrivită printre candidați.")
+        p_tok, c_tok = len(_tokens(prompt)), len(_tokens(text))
+        self._json({"id": f"chatcmpl-stub-{int(time.time() * 1000)}", "object": "chat.completion", "created": int(time.time()),
+                    "model": req.get("model", "gpt-4o-mini"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": p_tok, "completion_tokens": c_tok, "total_tokens": p_tok + c_tok}})
+
+    def _speech(self, req: Dict):
+        # ~1 KB per 10 caractere, ca dimensiunea răspunsului să crească cu textul.
+        n = max(1024, len(str(req.get("input", ""))) * 100)
+        self._send(200, b"ID3" + b"\x00" * (n - 3), "audio/mpeg")
+
+    def _images(self, req: Dict):
+        self._json({"created": int(time.time()), "data": [{"b64_json": base64.b64encode(_PNG).decode("ascii")}]})
+
+def make_server(host: str = "127.0.0.1", port: int = 0, state: StubState | None = None) -> ThreadingHTTPServer:
+    handler = type("StubHandler", (_Handler,), {"state": state or StubState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_stub(latency: Dict[str, float] | None = None, fail: Iterable[str] = (), port: int = 0,
+               jitter: float = 0.1) -> Tuple[ThreadingHTTPServer, str]:
+    """Pornește stub-ul într-un thread daemon; întoarce (server, base_url). Oprire: server.shutdown()."""
+    server = make_server(port=port, state=StubState(latency, jitter, fail))
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+def parse_latency(spec: str) -> Dict[str, float]:
+    """"embeddings=0.05,chat=0.8" -> {"embeddings": 0.05, "chat": 0.8}"""
+    out = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r} (expected one of {ENDPOINTS})")
+        out[name.strip()] = float(value)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub (embeddings, chat, speech, images)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=str, default="", help="Per endpoint seconds, e.g. embeddings=0.05,chat=0.8")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative latency jitter (0.1 = ±10%%)")
+    parser.add_argument("--fail", type=str, default="", help="Comma-separated endpoints that return HTTP 500")
+    args = parser.parse_args()
+    state = StubState(parse_latency(args.latency), args.jitter, [f for f in args.fail.split(",") if f])
+    server = make_server(args.host, args.port, state)
+    print(f"OpenAI stub on http://{args.host}:{server.server_address[1]}/v1  (OPENAI_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+passages.py — împărțirea textelor lungi în pasaje + agregare pe cartea părinte
+- split_passages() taie textul (descriere, recenzii, fragmente de capitol) în bucăți
+  de cel mult `max_chars`, la granițe de frază, cu o suprapunere de ~`overlap`
+  caractere între bucăți consecutive (contextul nu se pierde la tăietură).
+- passage_rows() produce rândurile pentru colecția separată `book_passages`:
+  id "<book_id>#p<n>", documentul = antetul cărții (titlu, autor, an, limbă, teme)
+  + pasajul, metadatele = cele ale cărții + `parent_id` / `chunk` (maparea pasaj -> carte).
+  Antetul păstrează valabile filtrele `where` / `where_document` și pe pasaje.
+- passage_query() caută în pasaje, agregă scorurile per carte (pooling "max" sau
+  "sum") și întoarce cărțile părinte în forma col.query, cu documentul SCURT al cărții
+  (nu pasajul), deci promptul LLM nu crește odată cu textul indexat.
+- Colecția de pasaje se creează cu hnsw:space=cosine (index_metadata). Colecțiile vechi,
+  create cu spațiul implicit l2, rămân utilizabile: distanța L2 la pătrat între vectori
+  unitari (embedding-urile OpenAI) se convertește în distanță cosinus (d / 2) înainte de agregare.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Tuple
+
+COLLECTION = "book_passages"
+DEFAULT_MAX_CHARS = 1000
+DEFAULT_OVERLAP = 150
+POOLINGS = ("max", "sum")
+SPACE = "cosine"
+
+_SENTENCE = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
+
+def _sentences(text: str, max_chars: int) -> List[str]:
+    out: List[str] = []
+    for sent in _SENTENCE.split(text or ""):
+        sent = " ".join(sent.split())
+        while len(sent) > max_chars:
+            # Frază mai lungă decât o bucată întreagă: tăiem la ultimul spațiu.
+            cut = sent.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            out.append(sent[:cut].strip())
+            sent = sent[cut:].strip()
+        if sent:
+            out.append(sent)
+    return out
+
+def split_passages(text: str, max_chars: int = DEFAULT_MAX_CHARS, overlap: int = DEFAULT_OVERLAP) -> List[str]:
+    """Bucăți de max `max_chars`; fiecare începe cu ultimele fraze (≤ `overlap` caractere) ale celei anterioare."""
+    sents = _sentences(text, max_chars)
+    chunks: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for sent in sents:
+        if cur and size + 1 + len(sent) > max_chars:
+            chunks.append(" ".join(cur))
+            tail: List[str] = []
+            tail_len = 0
+            for prev in reversed(cur):
+                if tail_len + len(prev) + 1 > overlap:
+                    break
+                tail.insert(0, prev)
+                tail_len += len(prev) + 1
+            # Suprapunerea nu are voie să împingă bucata nouă peste limită.
+            while tail and tail_len + len(sent) > max_chars:
+                tail_len -= len(tail.pop(0)) + 1
+            cur, size = tail, max(tail_len - 1, 0)
+        cur.append(sent)
+        size += len(sent) + (1 if size else 0)
+    if cur:
+        chunks.append(" ".join(cur))
+    return chunks
+
+def passage_rows(book_id: str, meta: Dict, text: str, max_chars: int = DEFAULT_MAX_CHARS,
+                 overlap: int = DEFAULT_OVERLAP) -> List[Dict]:
+    header = (f"Titlu: {meta.get('title')}\nAutor: {meta.get('author') or ''}\nAn: {meta.get('year')}\n"
+              f"Limbă: {meta.get('language') or 'ro'}\nTeme: {meta.get('themes') or ''}\n")
+    rows = []
+    for n, chunk in enumerate(split_passages(text, max_chars, overlap)):
+        rows.append({
+            "id": f"{book_id}#p{n}",
+            "document": f"{header}Pasaj: {chunk}",
+            "metadata": dict(meta, parent_id=book_id, chunk=n),
+        })
+    return rows
+
+def upsert_passages(col, books: List[Tuple[str, Dict, str]], max_chars: int = DEFAULT_MAX_CHARS,
+                    overlap: int = DEFAULT_OVERLAP) -> int:
+    """(book_id, meta, text) -> pasaje în `col`. Pasajele vechi ale cărților se șterg întâi (textul se poate scurta)."""
+    if not books:
+        return 0
+    col.delete(where={"parent_id": {"$in": [book_id for book_id, _, _ in books]}})
+    rows = [r for book_id, meta, text in books for r in passage_rows(book_id, meta, text, max_chars, overlap)]
+    if rows:
+        col.upsert(ids=[r["id"] for r in rows], documents=[r["document"] for r in rows],
+                   metadatas=[r["metadata"] for r in rows])
+    return len(rows)
+
+def index_metadata(index_params: Dict | None = None) -> Dict:
+    """Metadatele hnsw:* pentru `book_passages`: parametrii cărților (M, ef), dar mereu spațiul cosinus."""
+    return dict(index_params or {}, **{"hnsw:space": SPACE})
+
+def collection_space(col) -> str:
+    # Chroma folosește l2 când colecția a fost creată fără hnsw:space.
+    return (getattr(col, "metadata", None) or {}).get("hnsw:space", "l2")
+
+def cosine_distance(dist: float, space: str) -> float:
+    """Distanța Chroma în spațiul `space` -> 1 - cosinus (vectori unitari)."""
+    return float(dist) / 2.0 if space == "l2" else float(dist)
+
+def aggregate(res: Dict, pooling: str = "max", space: str = SPACE) -> List[Tuple[str, float, float, str]]:
+    """
+    Hit-uri pe pasaje -> [(parent_id, scor_agregat, distanța_minimă, cel_mai_bun_pasaj)],
+    descrescător după scor. "max": cel mai bun pasaj; "sum": suma similarităților
+    pasajelor găsite (favorizează cărțile relevante în mai multe locuri).
+    Distanțele din `res` sunt în spațiul `space`; cele întoarse sunt distanțe cosinus.
+    """
+    if pooling not in POOLINGS:
+        raise ValueError(f"pooling must be one of {POOLINGS}")
+    best: Dict[str, List] = {}
+    for meta, doc, dist in zip(res.get("metadatas", [[]])[0], res.get("documents", [[]])[0], res.get("distances", [[]])[0]):
+        parent = (meta or {}).get("parent_id")
+        if not parent:
+            continue
+        dist = cosine_distance(dist, space)
+        sim = 1.0 - float(dist)
+        entry = best.get(parent)
+        if entry is None:
+            best[parent] = [sim, float(dist), doc]
+            continue
+        entry[0] = max(entry[0], sim) if pooling == "max" else entry[0] + sim
+        if dist < entry[1]:
+            entry[1], entry[2] = float(dist), doc
+    ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], kv[1][1]))
+    return [(parent, score, dist, doc) for parent, (score, dist, doc) in ranked]
+
+def passage_query(books_col, passages_col, query: str, n_results: int, pooling: str = "max",
+                  where: Dict | None = None, where_document: Dict | None = None, fanout: int = 8) -> Dict | None:
+    """
+    Rezultat în forma col.query cu cărțile părinte (documentul cărții, distanța celui mai
+    bun pasaj); None dacă nu există pasaje indexate (apelantul face fallback).
+    Se cer `n_results * fanout` pasaje, ca să rămână destule cărți distincte după agregare.
+    """
+    total = int(passages_col.count())
+    if not total:
+        return None
+    res = passages_col.query(query_texts=[query], n_results=min(total, max(n_results, 1) * fanout),
+                             include=["documents", "metadatas", "distances"], where=where, where_document=where_document)
+    ranked = aggregate(res, pooling, collection_space(passages_col))[:n_results]
+    out = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "passages": [[]]}
+    if not ranked:
+        return out
+    data = books_col.get(ids=[parent for parent, _, _, _ in ranked], include=["documents", "metadatas"])
+    rows = {_id: (doc, meta) for _id, doc, meta in zip(data.get("ids", []), data.get("documents", []), data.get("metadatas", []))}
+    for parent, _, dist, passage in ranked:
+        if parent not in rows:
+            continue
+        doc, meta = rows[parent]
+        out["ids"][0].append(parent)
+        out["documents"][0].append(doc)
+        out["metadatas"][0].append(meta)
+        out["distances"][0].append(dist)
+        out["passages"][0].append(passage.split("Pasaj:", 1)[-1].strip() if isinstance(passage, str) else "")
+    return out
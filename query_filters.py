@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+query_filters.py — filtre structurate (autor, interval de ani, limbă, temă) pentru căutare
+- build_where() traduce filtrele în clauza `where` Chroma (metadate) și
+  build_where_document() tema în `where_document` ($contains pe textul documentului),
+  astfel încât setul de candidați se restrânge ÎNAINTE de căutarea ANN.
+- parse_query() extrage indicii din textul liber:
+    "roman istoric după 1950 în română" -> ("roman istoric", {"year_min": 1950, "language": "ro"})
+  Tipare recunoscute: după/înainte de/între ANI, anii 1960, secolul XX/al XIX-lea,
+  în română/engleză/..., de/scrisă de/by Autor.
+Filtrele circulă ca dict: {"author", "year_min", "year_max", "language", "theme"}.
+"""
+from __future__ import annotations
+import difflib
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+FILTER_KEYS = ("author", "year_min", "year_max", "language", "theme")
+
+LANGUAGES = {
+    "romana": "ro", "limba romana": "ro", "romaneste": "ro",
+    "engleza": "en", "limba engleza": "en", "english": "en",
+    "franceza": "fr", "limba franceza": "fr",
+    "germana": "de", "limba germana": "de",
+    "spaniola": "es", "italiana": "it", "rusa": "ru",
+}
+
+_ROMAN = {"xv": 15, "xvi": 16, "xvii": 17, "xviii": 18, "xix": 19, "xx": 20, "xxi": 21}
+
+def _strip_accents(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+def build_where(filters: Dict | None) -> Dict | None:
+    """Clauza `where` Chroma pentru autor / ani / limbă (None dacă nu e niciun filtru)."""
+    if not filters:
+        return None
+    clauses: List[Dict] = []
+    if filters.get("author"):
+        authors = filters["author"] if isinstance(filters["author"], (list, tuple)) else [filters["author"]]
+        clauses.append({"author": {"$in": list(authors)}} if len(authors) > 1 else {"author": authors[0]})
+    if filters.get("year_min") is not None:
+        clauses.append({"year": {"$gte": int(filters["year_min"])}})
+    if filters.get("year_max") is not None:
+        clauses.append({"year": {"$lte": int(filters["year_max"])}})
+    if filters.get("language"):
+        clauses.append({"language": filters["language"]})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def build_where_document(filters: Dict | None, theme_labels: Iterable[str] | None = None) -> Dict | None:
+    """
+    Filtru pe tema din textul documentului ("Teme: ..."). `theme_labels` = etichetele
+    canonice rezolvate din indexul de teme (dacă există), altfel tema brută.
+    """
+    if not filters or not filters.get("theme"):
+        return None
+    labels = list(theme_labels or []) or [filters["theme"].strip()]
+    conds = [{"$contains": label} for label in labels]
+    return conds[0] if len(conds) == 1 else {"$or": conds}
+
+def resolve_author(hint: str, known_authors: Iterable[str]) -> List[str]:
+    """Autorii cunoscuți care corespund indiciului ("Tolkien" -> ["J.R.R. Tolkien"])."""
+    def norm(s):
+        return " ".join(re.sub(r"[\W_]+", " ", _strip_accents(s or "").lower()).split())
+    h = norm(hint)
+    if not h:
+        return []
+    known = {norm(a): a for a in known_authors if a}
+    if h in known:
+        return [known[h]]
+    hits = [a for n, a in known.items() if re.search(rf"\b{re.escape(h)}\b", n)]
+    if hits:
+        return hits
+    return [known[n] for n in difflib.get_close_matches(h, list(known), n=1, cutoff=0.8)]
+
+def _fold(s: str) -> str:
+    """Elimină diacriticele caracter cu caracter (aceeași lungime ca originalul)."""
+    out = []
+    for ch in s:
+        base = _strip_accents(ch)
+        out.append(base if len(base) == 1 else ch)
+    return "".join(out)
+
+def known_authors(col, batch_size: int = 5000) -> List[str]:
+    """Autorii distincți din colecție (scanare paginată a metadatelor)."""
+    authors, total = set(), int(col.count())
+    for offset in range(0, total, batch_size):
+        for meta in col.get(include=["metadatas"], limit=batch_size, offset=offset)["metadatas"]:
+            if meta.get("author"):
+                authors.add(meta["author"])
+    return sorted(authors)
+
+def parse_query(text: str, known_authors: Union[Iterable[str], Callable[[], Iterable[str]], None] = None) -> Tuple[str, Dict]:
+    """
+    Extrage indicii de an / limbă / autor din text. Întoarce (text_curățat, filtre).
+    Cu `known_authors` (listă sau funcție apelată doar la nevoie), autorul e acceptat
+    doar dacă se potrivește unui autor din colecție (și devine numele exact); fără listă,
+    doar după marcaje explicite ("scrisă de", "autor", "by").
+    """
+    filters: Dict = {}
+    if not text:
+        return text, filters
+    work = _fold(text)
+    low = work.lower()
+    spans: List[Tuple[int, int]] = []
+
+    m = re.search(r"\bintre\s+(?:anii\s+)?(\d{4})\s+(?:si|-)\s+(\d{4})\b", low)
+    if m:
+        filters["year_min"], filters["year_max"] = sorted((int(m.group(1)), int(m.group(2))))
+        spans.append(m.span())
+    m = re.search(r"\b(?:dupa|after|incepand\s+cu)\s+(?:anul\s+)?(\d{4})\b", low)
+    if m and "year_min" not in filters:
+        filters["year_min"] = int(m.group(1))
+        spans.append(m.span())
+    m = re.search(r"\b(?:inainte\s+de|pana\s+in|pana\s+la|before)\s+(?:anul\s+)?(\d{4})\b", low)
+    if m and "year_max" not in filters:
+        filters["year_max"] = int(m.group(1))
+        spans.append(m.span())
+    m = re.search(r"\b(?:din\s+)?anii\s+(\d{3})0\b", low)
+    if m and not {"year_min", "year_max"} & filters.keys():
+        filters["year_min"], filters["year_max"] = int(m.group(1)) * 10, int(m.group(1)) * 10 + 9
+        spans.append(m.span())
+    m = re.search(r"\b(?:din\s+)?secolul(?:ui)?\s+(?:al\s+)?(xv|xvi|xvii|xviii|xix|xx|xxi|\d{2})(?:\s*-?\s*lea)?\b", low)
+    if m and not {"year_min", "year_max"} & filters.keys():
+        c = _ROMAN.get(m.group(1)) or int(m.group(1))
+        filters["year_min"], filters["year_max"] = (c - 1) * 100 + 1, c * 100
+        spans.append(m.span())
+
+    m = re.search(r"\b(?:in|pe)\s+(" + "|".join(sorted(LANGUAGES, key=len, reverse=True)) + r")\b", low)
+    if m:
+        filters["language"] = LANGUAGES[m.group(1)]
+        spans.append(m.span())
+
+    marker = r"(?:scrisa\s+de|scris\s+de|de\s+autorul|autor(?:ul)?:?|by)" if known_authors is None \
+        else r"(?:scrisa\s+de|scris\s+de|de\s+autorul|autor(?:ul)?:?|by|de|lui)"
+    m = re.search(r"\b" + marker + r"\s+((?:[A-Z][\w.'-]*\s*){1,4})", work)
+    if m and m.group(1).strip():
+        hint = m.group(1).strip()
+        if known_authors is None:
+            filters["author"] = hint
+            spans.append(m.span())
+        else:
+            authors = resolve_author(hint, known_authors() if callable(known_authors) else known_authors)
+            if authors:
+                filters["author"] = authors if len(authors) > 1 else authors[0]
+                spans.append(m.span())
+
+    if not spans:
+        return text, filters
+    clean = text
+    for start, end in sorted(spans, reverse=True):
+        clean = clean[:start] + " " + clean[end:]
+    clean = " ".join(clean.split()).strip(" ,;.-")
+    return (clean or text), filters
+
+def merge_filters(explicit: Dict | None, parsed: Dict | None) -> Dict:
+    """Filtrele explicite (CLI / sidebar) au prioritate față de cele extrase din text."""
+    out = {k: v for k, v in (parsed or {}).items() if v not in (None, "")}
+    out.update({k: v for k, v in (explicit or {}).items() if v not in (None, "")})
+    return out
+
+def describe(filters: Dict) -> str:
+    parts = []
+    if filters.get("author"):
+        a = filters["author"]
+        parts.append("autor: " + (", ".join(a) if isinstance(a, (list, tuple)) else str(a)))
+    if filters.get("year_min") is not None or filters.get("year_max") is not None:
+        parts.append(f"ani: {filters.get('year_min', '…')}–{filters.get('year_max', '…')}")
+    if filters.get("language"):
+        parts.append(f"limbă: {filters['language']}")
+    if filters.get("theme"):
+        parts.append(f"temă: {filters['theme']}")
+    return " · ".join(parts)
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+recommender.py — nucleul fluxului de recomandare, fără Streamlit
+moderare -> filtre -> detecție titlu / regăsire -> cache semantic -> llm_recommend
+- compute_results(user_q, options) este aceeași logică pe care o rulează
+  app_streamlit.py la „Caută și recomandă”; setările (din sidebar) vin ca dict,
+  vezi DEFAULT_OPTIONS. Poate fi apelată din benchmark-uri, load test sau servicii.
+- Etapele sunt cronometrate prin `tracing` (moderation, embedding, retrieve_*,
+  title_detection, answer_cache, llm, tts, image).
+- Apelurile scumpe identice aflate în zbor (embedding, llm, tts, image) sunt comasate
+  prin `singleflight`: sesiunile care cer simultan același lucru așteaptă un singur apel.
+- Etapele scumpe trec prin `admission` (limite per sesiune și globale, concurență cu coadă
+  mărginită): căutarea, embeddings, LLM, TTS, imagini; fără buget de embeddings regăsirea
+  trece pe lexical (fără cache), iar fără buget LLM răspunsul e degradat.
+- Colecțiile deschise rămân în memorie per proces (get_collection), iar warm_up()
+  încarcă dinainte colecția și indexurile de pe disc — pentru procese de durată
+  precum workerii din service.py.
+- chromadb / openai / dotenv se importă la prima folosire (pornire rapidă pentru app,
+  CLI și workerii noi); warm_up() le încarcă împreună cu colecția.
+- Clientul OpenAI respectă OPENAI_BASE_URL (ex. stub-ul local din openai_stub.py).
+- Embedding-ul cererii (pentru cache-ul semantic) se calculează doar când e nevoie, cu
+  timeout (EMBED_TIMEOUT_S); dacă eșuează, căutarea trece pe lexical, fără cache.
+"""
+from __future__ import annotations
+import difflib
+import functools
+import importlib
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import admission
+import answer_cache
+import bm25_index
+import passages
+import query_filters
+import sharding
+import similar_books
+import singleflight
+import theme_index
+import tracing
+import vector_engine
+from bm25_index import hybrid_query
+from img_gen_utils import generate_book_image as _generate_book_image
+from profanity_filter import is_inappropriate as _is_inappropriate
+from tts_utils import tts_bytes as _tts_bytes
+
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_TIMEOUT_S = 8.0
+SEARCH_MODES = ("Context liber", "După temă (hint)", "Titlu (exact)", "Titlu (conține)")
+ENGINES = ("Chroma", "mmap float32", "mmap float16", "mmap int8")
+BLOCKED_MSG = "Hai să păstrăm conversația prietenoasă 😊. Te rog reformulează fără limbaj ofensator."
+DEGRADED_MSG = ("Asistentul e foarte solicitat acum, așa că îți arăt direct potrivirile din colecție, "
+                "fără recomandarea generată. Încearcă din nou peste câteva secunde.")
+
+SUGGESTIONS_POOL = [
+    "Vreau o carte despre prietenie și magie",
+    "Caut o poveste SF cu explorare spațială",
+    "Recomandă-mi un thriller psihologic intens",
+    "Vreau o carte scurtă și amuzantă",
+    "Caut o carte clasică despre dragoste",
+    "Vreau o aventură epică cu lumi fantastice",
+    "O carte despre război și strategie",
+    "Ceva motivațional și de dezvoltare personală",
+    "Biografie a unui inovator faimos",
+    "Mister într-un orășel liniștit",
+    "Distopie despre controlul societății",
+    "Roman istoric despre Roma antică",
+    "Cartea perfectă pentru adolescenți",
+    "Nonficțiune despre știință ușor de înțeles",
+    "Romance contemporan cu umor",
+    "O carte cu dezbateri etice și filozofie",
+    "Poveste cu prietenie între animale",
+    "Fantasy cu dragoni și magie întunecată",
+    "Cyberpunk cu inteligență artificială",
+    "Cărți care seamănă cu Hobbitul",
+]
+
+DEFAULT_OPTIONS = {
+    "persist": "./chroma_book_summaries",
+    "k": 5,
+    "show_all": False,
+    "search_mode": "Context liber",
+    "retrieval_mode": "hybrid",       # hybrid | vector | lexical | passages
+    "pooling": "max",
+    "engine": "Chroma",
+    "model": "gpt-4o-mini",
+    "auto_title": True,
+    "parse_hints": True,
+    "filters": {},                    # {"author", "year_min", "year_max", "language", "theme"}
+    "use_answer_cache": True,
+    "cache_threshold": answer_cache.DEFAULT_THRESHOLD,
+}
+
+# Un singur cache semantic per proces, partajat de toate sesiunile.
+ANSWER_CACHE = answer_cache.SemanticCache()
+
+# Etapele externe, cronometrate (histograme pe etapă + waterfall); TTS și imaginile identice în zbor se comasează.
+is_inappropriate = tracing.traced("moderation")(_is_inappropriate)
+tts_bytes = tracing.traced("tts", lambda r: {"bytes": len(r[0] or b"")})(
+    singleflight.coalesce("tts", lambda text, voice="alloy": (singleflight.squash(text), voice))(admission.guarded("tts")(_tts_bytes)))
+generate_book_image = tracing.traced("image", lambda r: {"bytes": len(r[0] or b"")})(
+    singleflight.coalesce("image", lambda title, author, themes, summary, style="copertă minimală", size="1024x1024":
+                          tuple(singleflight.squash(v) for v in (title, author, themes, summary, style, size)))(
+        admission.guarded("image")(_generate_book_image)))
+
+# -------------------- Chroma helpers --------------------
+
+_COLLECTIONS: Dict[tuple, object] = {}   # (cale, colecție, mtime shards.json, cheie API) -> colecție deschisă
+_collections_lock = threading.Lock()
+
+class MissingAPIKey(RuntimeError):
+    """Configurație lipsă (nu o eroare a cererii): service.py o întoarce ca 503."""
+
+def _embedder():
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise MissingAPIKey("OPENAI_API_KEY lipsește. Adaugă-l în .env sau în variabilele de mediu.")
+    return _embedder_for(api_key, os.getenv("OPENAI_BASE_URL"))
+
+@functools.lru_cache(maxsize=4)
+def _embedder_for(api_key: str, base_url: str | None):
+    from chromadb.utils import embedding_functions
+    # base_url explicit (ex. openai_stub), nu doar prin variabila de mediu citită de clientul openai.
+    return embedding_functions.OpenAIEmbeddingFunction(api_key=api_key, model_name=EMBED_MODEL, api_base=base_url)
+
+def _open_cached(persist_dir: Path, collection_name: str, embedder, opener: Callable[[], object]):
+    cfg = persist_dir / sharding.CONFIG_FILE
+    key = (str(persist_dir.resolve()), collection_name, cfg.stat().st_mtime if cfg.exists() else None, id(embedder))
+    with _collections_lock:
+        col = _COLLECTIONS.get(key)
+        if col is None:
+            col = _COLLECTIONS[key] = opener()
+    return col
+
+@tracing.traced("get_collection")
+def get_collection(persist_dir: Path, engine: str = "Chroma", collection_name: str = "books"):
+    import chromadb
+    persist_dir = Path(persist_dir)
+    embedder = _embedder()
+    if engine != "Chroma":
+        mmap_col = vector_engine.open_cached(persist_dir / vector_engine.EXPORT_DIR, engine.split()[-1])
+        if mmap_col is not None:
+            return mmap_col
+    open_shard = lambda d, name: chromadb.PersistentClient(path=str(d)).get_or_create_collection(name=name, embedding_function=embedder)
+    def opener():
+        shard_cfg = sharding.load_config(persist_dir)
+        if shard_cfg is not None:
+            return sharding.ShardedCollection(persist_dir, shard_cfg, open_shard, embed=embedder)
+        return open_shard(persist_dir, collection_name)
+    return _open_cached(persist_dir, collection_name, embedder, opener)
+
+def get_passage_collection(persist_dir: Path):
+    import chromadb
+    persist_dir, embedder = Path(persist_dir), _embedder()
+    return _open_cached(persist_dir, passages.COLLECTION, embedder, lambda: chromadb.PersistentClient(path=str(persist_dir))
+                        .get_or_create_collection(name=passages.COLLECTION, embedding_function=embedder,
+                                                  metadata=passages.index_metadata()))
+
+def warm_up(persist_dir: Path, engine: str = "Chroma") -> Dict:
+    """Importă modulele grele, deschide colecția și încarcă indexurile (BM25, teme, similare) înaintea primei cereri."""
+    persist_dir = Path(persist_dir)
+    with tracing.span("warm_up", engine=engine) as sp:
+        importlib.import_module("openai")  # folosit de llm_recommend / TTS / imagini la prima cerere
+        col = get_collection(persist_dir, engine)
+        info = {"books": int(col.count()), "bm25": bm25_index.load_cached(persist_dir) is not None,
+                "themes": theme_index.load_cached(persist_dir) is not None,
+                "similar": similar_books.load_cached(persist_dir) is not None}
+        sp["attrs"].update(books=info["books"])
+    return info
+
+@tracing.traced("embedding", lambda v: {"dims": len(v)})
+@singleflight.coalesce("embedding", lambda text: (singleflight.squash(text), EMBED_MODEL))
+@admission.guarded("embed")
+def embed_query(text: str):
+    return _embedder()([text])[0]
+
+_EMBED_POOL: ThreadPoolExecutor | None = None
+
+def _embed_pool() -> ThreadPoolExecutor:
+    # Pool partajat, de durată (ca în sharding): fără thread nou la fiecare cerere.
+    global _EMBED_POOL
+    if _EMBED_POOL is None:
+        _EMBED_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="embed")
+    return _EMBED_POOL
+
+def query_embedding(text: str, timeout_s: float = EMBED_TIMEOUT_S):
+    """embed_query cu timeout; None dacă serviciul de embeddings e lent sau indisponibil (motivul ajunge în trace)."""
+    session, trace_ctx = admission.current_session(), tracing.context()
+
+    def run():
+        # Sesiunea (admission) și trace-ul cererii continuă în thread-ul din pool.
+        with admission.session(session), tracing.attach(trace_ctx):
+            return embed_query(text)
+
+    future = _embed_pool().submit(run)
+    try:
+        return future.result(timeout=timeout_s)
+    except FutureTimeout:
+        tracing.annotate(embedding_fallback="timeout")
+    except admission.Rejected as e:
+        # Bugetul de embeddings epuizat: căutarea continuă lexical, nu se respinge cererea.
+        tracing.annotate(embedding_fallback=f"rejected:{e.reason}")
+    except Exception as e:
+        tracing.annotate(embedding_fallback=type(e).__name__)
+    return None
+
+def normalize(s: str) -> str:
+    if s is None: return ""
+    s = unicodedata.normalize("NFKD", str(s))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.lower()
+    s = re.sub(r"[\W_]+", " ", s)
+    return " ".join(s.split())
+
+def best_title_index(norm_q: str, titles_norm: list[str]) -> int | None:
+    if not norm_q: return None
+    if norm_q in titles_norm: return titles_norm.index(norm_q)
+    best_idx, best_score = None, 0.0
+    for i, t in enumerate(titles_norm):
+        ratio = difflib.SequenceMatcher(None, norm_q, t).ratio()
+        bonus = (0.25 if norm_q in t else 0.0) + (0.15 if t.startswith(norm_q) else 0.0)
+        gap = abs(len(t) - len(norm_q)); penalty = min(0.25, gap * 0.005)
+        score = ratio + bonus - penalty
+        if score > best_score: best_idx, best_score = i, score
+    return best_idx if (best_idx is not None and best_score >= 0.60) else None
+
+def build_item(_id, meta, doc, dist=None):
+    themes_val = meta.get("themes", "")
+    themes_str = ", ".join(themes_val) if isinstance(themes_val, list) else str(themes_val)
+    score = max(0.0, 1.0 - float(dist)) if dist is not None else 1.0
+    return {
+        "id": _id, "title": meta.get("title"), "author": meta.get("author"), "year": meta.get("year"),
+        "themes": themes_str, "summary": doc.split("Rezumat:", 1)[-1].strip() if isinstance(doc, str) else "", "score": score,
+    }
+
+@tracing.traced("load_items", lambda items: {"items": len(items)})
+def load_items(persist_dir: Path, ids: List[str], engine: str = "Chroma") -> List[Dict]:
+    """Cărțile cu ids date, în forma build_item (loader-ul lui item_store la miss)."""
+    data = get_collection(persist_dir, engine).get(ids=list(ids), include=["metadatas", "documents"])
+    return [build_item(i, m or {}, d) for i, m, d in zip(data["ids"], data["metadatas"], data["documents"])]
+
+# -------------------- Retrieval --------------------
+
+@tracing.traced("retrieve_semantic", lambda items: {"items": len(items)})
+def retrieve_semantic(query: str, k: int, persist_dir: Path, show_all: bool, lexical_query: str | None = None, mode: str = "hybrid",
+                      where: Dict | None = None, where_document: Dict | None = None, query_embedding=None,
+                      engine: str = "Chroma", pooling: str = "max"):
+    col = get_collection(persist_dir, engine)
+    if show_all: k = int(col.count())
+    res = None
+    if mode == "passages":
+        # Pasaje -> scor agregat per carte; fără index de pasaje revenim la hibrid.
+        res = passages.passage_query(col, get_passage_collection(persist_dir), query, k, pooling, where, where_document)
+        mode = "hybrid"
+    if res is None:
+        res = hybrid_query(col, query, k, persist_dir, lexical_query=lexical_query, mode=mode, where=where, where_document=where_document,
+                           query_embedding=query_embedding)
+    items: List[Dict] = []
+    for _id, doc, meta, dist in zip(res.get("ids", [[]])[0], res.get("documents", [[]])[0], res.get("metadatas", [[]])[0], res.get("distances", [[]])[0]):
+        items.append(build_item(_id, meta, doc, dist))
+    for it, passage in zip(items, res.get("passages", [[]])[0]):
+        it["passage"] = passage
+    return items
+
+@tracing.traced("retrieve_theme", lambda items: {"items": len(items)})
+def retrieve_theme(theme: str, k: int, persist_dir: Path, show_all: bool, mode: str = "hybrid", where: Dict | None = None,
+                   engine: str = "Chroma", pooling: str = "max", query_embedding=None):
+    """Teme cunoscute -> direct din indexul de fațete; altfel fallback semantic (refolosește `query_embedding`)."""
+    col = get_collection(persist_dir, engine)
+    res = theme_index.theme_query(col, theme, None if show_all else k, persist_dir, where=where)
+    if res is None:
+        q = f"cărți cu tema {theme}; recomandări pe această temă"
+        return retrieve_semantic(q, k, persist_dir, show_all=show_all, lexical_query=theme, mode=mode, where=where,
+                                 query_embedding=query_embedding, engine=engine, pooling=pooling)
+    return [build_item(_id, meta, doc, dist) for _id, doc, meta, dist in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], res["distances"][0])]
+
+@tracing.traced("retrieve_title_exact")
+def retrieve_title_exact(title: str, persist_dir: Path, engine: str = "Chroma"):
+    tnorm = normalize(title); col = get_collection(persist_dir, engine)
+    try:
+        data = col.get(where={"title": title}, include=["metadatas","documents"])
+        out = []
+        for _id, meta, doc in zip(data.get("ids", []), data.get("metadatas", []), data.get("documents", [])):
+            if normalize(meta.get("title")) == tnorm:
+                out.append(build_item(_id, meta, doc))
+        if out: return out
+    except Exception: pass
+    data = col.get(limit=int(col.count()), include=["metadatas","documents"])
+    return [build_item(_id, meta, doc) for _id, meta, doc in zip(data["ids"], data["metadatas"], data["documents"]) if normalize(meta.get("title")) == tnorm]
+
+@tracing.traced("retrieve_title_contains")
+def retrieve_title_contains(title_substring: str, persist_dir: Path, engine: str = "Chroma"):
+    sub = normalize(title_substring); col = get_collection(persist_dir, engine)
+    data = col.get(limit=int(col.count()), include=["metadatas","documents"])
+    return [build_item(_id, meta, doc) for _id, meta, doc in zip(data["ids"], data["metadatas"], data["documents"]) if sub in normalize(meta.get("title"))]
+
+@tracing.traced("title_detection")
+def detect_title(user_q: str, persist_dir: Path, engine: str = "Chroma") -> Dict | None:
+    """Item-ul cărții al cărei titlu seamănă cu cererea (None dacă nu e o căutare de titlu)."""
+    col = get_collection(persist_dir, engine)
+    data = col.get(include=["metadatas","documents"], limit=int(col.count()))
+    titles = [m.get("title") for m in data.get("metadatas", [])]
+    idx = best_title_index(normalize(user_q), [normalize(t) for t in titles])
+    tracing.annotate(titles=len(titles), matched=idx is not None)
+    return build_item(data["ids"][idx], data["metadatas"][idx], data["documents"][idx]) if idx is not None else None
+
+# -------------------- LLM --------------------
+
+@tracing.traced("llm")
+@singleflight.coalesce("llm", lambda user_query, retrieved, model="gpt-4o-mini":
+                       (singleflight.squash(user_query), tuple(it["id"] for it in retrieved), model))
+@admission.guarded("llm")
+def llm_recommend(user_query: str, retrieved: List[Dict], model: str = "gpt-4o-mini") -> str:
+    from openai import OpenAI
+    client = OpenAI()
+    ctx = "\n".join([f"[Cand#{i}] Titlu:{it['title']} | Autor:{it['author']} | An:{it['year']} | Teme:{it['themes']}\nRezumat:{it['summary']}" for i,it in enumerate(retrieved,1)]) or "Nicio potrivire."
+    system = ("Ești un asistent pentru recomandări de cărți. Răspunde în română, clar și prietenos. "
+              "Fă recomandări NUMAI folosind candidații furnizați. "
+              "Dacă alegi o carte anume, menționeaz-o clar și EXACT cu titlul ei în text.")
+    msg = client.chat.completions.create(model=model, temperature=0.35, messages=[{"role":"system","content":system},{"role":"user","content":f"Cererea: {user_query}\n\nCandidați:\n{ctx}"}])
+    usage = getattr(msg, "usage", None)
+    tracing.annotate(prompt_chars=len(ctx), prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                     completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+    return msg.choices[0].message.content
+
+def extract_recommended_title(answer: str, items: List[Dict]) -> int | None:
+    """Returnează indexul item-ului al cărui titlu apare în answer (fuzzy, fără diacritice)."""
+    if not answer or not items:
+        return None
+    ans_norm = normalize(answer)
+    best_idx, best_len = None, 0
+    for i, it in enumerate(items):
+        t = normalize(it.get("title", ""))
+        if t and t in ans_norm and len(t) > best_len:
+            best_idx, best_len = i, len(t)
+    return best_idx
+
+# -------------------- Pipeline --------------------
+
+@admission.guarded("search")
+def search(user_q: str, options: Dict | None = None, known_authors: Callable[[], List[str]] | None = None) -> Dict:
+    """
+    Doar regăsirea (fără LLM): {"blocked", "items", "query", "filters", "query_embedding"}.
+    `query_embedding` e setat doar dacă cache-ul semantic e activ și embedding-ul a reușit
+    (îl refolosește compute_results); altfel regăsirea rulează lexical, iar cache-ul se sare.
+    """
+    o = dict(DEFAULT_OPTIONS, **(options or {}))
+    persist, k, show_all, engine = Path(o["persist"]), int(o["k"]), o["show_all"], o["engine"]
+    search_mode, retrieval_mode, pooling = o["search_mode"], o["retrieval_mode"], o["pooling"]
+    known_authors = known_authors or (lambda: query_filters.known_authors(get_collection(persist, engine)))
+
+    blocked, _ = is_inappropriate(user_q)
+    if blocked:
+        return {"blocked": True, "msg": BLOCKED_MSG}
+    # Filtre pe metadate aplicate ÎNAINTE de căutarea vectorială (sidebar + indicii din text)
+    sem_q, parsed = (query_filters.parse_query(user_q, known_authors)
+                     if o["parse_hints"] and search_mode == "Context liber" else (user_q, {}))
+    filters = query_filters.merge_filters(o["filters"], parsed)
+    labels = theme_index.resolve_labels(persist, filters["theme"]) if filters.get("theme") else None
+    where = query_filters.build_where(filters)
+    where_doc = query_filters.build_where_document(filters, labels)
+    semantic = search_mode in ["Context liber", "După temă (hint)"]
+    q_emb = None
+    if semantic:
+        title_item = detect_title(user_q, persist, engine) if o["auto_title"] else None
+        if title_item is None and o["use_answer_cache"]:
+            # Embedding-ul cererii: calculat o dată, folosit și la căutarea vectorială și la cache-ul semantic
+            # (nu și la un titlu recunoscut: regăsirea se sare, iar un singur candidat nu are nevoie de cache).
+            q_emb = query_embedding(sem_q)
+            if q_emb is None:
+                retrieval_mode = "lexical"  # embeddings indisponibile: nici ramura vectorială, nici cache
+        if title_item is not None:
+            items = [title_item]
+        elif search_mode == "Context liber":
+            items = retrieve_semantic(sem_q, k, persist, show_all=show_all, lexical_query=sem_q, mode=retrieval_mode, where=where,
+                                      where_document=where_doc, query_embedding=q_emb, engine=engine, pooling=pooling)
+        else:
+            items = retrieve_theme(user_q, k, persist, show_all=show_all, mode=retrieval_mode, where=where, engine=engine, pooling=pooling,
+                                   query_embedding=q_emb)
+    elif search_mode == "Titlu (exact)":
+        exact = retrieve_title_exact(user_q, persist, engine); items = exact[:1] if exact else []
+    else:
+        items = retrieve_title_contains(user_q, persist, engine)
+    return {"blocked": False, "items": items, "query": user_q, "filters": query_filters.describe(filters), "query_embedding": q_emb}
+
+def compute_results(user_q: str, options: Dict | None = None, cache: answer_cache.SemanticCache | None = None,
+                    known_authors: Callable[[], List[str]] | None = None) -> Dict:
+    """
+    Rezultatul unei căutări: {"blocked", "items", "answer", "query", "filters", "cached", "degraded"}.
+    `options` suprascrie DEFAULT_OPTIONS; `known_authors` (opțional, ex. cu cache) alimentează
+    recunoașterea autorilor din text. Dacă bugetul LLM e epuizat (admission.Rejected), întoarce
+    potrivirile cu DEGRADED_MSG în loc de răspuns și `degraded` = motivul respingerii.
+    """
+    o = dict(DEFAULT_OPTIONS, **(options or {}))
+    cache = cache or ANSWER_CACHE
+    found = search(user_q, o, known_authors)
+    if found["blocked"]:
+        return found
+    items, q_emb = found["items"], found["query_embedding"]
+    key = answer_cache.candidate_key([it["id"] for it in items], o["model"])
+    with tracing.span("answer_cache") as sp:
+        answer = cache.lookup(q_emb, key, o["cache_threshold"]) if q_emb is not None else None
+        cached = answer is not None
+        sp["attrs"]["hit"] = cached
+    degraded = None
+    if not cached:
+        try:
+            answer = llm_recommend(user_q, items, model=o["model"])
+        except admission.Rejected as e:
+            answer, degraded = DEGRADED_MSG, e.reason
+        else:
+            if q_emb is not None:
+                cache.put(q_emb, key, answer)
+    idx = extract_recommended_title(answer, items)
+    if idx is not None and idx != 0:
+        items = [items[idx]] + items[:idx] + items[idx+1:]
+    return {"blocked": False, "items": items, "answer": answer, "query": user_q, "filters": found["filters"], "cached": cached,
+            "degraded": degraded}
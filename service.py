@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+service.py — serviciul de recomandare headless (HTTP/JSON), independent de Streamlit
+- Endpoint-uri:
+    POST /search     {"query", "options"} -> potrivirile (fără LLM)
+    POST /recommend  {"query", "options"} -> ca recommender.compute_results (+ "trace")
+    POST /tts        {"text", "voice"}    -> audio (Content-Type = mime)
+    POST /image      {"title", "author", "themes", "summary", "style", "size"} -> PNG
+                     (prompt-ul folosit în header-ul X-Image-Prompt, URL-encoded)
+    POST /jobs       {"kind": "tts"|"image", "params"} -> {"id", "status"} (coada media_jobs)
+    GET  /jobs/<id>, /jobs/<id>/result    -> starea jobului / rezultatul (bytes)
+    GET  /similar?id=<id>&n=5             -> cărțile din graful de similaritate
+    POST /items      {"ids": [...]}       -> {"items": [...]} (cărțile după id, pentru item_store)
+    GET  /stats, /health, /metrics        -> cache semantic, apeluri comasate, starea workerului, Prometheus
+  `options` sunt cele din recommender.DEFAULT_OPTIONS, fără "persist"/"engine": un
+  serviciu servește un singur store, ales la pornire.
+- Server asyncio (stdlib, HTTP/1.1 keep-alive); etapele blocante (Chroma, OpenAI) rulează
+  într-un pool de thread-uri, deci cererile lente nu blochează bucla.
+- Fiecare worker e un proces de durată: deschide colecția și indexurile la pornire
+  (recommender.warm_up) și păstrează cache-urile (colecții, BM25, teme, cache semantic)
+  între cereri. --workers N pornește N procese pe același port (SO_REUSEPORT, kernelul
+  distribuie conexiunile) sau, cu --port-per-worker, pe porturi consecutive, pentru un
+  load balancer extern (nginx, HAProxy). Cache-urile sunt per worker.
+- app_streamlit.py devine client subțire când primește URL-ul serviciului
+  (RECOMMENDER_URL sau câmpul din sidebar); vezi service_client.py.
+- Admitere (admission.py): sesiunea = header-ul X-Session-Id (trimis de service_client) sau
+  IP-ul clientului; peste bugetul sesiunii / al operației sau cu coada plină răspundem imediat
+  429 + Retry-After, iar /recommend fără buget LLM întoarce potrivirile cu "degraded".
+  Cel mult --max-pending cereri așteaptă pool-ul de thread-uri; restul primesc 429.
+- TTS / imagini prin /jobs: fiecare worker pornește MediaWorkers (--tts-workers,
+  --image-workers, --tts-rate, --image-rate) pe baza comună --jobs-db; cu
+  --tts-workers 0 --image-workers 0 joburile le consumă doar `python media_jobs.py worker`.
+
+Exemple:
+    python service.py --persist ./chroma_book_summaries --port 8000
+    python service.py --workers 4 --threads 16 --engine "mmap float16"
+    curl -s localhost:8000/recommend -d '{"query": "Vreau o carte despre prietenie și magie"}'
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+import admission
+import media_jobs
+import query_filters
+import recommender
+import similar_books
+import singleflight
+import tracing
+
+MAX_BODY = 1 << 20
+MAX_ITEM_IDS = 10000
+CLIENT_OPTIONS_EXCLUDED = ("persist", "engine")
+AUTHORS_TTL_S = 600.0
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+Response = Tuple[int, str, bytes, Dict[str, str]]
+
+# Sesiunea cererii curente (per conexiune / task asyncio); _offload o duce în thread-ul din pool.
+_SESSION: contextvars.ContextVar = contextvars.ContextVar("session", default=None)
+
+def _json(obj, status: int = 200) -> Response:
+    return status, "application/json", json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"), {}
+
+def _in_session(session_id, fn, *args):
+    with admission.session(session_id):
+        return fn(*args)
+
+class RecommendationService:
+    """Un worker: store-ul, cache-urile și pool-ul de thread-uri pentru etapele blocante."""
+
+    def __init__(self, persist_dir: Path, engine: str = "Chroma", threads: int = 8, jobs: media_jobs.JobQueue | None = None,
+                 max_pending: int = 0):
+        self.persist_dir = Path(persist_dir)
+        self.max_pending = max_pending or threads * 4
+        self.pending = self.saturated = 0
+        self.engine = engine
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="service")
+        self.started = time.time()
+        self.warm: Dict | None = None
+        self._authors: Tuple[float, List[str]] | None = None
+        self._authors_lock = threading.Lock()
+        self.jobs = jobs
+        self.routes = {
+            ("POST", "/search"): self.search, ("POST", "/recommend"): self.recommend,
+            ("POST", "/tts"): self.tts, ("POST", "/image"): self.image,
+            ("POST", "/jobs"): self.submit_job, ("GET", "/jobs"): self.job,
+            ("GET", "/similar"): self.similar, ("POST", "/items"): self.items, ("GET", "/stats"): self.stats,
+            ("GET", "/health"): self.health, ("GET", "/metrics"): self.metrics,
+        }
+
+    def warm_up(self):
+        self.warm = recommender.warm_up(self.persist_dir, self.engine)
+        self.known_authors()
+        return self.warm
+
+    # -------------------- etape blocante (în pool) --------------------
+
+    def known_authors(self) -> List[str]:
+        # Lista de autori e scumpă (parcurge colecția); o reîmprospătăm rar, ca @st.cache_data(ttl=600) din UI.
+        authors = self._authors
+        if authors is None or time.monotonic() - authors[0] > AUTHORS_TTL_S:
+            # Un singur thread reîmprospătează; celelalte așteaptă și refolosesc rezultatul.
+            with self._authors_lock:
+                authors = self._authors
+                if authors is None or time.monotonic() - authors[0] > AUTHORS_TTL_S:
+                    names = query_filters.known_authors(recommender.get_collection(self.persist_dir, self.engine))
+                    authors = self._authors = (time.monotonic(), names)
+        return authors[1]
+
+    def _options(self, req: Dict) -> Dict:
+        options = req.get("options") or {}
+        if not isinstance(options, dict):
+            raise HTTPError(400, "options must be an object")
+        unknown = set(options) - set(recommender.DEFAULT_OPTIONS)
+        if unknown:
+            raise HTTPError(400, f"unknown options: {sorted(unknown)}")
+        o = {k: v for k, v in options.items() if k not in CLIENT_OPTIONS_EXCLUDED}
+        o.update(persist=self.persist_dir, engine=self.engine)
+        if o.get("search_mode", "Context liber") not in recommender.SEARCH_MODES:
+            raise HTTPError(400, f"search_mode must be one of {recommender.SEARCH_MODES}")
+        filters = dict(o.get("filters") or {})
+        if isinstance(filters.get("author"), str) and filters["author"].strip():
+            # Autorul tastat liber în client -> numele exact(e) din colecție.
+            authors = query_filters.resolve_author(filters["author"], self.known_authors())
+            filters["author"] = (authors if len(authors) > 1 else authors[0]) if authors else filters["author"].strip()
+        o["filters"] = filters
+        return o
+
+    def _query(self, req: Dict) -> str:
+        q = str(req.get("query") or "").strip()
+        if not q:
+            raise HTTPError(400, "query is required")
+        return q
+
+    def _run_search(self, req: Dict, llm: bool) -> Dict:
+        q, o = self._query(req), self._options(req)
+        with tracing.trace("search", mode=o.get("search_mode", "Context liber"), query=q) as tr:
+            if llm:
+                out = recommender.compute_results(q, o, known_authors=self.known_authors)
+            else:
+                out = recommender.search(q, o, known_authors=self.known_authors)
+                out.pop("query_embedding", None)
+        return dict(out, trace=tr)
+
+    def _run_tts(self, req: Dict) -> Response:
+        text = str(req.get("text") or "")
+        if not text.strip():
+            raise HTTPError(400, "text is required")
+        audio, mime = recommender.tts_bytes(text, voice=str(req.get("voice") or "alloy"))
+        if not audio:
+            raise HTTPError(502, "TTS failed")
+        return 200, mime, audio, {}
+
+    def _run_image(self, req: Dict) -> Response:
+        args = {k: str(req.get(k) or "") for k in ("title", "author", "themes", "summary")}
+        if not args["title"]:
+            raise HTTPError(400, "title is required")
+        img, mime, prompt = recommender.generate_book_image(**args, style=str(req.get("style") or "copertă minimală"),
+                                                         size=str(req.get("size") or "1024x1024"))
+        if not img:
+            raise HTTPError(502, "image generation failed")
+        return 200, mime, img, {"X-Image-Prompt": quote(prompt or "")}
+
+    def _run_similar(self, book_id: str, n: int) -> Dict:
+        neighbours = similar_books.similar(book_id, self.persist_dir, n)
+        if not neighbours:
+            return {"id": book_id, "similar": []}
+        data = recommender.get_collection(self.persist_dir, self.engine).get(ids=[i for i, _ in neighbours], include=["metadatas"])
+        metas = dict(zip(data["ids"], data["metadatas"]))
+        return {"id": book_id, "similar": [dict(metas.get(i, {}), id=i, score=score) for i, score in neighbours]}
+
+    # -------------------- handlere async --------------------
+
+    async def _offload(self, fn, *args):
+        if self.pending >= self.max_pending:
+            # Pool-ul e saturat: refuzăm repede în loc să lungim coada (latență previzibilă).
+            self.saturated += 1
+            raise admission.Rejected("service", "queue_full")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, _in_session, _SESSION.get(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def search(self, req: Dict, params: Dict) -> Response:
+        return _json(await self._offload(self._run_search, req, False))
+
+    async def recommend(self, req: Dict, params: Dict) -> Response:
+        return _json(await self._offload(self._run_search, req, True))
+
+    async def tts(self, req: Dict, params: Dict) -> Response:
+        return await self._offload(self._run_tts, req)
+
+    async def image(self, req: Dict, params: Dict) -> Response:
+        return await self._offload(self._run_image, req)
+
+    async def similar(self, req: Dict, params: Dict) -> Response:
+        book_id = (params.get("id") or [""])[0]
+        if not book_id:
+            raise HTTPError(400, "id is required")
+        try:
+            n = max(1, min(50, int((params.get("n") or ["5"])[0])))
+        except ValueError:
+            raise HTTPError(400, "n must be an integer")
+        return _json(await self._offload(self._run_similar, book_id, n))
+
+    async def items(self, req: Dict, params: Dict) -> Response:
+        ids = req.get("ids")
+        if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+            raise HTTPError(400, "ids must be a list of strings")
+        if len(ids) > MAX_ITEM_IDS:
+            raise HTTPError(400, f"at most {MAX_ITEM_IDS} ids per request")
+        found = await self._offload(recommender.load_items, self.persist_dir, ids, self.engine) if ids else []
+        return _json({"items": found})
+
+    def _job_queue(self) -> media_jobs.JobQueue:
+        if self.jobs is None:
+            raise HTTPError(503, "media job queue disabled")
+        return self.jobs
+
+    async def submit_job(self, req: Dict, params: Dict) -> Response:
+        kind, job_params = req.get("kind"), req.get("params")
+        if kind not in media_jobs.KINDS or not isinstance(job_params, dict):
+            raise HTTPError(400, f"expected {{'kind': one of {media_jobs.KINDS}, 'params': {{...}}}}")
+        queue = self._job_queue()
+        admission.charge_session(kind, _SESSION.get())
+        jid = await self._offload(queue.submit, kind, job_params)
+        return _json(await self._offload(queue.get, jid))
+
+    async def job(self, req: Dict, params: Dict, rest: str = "") -> Response:
+        jid, _, what = rest.partition("/")
+        if not jid or what not in ("", "result"):
+            raise HTTPError(404, "expected /jobs/<id> or /jobs/<id>/result")
+        queue = self._job_queue()
+        if what == "result":
+            res = await self._offload(queue.result, jid)
+            if res is None:
+                raise HTTPError(404, "job not found or not finished")
+            data, mime, info = res
+            return 200, mime, data, {"X-Job-Info": quote(json.dumps(info, ensure_ascii=False))}
+        job = await self._offload(queue.get, jid)
+        if job is None:
+            raise HTTPError(404, "job not found")
+        return _json(job)
+
+    async def stats(self, req: Dict, params: Dict) -> Response:
+        jobs = await self._offload(self.jobs.stats) if self.jobs is not None else None
+        return _json({"pid": os.getpid(), "answer_cache": recommender.ANSWER_CACHE.stats(), "media_jobs": jobs,
+                      "singleflight": singleflight.stats(), "admission": admission.stats(),
+                      "pending": self.pending, "max_pending": self.max_pending, "saturated": self.saturated})
+
+    async def health(self, req: Dict, params: Dict) -> Response:
+        if self.warm is None:
+            # Warm-up-ul de la pornire a eșuat (ex. store-ul încă nu există): reîncercăm la verificare.
+            try:
+                await self._offload(self.warm_up)
+            except Exception:
+                pass
+        body = {"status": "ok" if self.warm is not None else "starting", "pid": os.getpid(),
+                "persist": str(self.persist_dir), "engine": self.engine, "uptime_s": time.time() - self.started,
+                "warm": self.warm}
+        return _json(body, 200 if self.warm is not None else 503)
+
+    async def metrics(self, req: Dict, params: Dict) -> Response:
+        cs = recommender.ANSWER_CACHE.stats()
+        g = f"{tracing.METRIC_PREFIX}_answer_cache"
+        extra = [f"# TYPE {g}_entries gauge", f"{g}_entries {cs['entries']}",
+                 f"# TYPE {g}_hits_total counter", f"{g}_hits_total {cs['hits']}",
+                 f"# TYPE {g}_misses_total counter", f"{g}_misses_total {cs['misses']}"]
+        a, ast = f"{tracing.METRIC_PREFIX}_admission", admission.stats()
+        extra.append(f"# TYPE {a}_admitted_total counter")
+        extra += [f'{a}_admitted_total{{op="{op}"}} {st["admitted"]}' for op, st in ast.items()]
+        extra.append(f"# TYPE {a}_rejected_total counter")
+        extra += [f'{a}_rejected_total{{op="{op}",reason="{reason}"}} {n}'
+                  for op, st in ast.items() for reason, n in sorted(st["rejected"].items())]
+        extra.append(f'{a}_rejected_total{{op="service",reason="queue_full"}} {self.saturated}')
+        return 200, "text/plain; version=0.0.4", (tracing.export_prometheus() + "\n".join(extra) + "\n").encode("utf-8"), {}
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Response:
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        root, _, rest = path[1:].partition("/")
+        handler = self.routes.get((method, path))
+        if handler is None and rest and (method, "/" + root) in self.routes:
+            # Resurse cu id în cale (/jobs/<id>[/result]).
+            handler = functools.partial(self.routes[(method, "/" + root)], rest=rest)
+        if handler is None:
+            if path in {p for _, p in self.routes}:
+                return _json({"error": "method not allowed"}, 405)
+            return _json({"error": "not found"}, 404)
+        try:
+            req = json.loads(body) if body else {}
+            if not isinstance(req, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            return await handler(req, parse_qs(url.query))
+        except json.JSONDecodeError as e:
+            return _json({"error": f"invalid JSON: {e}"}, 400)
+        except HTTPError as e:
+            return _json({"error": str(e)}, e.status)
+        except admission.Rejected as e:
+            status, ctype, payload, _ = _json({"error": str(e), "op": e.op, "reason": e.reason, "retry_after_s": e.retry_after}, 429)
+            return status, ctype, payload, {"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        except recommender.MissingAPIKey as e:
+            return _json({"error": str(e)}, 503)
+        except Exception as e:
+            return _json({"error": f"{type(e).__name__}: {e}"}, 500)
+
+    # -------------------- HTTP/1.1 --------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._write(writer, *_json({"error": "malformed request line"}, 400), keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._write(writer, *_json({"error": "body too large"}, 413), keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                _SESSION.set(headers.get("x-session-id") or (writer.get_extra_info("peername") or ("?",))[0])
+                await self._write(writer, *(await self.dispatch(method.upper(), target, body)), keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, status: int, ctype: str, payload: bytes, headers: Dict[str, str],
+                     keep_alive: bool = True):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {ctype}", f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}", f"X-Worker-Pid: {os.getpid()}"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+async def serve(persist_dir: Path, host: str = "127.0.0.1", port: int = 8000, engine: str = "Chroma", threads: int = 8,
+                reuse_port: bool = False, media: Dict | None = None, max_pending: int = 0):
+    """`media` = {"db", "concurrency", "per_minute"} pentru coada TTS/imagini (None = fără /jobs)."""
+    jobs = media_jobs.JobQueue(media["db"]) if media else None
+    workers = media_jobs.MediaWorkers(jobs, media["concurrency"], media["per_minute"]).start() if media else None
+    service = RecommendationService(persist_dir, engine, threads, jobs, max_pending)
+    loop = asyncio.get_running_loop()
+    try:
+        info = await loop.run_in_executor(service.pool, service.warm_up)
+        print(f"[{os.getpid()}] warm: {info}", flush=True)
+    except Exception as e:
+        # Workerul pornește oricum; /health raportează 503 până la prima încărcare reușită.
+        print(f"[{os.getpid()}] warm-up failed: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+    server = await asyncio.start_server(service.handle, host, port, reuse_port=reuse_port)
+    print(f"[{os.getpid()}] serving on http://{host}:{port} ({engine}, {threads} threads)", flush=True)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass  # Windows / thread secundar: Ctrl+C ajunge ca KeyboardInterrupt
+    async with server:
+        await stop.wait()
+    service.pool.shutdown(wait=False, cancel_futures=True)
+    if workers is not None:
+        workers.stop()
+
+def _worker(persist_dir: str, host: str, port: int, engine: str, threads: int, reuse_port: bool, media: Dict | None,
+            max_pending: int = 0):
+    try:
+        asyncio.run(serve(Path(persist_dir), host, port, engine, threads, reuse_port, media, max_pending))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless book recommendation service (HTTP/JSON)")
+    parser.add_argument("--persist", type=Path, default=Path("./chroma_book_summaries"), help="Chroma store served by this service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--engine", choices=["Chroma", "mmap float32", "mmap float16", "mmap int8"], default="Chroma")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (each keeps its own warm caches)")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per worker for blocking stages (Chroma, OpenAI)")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Requests allowed to wait for a thread before fast 429s (default: 4 x --threads)")
+    parser.add_argument("--port-per-worker", action="store_true",
+                        help="Bind worker i to port+i (for an external load balancer) instead of sharing the port")
+    parser.add_argument("--jobs-db", type=Path, default=Path(media_jobs.DEFAULT_DB), help="SQLite media job queue")
+    parser.add_argument("--no-jobs", action="store_true", help="Disable the /jobs endpoints")
+    parser.add_argument("--tts-workers", type=int, default=2, help="TTS job threads per worker process")
+    parser.add_argument("--image-workers", type=int, default=1, help="Image job threads per worker process")
+    parser.add_argument("--tts-rate", type=float, default=0.0, help="Max TTS jobs per minute per worker process (0 = unlimited)")
+    parser.add_argument("--image-rate", type=float, default=0.0, help="Max image jobs per minute per worker process (0 = unlimited)")
+    args = parser.parse_args()
+
+    media = None if args.no_jobs else {"db": str(args.jobs_db),
+                                       "concurrency": {"tts": args.tts_workers, "image": args.image_workers},
+                                       "per_minute": {"tts": args.tts_rate, "image": args.image_rate}}
+    if args.workers <= 1:
+        _worker(str(args.persist), args.host, args.port, args.engine, args.threads, False, media, args.max_pending)
+        return
+    shared = not args.port_per_worker
+    if shared and not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("SO_REUSEPORT is not available on this platform; use --port-per-worker behind a load balancer.")
+    procs = [multiprocessing.Process(target=_worker, name=f"worker-{i}", daemon=False,
+                                     args=(str(args.persist), args.host, args.port if shared else args.port + i,
+                                           args.engine, args.threads, shared, media, args.max_pending))
+             for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in procs])
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+if __name__ == "__main__":
+    main()
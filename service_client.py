@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+service_client.py — client HTTP subțire pentru service.py (doar stdlib)
+- Aceleași forme de rezultat ca recommender: recommend() ~ compute_results (+ "trace"),
+  tts() -> (audio, mime), image() -> (bytes, mime, prompt), similar() -> [meta + id + score],
+  items(ids) -> [item] (ca recommender.load_items; loader-ul lui item_store în modul client).
+- RemoteJobQueue: aceeași interfață ca media_jobs.JobQueue (submit / get / result),
+  peste /jobs ale serviciului — UI-ul face polling la fel, local sau la distanță.
+- Erorile serviciului (HTTP 4xx/5xx, conexiune refuzată) devin ServiceError; 429 = limită
+  de admitere atinsă (vezi admission.py) și se propagă mereu, inclusiv din tts() / image()
+  (celelalte erori dau acolo bytes goi, ca tts_utils / img_gen_utils). `session_id` se trimite ca X-Session-Id, ca
+  serviciul să aplice bugetul per sesiune, nu per IP (toate sesiunile Streamlit au același IP).
+"""
+from __future__ import annotations
+import json
+import urllib.error
+import urllib.request
+from typing import Dict, List, Tuple
+from urllib.parse import quote, unquote, urlencode
+
+class ServiceError(RuntimeError):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status  # None = serviciul nu a răspuns
+
+class ServiceClient:
+    def __init__(self, base_url: str, timeout: float = 120.0, session_id: str | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session_id = session_id
+
+    def _call(self, path: str, body: Dict | None = None) -> Tuple[bytes, str, Dict[str, str]]:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.session_id:
+            headers["X-Session-Id"] = self.session_id
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                return r.read(), r.headers.get("Content-Type", ""), dict(r.headers)
+        except urllib.error.HTTPError as e:
+            try:
+                msg = json.loads(e.read()).get("error", e.reason)
+            except (ValueError, AttributeError):
+                msg = e.reason
+            raise ServiceError(f"{path}: HTTP {e.code}: {msg}", e.code) from None
+        except (urllib.error.URLError, OSError) as e:
+            raise ServiceError(f"{self.base_url}: {getattr(e, 'reason', e)}") from None
+
+    def _json(self, path: str, body: Dict | None = None) -> Dict:
+        return json.loads(self._call(path, body)[0])
+
+    @staticmethod
+    def _remote_options(options: Dict | None) -> Dict:
+        # Store-ul și motorul le alege serviciul; restul setărilor din UI se trimit ca atare.
+        return {k: v for k, v in (options or {}).items() if k not in ("persist", "engine")}
+
+    def search(self, query: str, options: Dict | None = None) -> Dict:
+        return self._json("/search", {"query": query, "options": self._remote_options(options)})
+
+    def recommend(self, query: str, options: Dict | None = None) -> Dict:
+        return self._json("/recommend", {"query": query, "options": self._remote_options(options)})
+
+    def tts(self, text: str, voice: str = "alloy") -> Tuple[bytes, str]:
+        try:
+            audio, mime, _ = self._call("/tts", {"text": text, "voice": voice})
+        except ServiceError as e:
+            if e.status == 429:
+                raise  # limită de admitere: apelantul afișează avertismentul, nu un audio gol
+            return b"", "audio/mp3"
+        return audio, mime
+
+    def image(self, title: str, author: str, themes: str, summary: str, style: str = "copertă minimală",
+              size: str = "1024x1024") -> Tuple[bytes, str, str]:
+        body = {"title": title, "author": author, "themes": themes, "summary": summary, "style": style, "size": size}
+        try:
+            img, mime, headers = self._call("/image", body)
+        except ServiceError as e:
+            if e.status == 429:
+                raise
+            return b"", "image/png", ""
+        return img, mime, unquote(headers.get("X-Image-Prompt", ""))
+
+    def similar(self, book_id: str, n: int = 5) -> List[Dict]:
+        return self._json("/similar?" + urlencode({"id": book_id, "n": n}))["similar"]
+
+    def items(self, ids: List[str]) -> List[Dict]:
+        return self._json("/items", {"ids": list(ids)})["items"]
+
+    def submit_job(self, kind: str, params: Dict) -> Dict:
+        return self._json("/jobs", {"kind": kind, "params": params})
+
+    def job(self, job_id: str) -> Dict | None:
+        try:
+            return self._json(f"/jobs/{quote(job_id)}")
+        except ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def job_result(self, job_id: str) -> Tuple[bytes, str, Dict] | None:
+        try:
+            data, mime, headers = self._call(f"/jobs/{quote(job_id)}/result")
+        except ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+        return data, mime, json.loads(unquote(headers.get("X-Job-Info", "")) or "{}")
+
+    def stats(self) -> Dict:
+        return self._json("/stats")
+
+    def health(self) -> Dict:
+        return self._json("/health")
+
+class RemoteJobQueue:
+    """Adaptor: media_jobs.JobQueue.submit/get/result peste un ServiceClient."""
+
+    def __init__(self, client: ServiceClient):
+        self.client = client
+
+    def submit(self, kind: str, params: Dict) -> str:
+        return self.client.submit_job(kind, params)["id"]
+
+    def get(self, job_id: str) -> Dict | None:
+        return self.client.job(job_id)
+
+    def result(self, job_id: str) -> Tuple[bytes, str, Dict] | None:
+        return self.client.job_result(job_id)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+sharding.py — colecție împărțită pe mai multe shard-uri Chroma, cu fan-out paralel
+- Configurația stă în <persist_dir>/shards.json:
+    {"by": "language" | "hash", "num_shards": 4, "timeout_s": 5.0,
+     "shards": [{"name": "ro", "persist": "./chroma_book_summaries", "collection": "books_ro"}, ...]}
+  "language": câte un shard per valoare a metadatei `language` (creat la ingest la nevoie);
+  "hash": `num_shards` shard-uri, rutare după crc32(id) % num_shards.
+  Un shard poate fi o colecție în același persist dir sau un persist dir separat.
+- ShardedCollection are aceeași interfață ca o colecție Chroma (count/get/query/upsert):
+  interogarea se embed-uiește O SINGURĂ DATĂ, apoi se trimite concurent la toate
+  shard-urile; rezultatele (deja sortate după distanță) se combină cu heapq.merge
+  (top-k). La query(), un shard care depășește `timeout_s` sau eșuează este ignorat
+  pentru cererea curentă (lista lui apare în rezultat ca `skipped_shards` și în trace),
+  ca latența să rămână plată. Fiecare shard are pool-ul lui de thread-uri: un shard lent
+  nu ține la coadă apelurile către celelalte (timeout-ul ar număra și așteptarea).
+  count() și get() așteaptă toate shard-urile și propagă eroarea unui shard: un total
+  sau o căutare după id incompletă ar fi luată drept adevărată (ex. export, ingest).
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import json
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import tracing
+
+CONFIG_FILE = "shards.json"
+DEFAULT_TIMEOUT_S = 5.0
+
+def load_config(persist_dir: Path) -> Dict | None:
+    path = Path(persist_dir) / CONFIG_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_config(persist_dir: Path, config: Dict):
+    path = Path(persist_dir) / CONFIG_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding="utf-8")
+
+def init_config(persist_dir: Path, by: str, num_shards: int = 4, collection_name: str = "books",
+                timeout_s: float = DEFAULT_TIMEOUT_S) -> Dict:
+    """Creează configurația (dacă nu există deja) pentru shard-uri în `persist_dir`."""
+    existing = load_config(persist_dir)
+    if existing is not None:
+        return existing
+    if by not in ("language", "hash"):
+        raise ValueError("by must be 'language' or 'hash'")
+    shards = []
+    if by == "hash":
+        shards = [{"name": str(i), "persist": str(persist_dir), "collection": f"{collection_name}_{i}"} for i in range(num_shards)]
+    config = {"by": by, "num_shards": num_shards if by == "hash" else 0, "timeout_s": timeout_s,
+              "collection": collection_name, "shards": shards}
+    save_config(persist_dir, config)
+    return config
+
+def shard_key(config: Dict, book_id: str, meta: Dict | None) -> str:
+    if config["by"] == "hash":
+        return str(zlib.crc32(book_id.encode("utf-8")) % int(config["num_shards"]))
+    return str((meta or {}).get("language") or "ro")
+
+SHARD_WORKERS = 8
+_POOLS: Dict[Tuple[str, str], ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def _pool(persist_dir: Path, name: str) -> ThreadPoolExecutor:
+    # Pool de durată per shard (fără thread-uri noi la fiecare interogare), partajat de toate cererile.
+    key = (str(persist_dir), name)
+    with _pools_lock:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix=f"shard-{name}")
+    return pool
+
+class ShardedCollection:
+    def __init__(self, persist_dir: Path, config: Dict, open_shard: Callable[[Path, str], object],
+                 embed: Callable[[Sequence[str]], List] | None = None):
+        self.persist_dir = Path(persist_dir)
+        self.config = config
+        self.open_shard = open_shard
+        self.embed = embed
+        self.timeout_s = float(config.get("timeout_s", DEFAULT_TIMEOUT_S))
+        self.shards: Dict[str, object] = {s["name"]: open_shard(Path(s["persist"]), s["collection"]) for s in config["shards"]}
+        self.metadata = {"sharded_by": config["by"], "shards": len(self.shards)}
+
+    def _shard_for(self, key: str):
+        if key not in self.shards:
+            # Shard nou (ex. o limbă nouă la ingest): îl înregistrăm în configurație.
+            spec = {"name": key, "persist": str(self.persist_dir), "collection": f"{self.config.get('collection', 'books')}_{key}"}
+            self.config["shards"].append(spec)
+            save_config(self.persist_dir, self.config)
+            self.shards[key] = self.open_shard(Path(spec["persist"]), spec["collection"])
+        return self.shards[key]
+
+    def _fan_out(self, fn: Callable[[object], Dict], strict: bool = False) -> Tuple[Dict[str, Dict], List[str]]:
+        """({shard: fn(col)}, shard-uri ignorate); strict = fără timeout, prima eroare a unui shard se propagă."""
+        futures = {_pool(self.persist_dir, name).submit(fn, col): name for name, col in self.shards.items()}
+        if strict:
+            return {name: f.result() for f, name in futures.items()}, []
+        done, pending = wait(futures, timeout=self.timeout_s)
+        skipped = [futures[f] for f in pending]
+        out = {}
+        for f in done:
+            try:
+                out[futures[f]] = f.result()
+            except Exception:
+                skipped.append(futures[f])
+        return out, sorted(skipped)
+
+    # -------------------------- read --------------------------
+
+    def count(self) -> int:
+        return sum(int(c) for c in self._fan_out(lambda col: col.count(), strict=True)[0].values())
+
+    def query(self, query_texts: List[str] | None = None, query_embeddings=None, n_results: int = 10,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), where: Dict | None = None,
+              where_document: Dict | None = None) -> Dict:
+        if query_embeddings is None:
+            query_embeddings = self.embed(query_texts)
+        query_embeddings = [list(map(float, q)) for q in query_embeddings]
+        include = list(dict.fromkeys(list(include) + ["distances"]))
+        kwargs = {"query_embeddings": query_embeddings, "include": include}
+        if where:
+            kwargs["where"] = where
+        if where_document:
+            kwargs["where_document"] = where_document
+
+        def run(col):
+            n = min(n_results, int(col.count()))
+            if n <= 0:
+                return None
+            return col.query(n_results=n, **kwargs)
+
+        found, skipped = self._fan_out(run)
+        if skipped:
+            tracing.annotate(skipped_shards=",".join(skipped))
+        results = [r for r in found.values() if r]
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "skipped_shards": skipped}
+        for qi in range(len(query_embeddings)):
+            per_shard = []
+            for r in results:
+                rows = zip(r["ids"][qi], (r.get("documents") or [[None]])[qi] if "documents" in include else itertools.repeat(None),
+                           (r.get("metadatas") or [[None]])[qi] if "metadatas" in include else itertools.repeat(None),
+                           r["distances"][qi])
+                per_shard.append([(dist, _id, doc, meta) for _id, doc, meta, dist in rows])
+            top = list(itertools.islice(heapq.merge(*per_shard, key=lambda t: t[0]), n_results))
+            out["ids"].append([t[1] for t in top])
+            out["documents"].append([t[2] for t in top])
+            out["metadatas"].append([t[3] for t in top])
+            out["distances"].append([t[0] for t in top])
+        return out
+
+    def get(self, ids: List[str] | None = None, where: Dict | None = None, limit: int | None = None,
+            offset: int | None = None, include: Sequence[str] = ("documents", "metadatas"),
+            where_document: Dict | None = None) -> Dict:
+        kwargs = {"include": list(include)}
+        if ids is not None:
+            kwargs["ids"] = list(ids)
+        if where:
+            kwargs["where"] = where
+        if where_document:
+            kwargs["where_document"] = where_document
+        keys = ["ids"] + [k for k in ("documents", "metadatas", "embeddings") if k in include]
+        out = {k: [] for k in keys}
+        if ids is not None or where or where_document or (limit is None and not offset):
+            # Căutare punctuală / filtrată: fan-out, concatenare în ordinea shard-urilor, apoi paginare.
+            found, _ = self._fan_out(lambda col: col.get(**kwargs), strict=True)
+            for name in sorted(found):
+                for k in keys:
+                    vals = found[name].get(k)
+                    out[k].extend(list(vals) if vals is not None else [])
+            start = int(offset or 0)
+            end = None if limit is None else start + int(limit)
+            return {k: v[start:end] for k, v in out.items()}
+        # Scanare paginată (ex. export / graf de vecini): shard-urile se parcurg secvențial.
+        skip, remaining = int(offset or 0), limit
+        for name in sorted(self.shards):
+            if remaining is not None and remaining <= 0:
+                break
+            col = self.shards[name]
+            n = int(col.count())
+            if skip >= n:
+                skip -= n
+                continue
+            r = col.get(offset=skip, limit=remaining, **kwargs)
+            skip = 0
+            for k in keys:
+                vals = r.get(k)
+                out[k].extend(list(vals) if vals is not None else [])
+            if remaining is not None:
+                remaining -= len(r["ids"])
+        return out
+
+    # -------------------------- write --------------------------
+
+    def upsert(self, ids: List[str], documents: List[str] | None = None, metadatas: List[Dict] | None = None,
+               embeddings: List | None = None):
+        groups: Dict[str, List[int]] = {}
+        for i, book_id in enumerate(ids):
+            groups.setdefault(shard_key(self.config, book_id, metadatas[i] if metadatas else None), []).append(i)
+        for key, idx in groups.items():
+            kwargs = {"ids": [ids[i] for i in idx]}
+            if documents is not None:
+                kwargs["documents"] = [documents[i] for i in idx]
+            if metadatas is not None:
+                kwargs["metadatas"] = [metadatas[i] for i in idx]
+            if embeddings is not None:
+                kwargs["embeddings"] = [embeddings[i] for i in idx]
+            self._shard_for(key).upsert(**kwargs)
+            if self.config["by"] == "language":
+                # Cartea și-a schimbat limba: o scoatem din celelalte shard-uri.
+                for name, col in self.shards.items():
+                    if name != key:
+                        col.delete(ids=kwargs["ids"])
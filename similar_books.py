@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+similar_books.py — graf precalculat "Cărți similare" (top-N vecini per carte)
+- Se calculează la ingest din embedding-urile deja stocate în Chroma (fără apeluri API),
+  în loturi vectorizate: similaritate cosinus = produs scalar pe vectori normalizați,
+  top-N prin np.argpartition (sortare parțială).
+- Stocare compactă în <persist_dir>/similar_books.npz:
+    ids        (N,)      id-urile cărților
+    neighbors  (N, top)  int32, indici în `ids` (-1 = lipsă)
+    scores     (N, top)  float16, similaritatea cosinus
+- La ingest incremental se recalculează complet doar rândurile afectate (cărțile
+  modificate/noi și cele care aveau ca vecin o carte modificată/ștearsă); restul doar
+  își compară lista existentă cu cărțile modificate.
+- similar(book_id) este o căutare O(1) în graful încărcat.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+GRAPH_FILE = "similar_books.npz"
+DEFAULT_TOP_N = 10
+
+def _unit_rows(emb: np.ndarray) -> np.ndarray:
+    emb = np.asarray(emb, dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return emb / norms
+
+def _top_n(sims: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-N pe fiecare rând (descrescător) cu sortare parțială."""
+    n = min(top_n, sims.shape[1])
+    if n <= 0:
+        return np.empty((sims.shape[0], 0), dtype=np.int32), np.empty((sims.shape[0], 0), dtype=np.float32)
+    part = np.argpartition(-sims, n - 1, axis=1)[:, :n]
+    part_scores = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1).astype(np.int32), np.take_along_axis(part_scores, order, axis=1)
+
+def _pad(idx: np.ndarray, scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    if idx.shape[1] == top_n:
+        return idx, scores
+    pad = top_n - idx.shape[1]
+    return (np.pad(idx, ((0, 0), (0, pad)), constant_values=-1),
+            np.pad(scores, ((0, 0), (0, pad)), constant_values=0.0))
+
+def compute_neighbors(unit: np.ndarray, rows: np.ndarray, top_n: int = DEFAULT_TOP_N,
+                      batch_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-N vecini (exclusiv cartea însăși) pentru rândurile `rows` din `unit`."""
+    out_idx = np.full((len(rows), top_n), -1, dtype=np.int32)
+    out_scores = np.zeros((len(rows), top_n), dtype=np.float32)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        sims = unit[batch] @ unit.T
+        sims[np.arange(len(batch)), batch] = -np.inf  # fără auto-potrivire
+        idx, scores = _pad(*_top_n(sims, top_n), top_n)
+        out_idx[start:start + len(batch)] = idx
+        out_scores[start:start + len(batch)] = scores
+    out_idx[~np.isfinite(out_scores)] = -1
+    out_scores[~np.isfinite(out_scores)] = 0.0
+    return out_idx, out_scores
+
+def _fetch_embeddings(col, batch_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+    total = int(col.count())
+    ids: List[str] = []
+    chunks = []
+    for offset in range(0, total, batch_size):
+        data = col.get(include=["embeddings"], limit=batch_size, offset=offset)
+        ids.extend(data["ids"])
+        chunks.append(np.asarray(data["embeddings"], dtype=np.float32))
+    if not chunks:
+        return [], np.empty((0, 0), dtype=np.float32)
+    return ids, np.vstack(chunks)
+
+def build_graph(col, persist_dir: Path, top_n: int = DEFAULT_TOP_N, changed_ids: Iterable[str] | None = None,
+                batch_size: int = 1024) -> int:
+    """
+    (Re)calculează graful de vecini. Cu `changed_ids` și un graf existent, actualizează
+    doar rândurile afectate. Întoarce numărul de rânduri recalculate complet.
+    """
+    ids, emb = _fetch_embeddings(col)
+    path = Path(persist_dir) / GRAPH_FILE
+    if not ids:
+        return 0
+    unit = _unit_rows(emb)
+    pos = {book_id: i for i, book_id in enumerate(ids)}
+    old = _load(path) if changed_ids is not None else None
+
+    if old is None or old["neighbors"].shape[1] != top_n:
+        neighbors, scores = compute_neighbors(unit, np.arange(len(ids)), top_n, batch_size)
+        recomputed = len(ids)
+    else:
+        old_ids = [str(x) for x in old["ids"]]
+        changed = {book_id for book_id in changed_ids if book_id in pos} | (set(pos) - set(old_ids))
+        removed = set(old_ids) - set(pos)
+        stale = changed | removed
+        old_pos = {book_id: i for i, book_id in enumerate(old_ids)}
+
+        neighbors = np.full((len(ids), top_n), -1, dtype=np.int32)
+        scores = np.zeros((len(ids), top_n), dtype=np.float32)
+        full_rows = []
+        keep_rows = []
+        for i, book_id in enumerate(ids):
+            j = old_pos.get(book_id)
+            if j is None or book_id in changed:
+                full_rows.append(i)
+                continue
+            nbr_ids = [old_ids[n] for n in old["neighbors"][j] if n >= 0]
+            if stale.intersection(nbr_ids):
+                full_rows.append(i)
+                continue
+            neighbors[i, :len(nbr_ids)] = [pos[n] for n in nbr_ids]
+            scores[i] = old["scores"][j].astype(np.float32)
+            keep_rows.append(i)
+
+        if full_rows:
+            rows = np.asarray(full_rows)
+            neighbors[rows], scores[rows] = compute_neighbors(unit, rows, top_n, batch_size)
+        # Rândurile neafectate: comparăm doar cu cărțile modificate și le inserăm dacă intră în top.
+        changed_rows = np.asarray(sorted(pos[book_id] for book_id in changed), dtype=np.int64)
+        if keep_rows and len(changed_rows):
+            for start in range(0, len(keep_rows), batch_size):
+                rows = np.asarray(keep_rows[start:start + batch_size])
+                sims = unit[rows] @ unit[changed_rows].T
+                cand_idx = np.concatenate([neighbors[rows], np.broadcast_to(changed_rows, sims.shape)], axis=1)
+                cand_scores = np.concatenate([np.where(neighbors[rows] >= 0, scores[rows], -np.inf), sims], axis=1)
+                top_i, top_s = _top_n(cand_scores, top_n)
+                new_idx = np.take_along_axis(cand_idx, top_i, axis=1)
+                new_idx[~np.isfinite(top_s)] = -1
+                neighbors[rows] = new_idx
+                scores[rows] = np.where(np.isfinite(top_s), top_s, 0.0)
+        recomputed = len(full_rows)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez_compressed(tmp, ids=np.asarray(ids), neighbors=neighbors.astype(np.int32),
+                        scores=scores.astype(np.float16))
+    tmp.replace(path)
+    return recomputed
+
+def _load(path: Path) -> Dict[str, np.ndarray] | None:
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {"ids": data["ids"], "neighbors": data["neighbors"], "scores": data["scores"]}
+
+class SimilarGraph:
+    def __init__(self, ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        self.ids = [str(x) for x in ids]
+        self.neighbors = neighbors
+        self.scores = scores
+        self.pos = {book_id: i for i, book_id in enumerate(self.ids)}
+
+    def similar(self, book_id: str, n: int = 5) -> List[Tuple[str, float]]:
+        i = self.pos.get(book_id)
+        if i is None:
+            return []
+        return [(self.ids[j], float(s)) for j, s in zip(self.neighbors[i][:n], self.scores[i][:n]) if j >= 0]
+
+_CACHE: Dict[str, Tuple[float, SimilarGraph]] = {}
+
+def load_cached(persist_dir: Path) -> SimilarGraph | None:
+    """Încarcă graful o singură dată per proces; se reîncarcă doar dacă fișierul s-a schimbat."""
+    path = Path(persist_dir) / GRAPH_FILE
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    key = str(path.resolve())
+    hit = _CACHE.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    data = _load(path)
+    if data is None:
+        return None
+    graph = SimilarGraph(data["ids"], data["neighbors"], data["scores"])
+    _CACHE[key] = (mtime, graph)
+    return graph
+
+def similar(book_id: str, persist_dir: Path, n: int = 5) -> List[Tuple[str, float]]:
+    """[(id, scor_cosinus)] pentru cărțile cele mai apropiate; listă goală dacă nu există graf."""
+    graph = load_cached(persist_dir)
+    return graph.similar(book_id, n) if graph is not None else []
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+singleflight.py — comasarea apelurilor identice aflate în zbor (embedding, LLM, TTS, imagini)
+- coalesce(name, key) decorează o funcție scumpă: cât timp un apel cu aceeași cheie
+  (intrările normalizate) rulează, apelurile concurente identice nu mai pleacă spre API,
+  ci așteaptă și primesc același rezultat (sau aceeași excepție).
+- Nu e un cache: cheia se eliberează când apelul se termină; cererile ulterioare
+  calculează din nou (pentru refolosire există answer_cache / media_jobs).
+- Metrici per grup: upstream (apeluri reale), coalesced (apeluri economisite),
+  in_flight, errors; stats() pentru UI / service.py, iar apelurile comasate apar și în
+  tracing ca atributul `coalesced` al span-ului (bookrag_stage_coalesced_total).
+Comasarea e per proces (sesiunile Streamlit, thread-urile unui worker din service.py).
+"""
+from __future__ import annotations
+import functools
+import threading
+from typing import Callable, Dict, Hashable
+
+import tracing
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.upstream = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Rulează fn(*args, **kwargs) o singură dată per cheie aflată în zbor."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+        if not leader:
+            tracing.annotate(coalesced=1)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.upstream + self.coalesced
+            return {"upstream": self.upstream, "coalesced": self.coalesced, "in_flight": len(self._calls),
+                    "errors": self.errors, "saved_ratio": self.coalesced / total if total else 0.0}
+
+    def reset(self):
+        with self._lock:
+            self.upstream = self.coalesced = self.errors = 0
+
+_GROUPS: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+def group(name: str) -> SingleFlight:
+    with _groups_lock:
+        g = _GROUPS.get(name)
+        if g is None:
+            g = _GROUPS[name] = SingleFlight(name)
+        return g
+
+def coalesce(name: str, key: Callable[..., Hashable]):
+    """Decorator; `key` primește aceleași argumente ca funcția și întoarce cheia normalizată."""
+    flight = group(name)
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key(*args, **kwargs), fn, *args, **kwargs)
+        wrapper.flight = flight
+        return wrapper
+    return deco
+
+def stats() -> Dict[str, Dict]:
+    with _groups_lock:
+        groups = list(_GROUPS.values())
+    return {g.name: g.stats() for g in groups}
+
+def reset():
+    with _groups_lock:
+        groups = list(_GROUPS.values())
+    for g in groups:
+        g.reset()
+
+def squash(text) -> str:
+    """Normalizarea textului pentru chei: spațiile multiple / de la capete nu schimbă cererea."""
+    return " ".join(str(text or "").split())
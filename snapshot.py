@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+snapshot.py — snapshot-uri portabile ale colecției (replicare pe noduri noi fără re-embedding)
+- export_snapshot() copiază în loturi (memorie constantă) id-urile, documentele, metadatele
+  și embedding-urile colecției (plus, opțional, colecția de pasaje) într-un director:
+    manifest.json            format, versiune, model, dimensiune, număr de rânduri per colecție,
+                             parametrii HNSW, configurația de shard-uri, sha256 + mărimea fiecărui fișier
+    <colecție>.emb.npz       câte o matrice float32 (n, D) per lot: emb_000000, emb_000001, ...
+                             (zip deflate, citibil cu np.load)
+    <colecție>.jsonl.gz      un rând JSON per carte / pasaj: {"id", "document", "metadata"}, în
+                             aceeași ordine ca rândurile matricelor
+  Manifestul se scrie ultimul: un export întrerupt nu pare complet.
+- verify() recalculează sha256 pentru fiecare fișier și îl compară cu manifestul.
+- iter_batches() citește înapoi loturile (ids, documente, metadate, embeddings); load_to_chroma_and_search.py
+  `import` le scrie cu upsert(embeddings=...) — niciun apel la API-ul de embeddings.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import json
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+FORMAT = "bookrag-snapshot"
+FORMAT_VERSION = 1
+EMBED_MODEL = "text-embedding-3-small"
+MANIFEST = "manifest.json"
+
+Batch = Tuple[List[str], List[str], List[Dict], np.ndarray]
+
+def _files(name: str) -> Tuple[str, str]:
+    return f"{name}.emb.npz", f"{name}.jsonl.gz"
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def index_params(col) -> Dict:
+    """Parametrii hnsw:* ai colecției (la o colecție cu shard-uri: ai primului shard)."""
+    shards = getattr(col, "shards", None)
+    if shards:
+        col = shards[sorted(shards)[0]]
+    return {k: v for k, v in (getattr(col, "metadata", None) or {}).items() if k.startswith("hnsw:")}
+
+def _export_one(col, out_dir: Path, name: str, batch_size: int) -> Dict:
+    emb_name, rows_name = _files(name)
+    total, written, batches, dim = int(col.count()), 0, 0, None
+    with zipfile.ZipFile(out_dir / (emb_name + ".tmp"), "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf, \
+            gzip.open(out_dir / (rows_name + ".tmp"), "wt", encoding="utf-8") as rows_f:
+        for offset in range(0, total, batch_size):
+            data = col.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            if not len(data["ids"]):
+                break
+            emb = np.asarray(data["embeddings"], dtype=np.float32)
+            dim = int(emb.shape[1])
+            # Un membru .npy per lot, scris direct în arhivă (ca np.savez_compressed, dar incremental).
+            with zf.open(f"emb_{batches:06d}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, emb, allow_pickle=False)
+            for _id, doc, meta in zip(data["ids"], data["documents"], data["metadatas"]):
+                rows_f.write(json.dumps({"id": _id, "document": doc, "metadata": meta}, ensure_ascii=False) + "\n")
+            written += len(emb)
+            batches += 1
+    for fname in (emb_name, rows_name):
+        os.replace(out_dir / (fname + ".tmp"), out_dir / fname)
+    # `count` = rândurile scrise efectiv (dacă s-au șters cărți între count() și get()).
+    return {"count": written, "batches": batches, "dim": dim}
+
+def export_snapshot(col, out_dir: Path, passage_col=None, shard_config: Dict | None = None,
+                    ingest_state: Dict | None = None, batch_size: int = 5000, model: str = EMBED_MODEL) -> Dict:
+    """Scrie snapshot-ul în out_dir; întoarce manifestul (+ "seconds", "rows_per_s", "mb_per_s")."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / MANIFEST).unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    collections = {"books": (col, index_params(col))}
+    if passage_col is not None and int(passage_col.count()):
+        collections["book_passages"] = (passage_col, index_params(passage_col))
+    manifest = {"format": FORMAT, "version": FORMAT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "model": model, "collections": {}, "shards": shard_config, "ingest_state": ingest_state or {}, "files": {}}
+    for name, (c, params) in collections.items():
+        info = _export_one(c, out_dir, name, batch_size)
+        if name == "books" and not info["count"]:
+            raise RuntimeError("Collection is empty; nothing to export.")
+        manifest["collections"][name] = dict(info, index_params=params)
+        for fname in _files(name):
+            manifest["files"][fname] = {"sha256": _sha256(out_dir / fname), "bytes": (out_dir / fname).stat().st_size}
+    (out_dir / MANIFEST).write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return dict(manifest, **_throughput(manifest, time.perf_counter() - t0))
+
+def _throughput(manifest: Dict, seconds: float) -> Dict:
+    rows = sum(c["count"] for c in manifest["collections"].values())
+    size = sum(f["bytes"] for f in manifest["files"].values())
+    return {"seconds": seconds, "rows_per_s": rows / seconds if seconds else 0.0,
+            "mb_per_s": size / 1e6 / seconds if seconds else 0.0}
+
+def load_manifest(snapshot_dir: Path) -> Dict:
+    path = Path(snapshot_dir) / MANIFEST
+    if not path.exists():
+        raise RuntimeError(f"{path} not found: not a snapshot directory (or the export did not finish).")
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT:
+        raise RuntimeError(f"{path}: unknown format {manifest.get('format')!r}")
+    if manifest.get("version", 0) > FORMAT_VERSION:
+        raise RuntimeError(f"{path}: snapshot version {manifest['version']} is newer than supported ({FORMAT_VERSION})")
+    return manifest
+
+def verify(snapshot_dir: Path) -> Dict:
+    """Manifestul, după ce sha256 și mărimea fiecărui fișier au fost verificate."""
+    snapshot_dir = Path(snapshot_dir)
+    manifest = load_manifest(snapshot_dir)
+    for fname, expected in manifest["files"].items():
+        path = snapshot_dir / fname
+        if not path.exists():
+            raise RuntimeError(f"{fname}: missing from snapshot")
+        if path.stat().st_size != expected["bytes"] or _sha256(path) != expected["sha256"]:
+            raise RuntimeError(f"{fname}: checksum mismatch (corrupt or partial copy)")
+    return manifest
+
+def iter_batches(snapshot_dir: Path, name: str = "books") -> Iterator[Batch]:
+    """Loturile colecției `name`, în ordinea exportului; verifică alinierea rânduri / embeddings."""
+    emb_name, rows_name = _files(name)
+    snapshot_dir = Path(snapshot_dir)
+    with np.load(snapshot_dir / emb_name, allow_pickle=False) as npz, \
+            gzip.open(snapshot_dir / rows_name, "rt", encoding="utf-8") as rows_f:
+        for key in sorted(npz.files):
+            emb = npz[key]
+            rows = [json.loads(rows_f.readline() or "null") for _ in range(len(emb))]
+            if rows and rows[-1] is None:
+                raise RuntimeError(f"{rows_name}: fewer rows than embeddings in {emb_name}")
+            yield [r["id"] for r in rows], [r["document"] for r in rows], [r["metadata"] for r in rows], emb
+        if rows_f.readline():
+            raise RuntimeError(f"{rows_name}: more rows than embeddings in {emb_name}")
+
+def restore_shard_config(shard_config: Dict, persist_dir: Path) -> Dict:
+    """Configurația de shard-uri a sursei, cu toate shard-urile mutate în noul persist_dir."""
+    config = json.loads(json.dumps(shard_config))
+    for spec in config.get("shards", []):
+        spec["persist"] = str(persist_dir)
+    return config
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+theme_index.py — index pe fațete pentru câmpul structurat `themes`
+- La ingest, fiecare temă din lista separată prin virgulă este normalizată
+  (fără diacritice, lowercase) și mapată la id-urile cărților: temă -> {ids}.
+- match_themes() servește potriviri exacte / fuzzy direct din index; doar temele
+  necunoscute mai ajung la căutarea semantică (embeddings).
+- facet_counts() întoarce lista (etichetă, număr cărți) pentru sidebar.
+Indexul se salvează în <persist_dir>/theme_index.json.
+"""
+from __future__ import annotations
+import difflib
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+INDEX_FILE = "theme_index.json"
+
+def normalize_theme(s: str) -> str:
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKD", str(s))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    s = re.sub(r"[^\w-]+", " ", s)
+    return " ".join(s.split())
+
+def split_themes(themes) -> List[str]:
+    """Acceptă string 'a, b, c' sau listă; întoarce etichetele curățate."""
+    if isinstance(themes, (list, tuple)):
+        parts = themes
+    else:
+        parts = str(themes or "").split(",")
+    return [p.strip() for p in parts if p and str(p).strip()]
+
+class ThemeIndex:
+    def __init__(self):
+        self.books: Dict[str, List[str]] = {}     # book_id -> [temă normalizată]
+        self.themes: Dict[str, set] = {}          # temă normalizată -> {book_id}
+        self.labels: Dict[str, str] = {}          # temă normalizată -> etichetă originală
+
+    def __len__(self) -> int:
+        return len(self.themes)
+
+    def add(self, book_id: str, themes):
+        self.remove(book_id)
+        norms = []
+        for label in split_themes(themes):
+            norm = normalize_theme(label)
+            if not norm or norm in norms:
+                continue
+            norms.append(norm)
+            self.themes.setdefault(norm, set()).add(book_id)
+            self.labels.setdefault(norm, label)
+        self.books[book_id] = norms
+
+    def add_many(self, ids: Iterable[str], metas: Iterable[Dict]):
+        for book_id, meta in zip(ids, metas):
+            self.add(book_id, (meta or {}).get("themes", ""))
+
+    def remove(self, book_id: str):
+        for norm in self.books.pop(book_id, []):
+            ids = self.themes.get(norm)
+            if ids is None:
+                continue
+            ids.discard(book_id)
+            if not ids:
+                del self.themes[norm]
+                self.labels.pop(norm, None)
+
+    def match_themes(self, query: str, cutoff: float = 0.8) -> List[str]:
+        """Temele din index care corespund cererii (exact, apoi prefix, apoi fuzzy)."""
+        out: List[str] = []
+        parts: List[str] = []
+        for chunk in re.split(r"[,;]", query or ""):
+            parts.extend(p.strip() for p in re.split(r"\s+(?:si|sau)\s+", normalize_theme(chunk)) if p.strip())
+        known = list(self.themes)
+        for part in parts:
+            if part in self.themes:
+                hits = [part]
+            else:
+                hits = [t for t in known if t.startswith(part) or part.startswith(t)] if len(part) >= 4 else []
+                hits = hits or difflib.get_close_matches(part, known, n=3, cutoff=cutoff)
+            out.extend(h for h in hits if h not in out)
+        return out
+
+    def search(self, query: str, k: int | None = None) -> Tuple[List[Tuple[str, float]], List[str]]:
+        """
+        Returnează ([(book_id, scor)], teme_potrivite). Scorul = fracțiunea temelor
+        potrivite pe care cartea le are. Listă goală -> temă necunoscută.
+        """
+        matched = self.match_themes(query)
+        if not matched:
+            return [], []
+        counts: Dict[str, int] = {}
+        for norm in matched:
+            for book_id in self.themes[norm]:
+                counts[book_id] = counts.get(book_id, 0) + 1
+        ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        scored = [(book_id, n / len(matched)) for book_id, n in ranked]
+        return (scored[:k] if k else scored), matched
+
+    def facet_counts(self, limit: int | None = None) -> List[Tuple[str, int]]:
+        """[(etichetă, număr_cărți)] descrescător după număr."""
+        facets = sorted(((self.labels[t], len(ids)) for t, ids in self.themes.items()), key=lambda kv: (-kv[1], kv[0]))
+        return facets[:limit] if limit else facets
+
+    # -------------------------- persistence --------------------------
+
+    def save(self, persist_dir: Path):
+        path = Path(persist_dir) / INDEX_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"books": self.books, "labels": self.labels}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, persist_dir: Path) -> "ThemeIndex | None":
+        path = Path(persist_dir) / INDEX_FILE
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        idx = cls()
+        idx.labels = dict(data.get("labels", {}))
+        for book_id, norms in data.get("books", {}).items():
+            idx.books[book_id] = list(norms)
+            for norm in norms:
+                idx.themes.setdefault(norm, set()).add(book_id)
+        return idx
+
+_CACHE: Dict[str, Tuple[float, ThemeIndex]] = {}
+
+def load_cached(persist_dir: Path) -> ThemeIndex | None:
+    """Încarcă indexul o singură dată per proces; se reîncarcă doar dacă fișierul s-a schimbat."""
+    path = Path(persist_dir) / INDEX_FILE
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    key = str(path.resolve())
+    hit = _CACHE.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    idx = ThemeIndex.load(persist_dir)
+    if idx is not None:
+        _CACHE[key] = (mtime, idx)
+    return idx
+
+def update_index(persist_dir: Path, ids: List[str], metas: List[Dict]) -> ThemeIndex:
+    """Actualizează incremental indexul de teme de pe disc."""
+    idx = ThemeIndex.load(persist_dir) or ThemeIndex()
+    idx.add_many(ids, metas)
+    idx.save(persist_dir)
+    return idx
+
+def resolve_labels(persist_dir: Path, theme: str) -> List[str]:
+    """Etichetele originale ale temelor din index care corespund textului (pentru filtre)."""
+    idx = load_cached(persist_dir)
+    if idx is None:
+        return []
+    return [idx.labels[t] for t in idx.match_themes(theme)]
+
+def theme_query(col, theme: str, n_results: int, persist_dir: Path, where: Dict | None = None) -> Dict | None:
+    """
+    Rezultat în forma col.query pentru temele cunoscute; None dacă tema nu e în index
+    (apelantul face atunci fallback la căutarea semantică). `where` filtrează pe metadate.
+    """
+    idx = load_cached(persist_dir)
+    if idx is None:
+        return None
+    scored, _ = idx.search(theme, None if where else n_results)
+    if not scored:
+        return None
+    ids = [book_id for book_id, _ in scored]
+    data = col.get(ids=ids, where=where, include=["documents", "metadatas"])
+    rows = {_id: (doc, meta) for _id, doc, meta in zip(data.get("ids", []), data.get("documents", []), data.get("metadatas", []))}
+    out = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+    for book_id, score in scored:
+        if book_id not in rows:
+            continue
+        doc, meta = rows[book_id]
+        out["ids"][0].append(book_id)
+        out["documents"][0].append(doc)
+        out["metadatas"][0].append(meta)
+        out["distances"][0].append(1.0 - score)
+        if n_results and len(out["ids"][0]) >= n_results:
+            break
+    return out
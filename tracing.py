@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+tracing.py — instrumentare ușoară pe etape (moderare, embeddings, Chroma, LLM, TTS, imagini)
+- span(name, **attrs) este un context manager; span-urile deschise în interiorul
+  unei cereri (trace(name)) formează un arbore cu offset + durată, pentru waterfall.
+  Un span fără trace activ devine el însuși un trace (ex. click pe 🔊 într-un fragment).
+- traced(name, result_attrs=None) decorează o funcție; `result_attrs(rezultat)` poate
+  atașa contoare (ex. {"bytes": ...}). annotate(**attrs) adaugă atribute span-ului curent
+  (ex. tokenii raportați de API).
+- Fiecare span alimentează o histogramă pe etapă (bucket-uri fixe, în secunde) și
+  contoare pentru atributele numerice; export_prometheus() produce formatul text
+  Prometheus, iar trace-urile terminate se pot scrie ca JSONL (set_jsonl_sink sau
+  variabila de mediu TRACE_JSONL).
+Starea e per proces; trace-ul curent e per thread (fiecare rerun Streamlit are thread-ul lui).
+Lucrul delegat altui thread rămâne în același trace: context() în thread-ul cererii,
+attach(ctx) în thread-ul worker.
+"""
+from __future__ import annotations
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "bookrag"
+
+_local = threading.local()
+_lock = threading.Lock()
+_hist: Dict[str, Dict] = {}              # etapă -> {"buckets": [...], "sum": s, "count": n, "errors": e}
+_counters: Dict[tuple, float] = {}        # (atribut, etapă) -> total
+_last: Dict[str, Dict] = {}               # nume trace -> ultimul trace terminat (dict)
+_sink: Path | None = Path(os.environ["TRACE_JSONL"]) if os.environ.get("TRACE_JSONL") else None
+
+def set_jsonl_sink(path: Path | None):
+    """Fiecare trace terminat se adaugă ca o linie JSON în `path` (None = dezactivat)."""
+    global _sink
+    _sink = Path(path) if path else None
+
+def _observe(name: str, seconds: float, attrs: Dict, error: bool):
+    with _lock:
+        h = _hist.setdefault(name, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "errors": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h["buckets"][i] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+        h["errors"] += int(error)
+        for key, value in attrs.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                _counters[(key, name)] = _counters.get((key, name), 0.0) + value
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Rădăcina unei cereri; la ieșire trace-ul devine disponibil prin last_trace(name)."""
+    if getattr(_local, "root", None) is not None:
+        # Trace imbricat (ex. compute_results apelat din alt trace): e doar un span.
+        with span(name, **attrs) as s:
+            yield s
+        return
+    root = {"name": name, "start": time.time(), "attrs": dict(attrs), "spans": [], "error": None}
+    _local.root, _local.stack, _local.t0 = root, [], time.perf_counter()
+    try:
+        yield root
+    except BaseException as e:
+        root["error"] = type(e).__name__
+        raise
+    finally:
+        root["duration_s"] = time.perf_counter() - _local.t0
+        _local.root = _local.stack = None
+        _observe(name, root["duration_s"], root["attrs"], root["error"] is not None)
+        with _lock:
+            _last[name] = root
+        if _sink is not None:
+            try:
+                with open(_sink, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(root, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass
+
+@contextmanager
+def span(name: str, **attrs):
+    if getattr(_local, "root", None) is None:
+        with trace(name, **attrs) as root:
+            yield root
+        return
+    rec = {"name": name, "depth": len(_local.stack), "offset_s": time.perf_counter() - _local.t0,
+           "attrs": dict(attrs), "error": None}
+    _local.root["spans"].append(rec)
+    _local.stack.append(rec)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = type(e).__name__
+        raise
+    finally:
+        rec["duration_s"] = time.perf_counter() - t0
+        _local.stack.pop()
+        _observe(name, rec["duration_s"], rec["attrs"], rec["error"] is not None)
+
+def context():
+    """Trace-ul curent, de transmis unui alt thread (vezi attach); None fără trace activ."""
+    root = getattr(_local, "root", None)
+    return None if root is None else (root, list(_local.stack), _local.t0)
+
+@contextmanager
+def attach(ctx):
+    """Span-urile deschise în thread-ul curent intră în trace-ul capturat cu context()."""
+    prev = (getattr(_local, "root", None), getattr(_local, "stack", None), getattr(_local, "t0", None))
+    if ctx is not None:
+        _local.root, stack, _local.t0 = ctx
+        _local.stack = list(stack)  # copie: thread-ul cererii își păstrează propria stivă
+    try:
+        yield
+    finally:
+        _local.root, _local.stack, _local.t0 = prev
+
+def annotate(**attrs):
+    """Atribute pe span-ul curent (fără efect dacă nu e niciun span activ)."""
+    stack = getattr(_local, "stack", None)
+    target = stack[-1] if stack else getattr(_local, "root", None)
+    if target is not None:
+        target["attrs"].update(attrs)
+
+def traced(name: str, result_attrs: Callable[[object], Dict] | None = None):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as rec:
+                out = fn(*args, **kwargs)
+                if result_attrs is not None:
+                    try:
+                        rec["attrs"].update(result_attrs(out) or {})
+                    except Exception:
+                        pass
+                return out
+        return wrapper
+    return deco
+
+def last_trace(name: str) -> Dict | None:
+    with _lock:
+        return _last.get(name)
+
+def snapshot() -> Dict:
+    """Copie a histogramelor și contoarelor (ex. pentru JSON)."""
+    with _lock:
+        return {"buckets": list(BUCKETS),
+                "stages": {k: dict(v, buckets=list(v["buckets"])) for k, v in _hist.items()},
+                "counters": {f"{attr}:{stage}": total for (attr, stage), total in _counters.items()}}
+
+def reset():
+    with _lock:
+        _hist.clear()
+        _counters.clear()
+        _last.clear()
+
+def export_prometheus() -> str:
+    """Histogramele + contoarele în formatul text Prometheus (exposition format 0.0.4)."""
+    m = f"{METRIC_PREFIX}_stage_seconds"
+    lines = [f"# HELP {m} Latency per pipeline stage.", f"# TYPE {m} histogram"]
+    with _lock:
+        hist = {k: dict(v) for k, v in _hist.items()}
+        counters = dict(_counters)
+    for stage in sorted(hist):
+        h = hist[stage]
+        for bound, n in zip(BUCKETS, h["buckets"]):
+            lines.append(f'{m}_bucket{{stage="{stage}",le="{bound}"}} {n}')
+        lines.append(f'{m}_bucket{{stage="{stage}",le="+Inf"}} {h["count"]}')
+        lines.append(f'{m}_sum{{stage="{stage}"}} {h["sum"]:.6f}')
+        lines.append(f'{m}_count{{stage="{stage}"}} {h["count"]}')
+    e = f"{METRIC_PREFIX}_stage_errors_total"
+    lines += [f"# HELP {e} Failed calls per pipeline stage.", f"# TYPE {e} counter"]
+    lines += [f'{e}{{stage="{stage}"}} {hist[stage]["errors"]}' for stage in sorted(hist)]
+    for attr in sorted({a for a, _ in counters}):
+        c = f"{METRIC_PREFIX}_stage_{attr}_total"
+        lines += [f"# HELP {c} Sum of '{attr}' reported per stage.", f"# TYPE {c} counter"]
+        lines += [f'{c}{{stage="{stage}"}} {counters[(a, stage)]:g}' for a, stage in sorted(counters) if a == attr]
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: Path):
+    """Pentru node_exporter textfile collector: scriere atomică."""
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(export_prometheus(), encoding="utf-8")
+    tmp.replace(path)
+
+def waterfall(tr: Dict) -> List[Dict]:
+    """Rândurile waterfall-ului: {name, depth, start_pct, width_pct, ms, attrs} relativ la durata totală."""
+    total = max(float(tr.get("duration_s") or 0.0), 1e-9)
+    return [{"name": s["name"], "depth": s["depth"], "start_pct": 100.0 * s["offset_s"] / total,
+             "width_pct": max(100.0 * s.get("duration_s", 0.0) / total, 0.5), "ms": 1000.0 * s.get("duration_s", 0.0),
+             "attrs": s["attrs"], "error": s["error"]} for s in tr.get("spans", [])]
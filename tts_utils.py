@@ -14,8 +14,11 @@ from typing import Tuple
 def _openai_tts(text: str, voice: str = "alloy") -> Tuple[bytes, str]:
     try:
         from openai import OpenAI
+        from tempfile import NamedTemporaryFile
         client = OpenAI()
-        speech_path = Path("tts_output.mp3")
+        # Fișier temporar unic: mai multe cereri TTS pot rula în paralel (thread-uri ale serviciului).
+        with NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
+            speech_path = Path(tmp.name)
         try:
             with client.audio.speech.with_streaming_response.create(
                 model="gpt-4o-mini-tts", voice=voice, input=text
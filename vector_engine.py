@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+vector_engine.py — motor vectorial in-process peste un export memory-mapped al colecției
+- export_collection() copiază din Chroma id-urile, documentele, metadatele și embedding-urile
+  într-un director de export (implicit <persist_dir>/mmap):
+    manifest.json     versiune, număr cărți, dimensiune, model, metrică
+    emb_f32.npy       (N, D) float32, vectori normalizați (L2 = 1)
+    emb_f16.npy       (N, D) float16
+    emb_i8.npy        (N, D) int8, cuantizare simetrică per rând
+    emb_i8_scale.npy  (N,)   float32, scala per rând pentru int8
+    meta.jsonl        un rând JSON per carte: {"id", "document", "metadata"}
+- MmapCollection deschide matricele cu np.load(mmap_mode="r"): mai multe procese
+  worker împart aceeași copie din page cache. Căutarea = produs scalar vectorizat +
+  sortare parțială top-k (np.argpartition). Distanța întoarsă este 1 - cosinus.
+  float16 / int8 se convertesc în float32 pe blocuri de BLOCK_ROWS rânduri (buffer
+  refolosit per thread), ca produsul să treacă prin BLAS; float32 rămâne cel mai rapid.
+- Expune aceeași interfață ca o colecție Chroma pentru citire (count/get/query), deci
+  poate înlocui colecția în hybrid_query, theme_query etc.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EXPORT_DIR = "mmap"
+FORMAT_VERSION = 1
+EMBED_MODEL = "text-embedding-3-small"
+DTYPES = {"float32": "emb_f32.npy", "float16": "emb_f16.npy", "int8": "emb_i8.npy"}
+BLOCK_ROWS = 4096
+
+def _quantize_int8(unit: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    scale = np.abs(unit).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(unit / scale[:, None]), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+def export_collection(col, out_dir: Path, batch_size: int = 5000, model: str = EMBED_MODEL) -> int:
+    """Exportă colecția în loturi (memorie constantă). Întoarce numărul de cărți exportate."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    total = int(col.count())
+    if not total:
+        raise RuntimeError("Collection is empty; nothing to export.")
+    mats = None
+    written = 0
+    with open(out_dir / "meta.jsonl.tmp", "w", encoding="utf-8") as meta_f:
+        for offset in range(0, total, batch_size):
+            data = col.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            emb = np.asarray(data["embeddings"], dtype=np.float32)
+            if not len(emb):
+                break
+            if mats is None:
+                dim = emb.shape[1]
+                mats = {
+                    "float32": np.lib.format.open_memmap(out_dir / "emb_f32.npy.tmp", mode="w+", dtype=np.float32, shape=(total, dim)),
+                    "float16": np.lib.format.open_memmap(out_dir / "emb_f16.npy.tmp", mode="w+", dtype=np.float16, shape=(total, dim)),
+                    "int8": np.lib.format.open_memmap(out_dir / "emb_i8.npy.tmp", mode="w+", dtype=np.int8, shape=(total, dim)),
+                }
+                scales = np.zeros(total, dtype=np.float32)
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            unit = emb / norms
+            end = written + len(unit)
+            mats["float32"][written:end] = unit
+            mats["float16"][written:end] = unit.astype(np.float16)
+            mats["int8"][written:end], scales[written:end] = _quantize_int8(unit)
+            for _id, doc, meta in zip(data["ids"], data["documents"], data["metadatas"]):
+                meta_f.write(json.dumps({"id": _id, "document": doc, "metadata": meta}, ensure_ascii=False) + "\n")
+            written = end
+    if mats is None:
+        raise RuntimeError("Collection returned no rows to export (count() > 0 but get() was empty).")
+    for m in mats.values():
+        m.flush()
+    del mats
+    for name in DTYPES.values():
+        os.replace(out_dir / (name + ".tmp"), out_dir / name)
+    np.save(out_dir / "emb_i8_scale.npy", scales)
+    os.replace(out_dir / "meta.jsonl.tmp", out_dir / "meta.jsonl")
+    # `count` = rândurile scrise efectiv (dacă s-au șters cărți între count() și get()).
+    manifest = {"version": FORMAT_VERSION, "count": written, "dim": int(dim), "model": model, "metric": "cosine"}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return written
+
+def _openai_embedder(model: str) -> Callable[[Sequence[str]], np.ndarray]:
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        from openai import OpenAI
+        resp = OpenAI().embeddings.create(model=model, input=list(texts))
+        return np.asarray([d.embedding for d in resp.data], dtype=np.float32)
+    return embed
+
+class MmapCollection:
+    """Colecție read-only, compatibilă cu col.count()/col.get()/col.query() din Chroma."""
+
+    def __init__(self, export_dir: Path, dtype: str = "float16", embedder: Callable[[Sequence[str]], np.ndarray] | None = None):
+        export_dir = Path(export_dir)
+        self.manifest = json.loads((export_dir / "manifest.json").read_text(encoding="utf-8"))
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise RuntimeError(f"Unsupported export version: {self.manifest.get('version')}")
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {sorted(DTYPES)}")
+        self.dtype = dtype
+        n = int(self.manifest["count"])
+        self.matrix = np.load(export_dir / DTYPES[dtype], mmap_mode="r")[:n]
+        self.scale = np.load(export_dir / "emb_i8_scale.npy", mmap_mode="r")[:n] if dtype == "int8" else None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        with open(export_dir / "meta.jsonl", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                self.ids.append(row["id"])
+                self.documents.append(row["document"])
+                self.metadatas.append(row["metadata"])
+        self.pos = {book_id: i for i, book_id in enumerate(self.ids)}
+        self._buffers = threading.local()
+        self.embed = embedder or _openai_embedder(self.manifest.get("model", EMBED_MODEL))
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_vec: np.ndarray, k: int, rows: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (indici, similaritate cosinus); cu `rows`, doar printre rândurile pre-filtrate."""
+        q = np.asarray(query_vec, dtype=np.float32).ravel()
+        q = q / (np.linalg.norm(q) or 1.0)
+        sims = self._scores(q, rows)
+        k = min(int(k), len(sims))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        part = np.argpartition(-sims, k - 1)[:k]
+        order = part[np.argsort(-sims[part])]
+        return (order if rows is None else rows[order]), sims[order]
+
+    def _scores(self, q: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        """Produsele scalare în float32: direct (BLAS) pentru float32, pe blocuri convertite altfel."""
+        if self.dtype == "float32":
+            return np.asarray((self.matrix if rows is None else self.matrix[rows]) @ q, dtype=np.float32)
+        n = len(self.ids) if rows is None else len(rows)
+        sims = np.empty(n, dtype=np.float32)
+        buf = getattr(self._buffers, "buf", None)
+        if buf is None or buf.shape[1] != len(q):
+            buf = self._buffers.buf = np.empty((BLOCK_ROWS, len(q)), dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            end = min(n, start + BLOCK_ROWS)
+            block = self.matrix[start:end] if rows is None else self.matrix[rows[start:end]]
+            np.copyto(buf[:end - start], block, casting="unsafe")
+            np.dot(buf[:end - start], q, out=sims[start:end])
+        if self.scale is not None:
+            sims *= self.scale if rows is None else self.scale[rows]
+        return sims
+
+    def _rows(self, rows, include) -> Dict:
+        out = {"ids": [self.ids[i] for i in rows]}
+        if "documents" in include:
+            out["documents"] = [self.documents[i] for i in rows]
+        if "metadatas" in include:
+            out["metadatas"] = [self.metadatas[i] for i in rows]
+        if "embeddings" in include:
+            mat = np.asarray(self.matrix[list(rows)], dtype=np.float32)
+            out["embeddings"] = mat * self.scale[list(rows)][:, None] if self.scale is not None else mat
+        return out
+
+    def _filter_rows(self, rows, where: Dict | None, where_document: Dict | None):
+        if where:
+            rows = [i for i in rows if _match(self.metadatas[i], where)]
+        if where_document:
+            rows = [i for i in rows if _match_document(self.documents[i] or "", where_document)]
+        return rows
+
+    def query(self, query_texts: List[str] | None = None, query_embeddings=None, n_results: int = 10,
+              include: Sequence[str] = ("documents", "metadatas", "distances"), where: Dict | None = None,
+              where_document: Dict | None = None) -> Dict:
+        vecs = np.asarray(query_embeddings, dtype=np.float32) if query_embeddings is not None else self.embed(query_texts)
+        rows = None
+        if where or where_document:
+            rows = np.asarray(self._filter_rows(range(len(self.ids)), where, where_document), dtype=np.int64)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for vec in vecs:
+            idx, sims = self.search(vec, n_results, rows)
+            found = self._rows(idx, include)
+            out["ids"].append(found["ids"])
+            out["documents"].append(found.get("documents", []))
+            out["metadatas"].append(found.get("metadatas", []))
+            out["distances"].append([float(1.0 - s) for s in sims])
+        return out
+
+    def get(self, ids: List[str] | None = None, where: Dict | None = None, limit: int | None = None,
+            offset: int | None = None, include: Sequence[str] = ("documents", "metadatas"),
+            where_document: Dict | None = None) -> Dict:
+        if ids is not None:
+            rows = [self.pos[i] for i in ids if i in self.pos]
+        else:
+            rows = range(len(self.ids))
+        rows = list(self._filter_rows(rows, where, where_document))[(offset or 0):]
+        if limit is not None:
+            rows = rows[:limit]
+        return self._rows(rows, include)
+
+_OPS = {
+    "$eq": lambda a, b: a == b, "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b, "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b, "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b, "$nin": lambda a, b: a not in b,
+}
+
+def _match(meta: Dict, where: Dict) -> bool:
+    """Subsetul filtrelor `where` Chroma: egalitate, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin, $and/$or."""
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_match(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_match(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not all(_OPS[op](meta.get(key), val) for op, val in cond.items()):
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+def _match_document(doc: str, where_document: Dict) -> bool:
+    """Subsetul `where_document` Chroma: $contains / $not_contains, $and/$or."""
+    for op, val in where_document.items():
+        if op == "$contains" and val not in doc:
+            return False
+        if op == "$not_contains" and val in doc:
+            return False
+        if op == "$and" and not all(_match_document(doc, c) for c in val):
+            return False
+        if op == "$or" and not any(_match_document(doc, c) for c in val):
+            return False
+    return True
+
+_CACHE: Dict[Tuple[str, str], Tuple[float, MmapCollection]] = {}
+
+def open_cached(export_dir: Path, dtype: str = "float16") -> MmapCollection | None:
+    """Deschide exportul o singură dată per proces; None dacă nu există export."""
+    manifest = Path(export_dir) / "manifest.json"
+    try:
+        mtime = manifest.stat().st_mtime
+    except OSError:
+        return None
+    key = (str(manifest.resolve()), dtype)
+    hit = _CACHE.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    eng = MmapCollection(export_dir, dtype=dtype)
+    _CACHE[key] = (mtime, eng)
+    return eng